@@ -1,24 +1,40 @@
+from django import forms
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import InsuranceApplication, PaymentTransaction, PaymentPlan, AmbassadorCode, PetDocument, PetPhoto, Questionnaire
+from .models import InsuranceApplication, PaymentTransaction, PaymentPlan, AmbassadorCode, PetDocument, PetPhoto, PetPremium, Questionnaire, TariffVersion, TariffCell, Breed, BackgroundJob, ContractDocument
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib import messages
 from django.urls import path, reverse
 from django.shortcuts import redirect
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 import logging
-from .utils import get_poisoning_price
+from . import pricing
 logger = logging.getLogger(__name__)
 
 
+class PetPremiumInline(admin.TabularInline):
+    """Stored per-pet premium breakdown (written by the pricing engine only)"""
+    model = PetPremium
+    extra = 0
+    can_delete = False
+    fields = [
+        'pet_number', 'frequency', 'base_premium', 'surcharge_5_percent', 'surcharge_20_percent',
+        'poisoning', 'blood_checkup', 'discount', 'net', 'fee', 'ipt', 'gross', 'updated_at',
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(InsuranceApplication)
 class InsuranceApplicationAdmin(admin.ModelAdmin):
     """Admin interface for Insurance Applications"""
     actions = ["export_today_contracts"]
+    inlines = [PetPremiumInline]
     
     list_display = [
         'contract_number', 
@@ -304,13 +320,28 @@ class InsuranceApplicationAdmin(admin.ModelAdmin):
             return format_html(display_text)
         except Exception as e:
             
-            logger.error(f"Error in affiliate_code_display: {e}")
+            logger.error("Error in affiliate_code_display: %s", e)
             return '-'
     affiliate_code_display.short_description = 'Κωδικός Συνεργάτη'
     
     def contract_pdf_link(self, obj):
         """Display link to view/download contract PDF from S3"""
+        from .utils import current_contract_documents
+        documents = list(current_contract_documents([obj.pk])) if obj.pk else []
+        if documents:
+            view_url = reverse('admin:view_contract', args=[obj.pk])
+            label = '📦 Λήψη ZIP' if len(documents) > 1 else '📄 Προβολή PDF'
+            return format_html(
+                '<a href="{}" target="_blank" style="background: #007bff; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px;">{}</a><br>{}',
+                view_url,
+                label,
+                format_html_join(
+                    '', '<small style="color: #6c757d;">v{} · {} · {} KB</small><br>',
+                    ((document.version, document.storage_key, round(document.size / 1024)) for document in documents)
+                )
+            )
         if obj.contract_pdf_path:
+            # Generated before the contract manifest existed
             from django.core.files.storage import default_storage
             try:
                 if default_storage.exists(obj.contract_pdf_path):
@@ -457,7 +488,7 @@ class InsuranceApplicationAdmin(admin.ModelAdmin):
                     pass
         except Exception as e:
          
-            logger.error(f"Error getting questionnaire for application {obj.id}: {e}")
+            logger.error("Error getting questionnaire for application %s: %s", obj.id, e)
         return format_html('<span style="color: #dc3545; font-weight: bold;">⚠️ Δεν υπάρχει ερωτηματολόγιο</span>')
     questionnaire_link.short_description = 'Ερωτηματολόγιο'
     
@@ -579,7 +610,7 @@ class InsuranceApplicationAdmin(admin.ModelAdmin):
             
             return format_html(''.join(buttons)) if buttons else '-'
         except Exception as e:
-            logger.error(f"Error in final_approval_buttons: {e}")
+            logger.error("Error in final_approval_buttons: %s", e)
             return format_html('<span style="color: #dc3545;">Error</span>')
     final_approval_buttons.short_description = 'Τελικές Ενέργειες'
     final_approval_buttons.allow_tags = True
@@ -669,7 +700,7 @@ class InsuranceApplicationAdmin(admin.ModelAdmin):
         except InsuranceApplication.DoesNotExist:
             messages.error(request, "Η αίτηση δεν βρέθηκε.")
         except Exception as e:
-            logger.error(f"Error in final_approve_application: {e}")
+            logger.error("Error in final_approve_application: %s", e)
             messages.error(request, f"Σφάλμα κατά την έγκριση: {str(e)}")
         
         return redirect('admin:main_insuranceapplication_change', application_id)
@@ -684,72 +715,42 @@ class InsuranceApplicationAdmin(admin.ModelAdmin):
         except InsuranceApplication.DoesNotExist:
             messages.error(request, "Η αίτηση δεν βρέθηκε.")
         except Exception as e:
-            logger.error(f"Error in final_reject_application: {e}")
+            logger.error("Error in final_reject_application: %s", e)
             messages.error(request, f"Σφάλμα κατά την απόρριψη: {str(e)}")
         
         return redirect('admin:main_insuranceapplication_change', application_id)
 
     def view_contract_view(self, request, application_id):
-        """View generated contract(s) from S3 or local storage"""
-        from django.http import FileResponse, Http404, HttpResponse
+        """View the current contract(s) from S3 or local storage; both pets' PDFs as a streamed ZIP"""
+        from django.http import FileResponse, Http404, StreamingHttpResponse
         from django.core.files.storage import default_storage
-        import zipfile
-        from io import BytesIO
-        
+        from .utils import current_contract_documents, stream_contract_zip
+
         try:
             application = InsuranceApplication.objects.get(pk=application_id)
-            
-            if not application.contract_pdf_path:
-                raise Http404("Το συμβόλαιο δεν βρέθηκε")
-            
-            # Check if file exists in storage (S3 or local)
-            if not default_storage.exists(application.contract_pdf_path):
-                raise Http404("Το συμβόλαιο δεν βρέθηκε")
-            
-            # Check if there are multiple contracts (two pets)
-            if application.has_second_pet and application.second_pet_name:
-                # Look for both pet contracts in storage
-                contract_files = []
-                contract_number = application.contract_number
-                
-                # List files in contracts directory
-                try:
-                    # Get all files in contracts/ directory
-                    contracts_dir = 'contracts/'
-                    files = default_storage.listdir(contracts_dir)[1]  # Get files list
-                    
-                    for filename in files:
-                        if (filename.startswith(f'contract_{contract_number}_pet') and 
-                            filename.endswith('.pdf')):
-                            file_path = f'{contracts_dir}{filename}'
-                            if default_storage.exists(file_path):
-                                contract_files.append((filename, file_path))
-                except:
-                    pass
-                
-                if len(contract_files) > 1:
-                    # Create ZIP file with both contracts
-                    zip_buffer = BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-                        for filename, file_path in contract_files:
-                            with default_storage.open(file_path, 'rb') as pdf_file:
-                                zip_file.writestr(filename, pdf_file.read())
-                    
-                    zip_buffer.seek(0)
-                    response = HttpResponse(zip_buffer.read(), content_type='application/zip')
-                    response['Content-Disposition'] = f'attachment; filename="{application.contract_number}_contracts.zip"'
-                    return response
-            
-            # Single contract
-            pdf_file = default_storage.open(application.contract_pdf_path, 'rb')
-            return FileResponse(
-                pdf_file,
-                as_attachment=False,
-                filename=f'contract_{application.contract_number}.pdf'
-            )
-            
         except InsuranceApplication.DoesNotExist:
             raise Http404("Η αίτηση δεν βρέθηκε")
+
+        # Indexed manifest lookup, no listing of the contracts/ prefix
+        documents = list(current_contract_documents([application.pk]))
+        if len(documents) > 1:
+            response = StreamingHttpResponse(stream_contract_zip(documents), content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="{application.contract_number}_contracts.zip"'
+            return response
+
+        # Single contract (or one generated before the manifest existed)
+        path = documents[0].storage_key if documents else application.contract_pdf_path
+        if not path:
+            raise Http404("Το συμβόλαιο δεν βρέθηκε")
+        try:
+            pdf_file = default_storage.open(path, 'rb')
+        except (FileNotFoundError, OSError):
+            raise Http404("Το συμβόλαιο δεν βρέθηκε")
+        return FileResponse(
+            pdf_file,
+            as_attachment=False,
+            filename=f'contract_{application.contract_number}.pdf'
+        )
     
     def save_model(self, request, obj, form, change):
         try:
@@ -758,21 +759,18 @@ class InsuranceApplicationAdmin(admin.ModelAdmin):
                 if not obj.assigned_to:
                     obj.assigned_to = request.user
         except Exception as e:
-            logger.warning(f"Error auto-assigning admin: {e}")
+            logger.warning("Error auto-assigning admin: %s", e)
         
         super().save_model(request, obj, form, change)
 
         # Sync program to questionnaire
-        if hasattr(obj, "questionnaire") and obj.questionnaire:
+        if hasattr(obj, "questionnaire") and obj.questionnaire and obj.questionnaire.program != obj.program:
             obj.questionnaire.program = obj.program
             obj.questionnaire.save(update_fields=["program"])
 
-        from .utils import recalculate_application_premium
-        recalculate_application_premium(obj)
-
-        obj.refresh_from_db()
-
-        
+        # Repriced once when the change form commits, only if a pricing input changed
+        from .utils import schedule_premium_recalculation
+        schedule_premium_recalculation(obj)
 
         try:
             obj.update_contract_dates_for_frequency()
@@ -1586,11 +1584,11 @@ class QuestionnaireAdmin(admin.ModelAdmin):
                     return format_html('<a href="{}">{}</a>', url, app_number)
                 except Exception as e:
                     
-                    logger.error(f"Error creating application link: {e}")
+                    logger.error("Error creating application link: %s", e)
                     return format_html('<span style="color: #dc3545;">Error: Application not found</span>')
         except Exception as e:
            
-            logger.error(f"Error in application_link: {e}")
+            logger.error("Error in application_link: %s", e)
             return format_html('<span style="color: #dc3545;">Error</span>')
         return '-'
     application_link.short_description = 'Αίτηση'
@@ -1609,7 +1607,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             return programs.get(obj.program, obj.program or '-')
         except Exception as e:
             
-            logger.error(f"Error in program_display: {e}")
+            logger.error("Error in program_display: %s", e)
             return '-'
     program_display.short_description = 'Πρόγραμμα'
     
@@ -1626,7 +1624,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             return methods.get(obj.payment_method, obj.payment_method or '-')
         except Exception as e:
    
-            logger.error(f"Error in payment_method_display: {e}")
+            logger.error("Error in payment_method_display: %s", e)
             return '-'
     payment_method_display.short_description = 'Τρόπος Πληρωμής'
     
@@ -1643,7 +1641,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             return frequencies.get(obj.payment_frequency, obj.payment_frequency or '-')
         except Exception as e:
        
-            logger.error(f"Error in payment_frequency_display: {e}")
+            logger.error("Error in payment_frequency_display: %s", e)
             return '-'
     payment_frequency_display.short_description = 'Συχνότητα'
     
@@ -1662,7 +1660,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #6c757d;">-</span>')
         except Exception as e:
  
-            logger.error(f"Error in breed_surcharge_display: {e}")
+            logger.error("Error in breed_surcharge_display: %s", e)
             return format_html('<span style="color: #dc3545;">Error</span>')
     breed_surcharge_display.short_description = 'Επασφάλιστρο Ράτσας'
     
@@ -1800,185 +1798,52 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             app = obj.application
             questionnaire = obj
             
-            # Get the base price from pricing table (without surcharges)
-            # Use the same pricing table as fillpdf_utils.py
-            pet_type = app.pet_type
-            weight_category = app.pet_weight_category or ''
-            program = app.program
-            
-            # EXACT pricing breakdown from the official table
-            DOG_PRICING = {
-                'silver': {
-                    '10': {'final': 166.75},
-                    '11-20': {'final': 207.20},
-                    '21-40': {'final': 234.14},
-                    '>40': {'final': 254.36}
-                },
-                'gold': {
-                    '10': {'final': 234.14},
-                    '11-20': {'final': 261.09},
-                    '21-40': {'final': 288.05},
-                    '>40': {'final': 308.26}
-                },
-                'platinum': {
-                    '10': {'final': 368.92},
-                    '11-20': {'final': 389.15},
-                    '21-40': {'final': 409.36},
-                    '>40': {'final': 436.32}
-                }
-            }
-            
-            CAT_PRICING = {
-                'silver': {
-                    '10': {'final': 113.81},
-                    '11-20': {'final': 141.02}
-                },
-                'gold': {
-                    '10': {'final': 168.22},
-                    '11-20': {'final': 188.61}
-                },
-                'platinum': {
-                    '10': {'final': 277.02},
-                    '11-20': {'final': 311.02}
-                }
-            }
-            
-            # Map weight categories
-            weight_mapping = {
-                'up_10': '10',
-                '10_25': '11-20', 
-                '25_40': '21-40',
-                'over_40': '>40'
-            }
-            
-            # Get the correct pricing table
-            pricing_table = DOG_PRICING if pet_type == 'dog' else CAT_PRICING
-            mapped_weight = weight_mapping.get(weight_category, weight_category)
-            
-            # Get base price from table
-            base_final_price = 0
-            if program in pricing_table and mapped_weight in pricing_table[program]:
-                base_final_price = pricing_table[program][mapped_weight]['final']
-            
-            if base_final_price == 0:
-                # Fallback: reverse calculate from annual_premium
-                # annual_premium already includes surcharges, so we need to reverse calculate
-                stored_premium = float(app.annual_premium) if app.annual_premium else 0
-                if stored_premium > 0:
-                    # Estimate base by subtracting known add-ons
-                    estimated_base = stored_premium
-                    if questionnaire.additional_poisoning_coverage:
-                        estimated_base -= get_poisoning_price(program, "annual")
-                    if questionnaire.additional_blood_checkup:
-                        estimated_base -= 28.00
-                    # Reverse calculate breed surcharges (20% is applied after 5%, so reverse in reverse order)
-                    if questionnaire.special_breed_20_percent:
-                        estimated_base = estimated_base / 1.20
-                    if questionnaire.special_breed_5_percent:
-                        estimated_base = estimated_base / 1.05
-                    base_final_price = estimated_base
-            
-            # Calculate breakdown - first calculate annual values
-            total_annual = base_final_price
-            
-            # Breed surcharges (20% is applied on price AFTER 5% surcharge, not on base)
-            surcharge_5_annual = 0
-            surcharge_20_annual = 0
-            if questionnaire.special_breed_5_percent:
-                surcharge_5_annual = base_final_price * 0.05
-                total_annual = total_annual * 1.05  # Apply 5% surcharge
-            
-            if questionnaire.special_breed_20_percent:
-                # 20% is applied on the price after 5% surcharge (if applicable)
-                surcharge_20_annual = total_annual * 0.20
-                total_annual = total_annual * 1.20  # Apply 20% surcharge
-            
-            # Add-ons (annual values)
-            annual_poisoning = 0
-            annual_blood_checkup = 0
-            
-            if questionnaire.additional_poisoning_coverage:
-                annual_poisoning = get_poisoning_price(program=program, payment_frequency="annual")
-                total_annual += annual_poisoning
-            
-            if questionnaire.additional_blood_checkup:
-                annual_blood_checkup = 28.00
-                total_annual += annual_blood_checkup
-            
-            # Now apply payment frequency to get display values
+            # Quote the selected payment frequency from the pricing engine
+            # (same source as the stored premiums and the contract PDF)
             payment_freq = questionnaire.payment_frequency or "annual"
+            frequency_labels = {
+                "annual": "Ετήσια",
+                "six_month": "Εξάμηνη",
+                "three_month": "Τριμηνιαία",
+            }
+            frequency_label = frequency_labels.get(payment_freq, "Ετήσια")
             
-            if payment_freq == "six_month":
-                # Scale base and surcharges with premium multiplier (52.5% of annual)
-                premium_multiplier = 0.525
-                # Scale add-ons with add-on multiplier (50% of annual)
-                addon_multiplier = 0.5
-                base_display = base_final_price * premium_multiplier
-                surcharge_5_display = surcharge_5_annual * premium_multiplier
-                surcharge_20_display = surcharge_20_annual * premium_multiplier
-                poisoning_display = annual_poisoning * addon_multiplier
-                blood_checkup_display = annual_blood_checkup * addon_multiplier
-                frequency_label = "Εξάμηνη"
-                total = float(app.six_month_premium or 0)
-            elif payment_freq == "three_month":
-                # Scale base and surcharges with premium multiplier (27.5% of annual)
-                premium_multiplier = 0.275
-                # Scale add-ons with add-on multiplier (25% of annual)
-                addon_multiplier = 0.25
-                base_display = base_final_price * premium_multiplier
-                surcharge_5_display = surcharge_5_annual * premium_multiplier
-                surcharge_20_display = surcharge_20_annual * premium_multiplier
-                poisoning_display = annual_poisoning * addon_multiplier
-                blood_checkup_display = annual_blood_checkup * addon_multiplier
-                frequency_label = "Τριμηνιαία"
-                total = float(app.three_month_premium or 0)
-            else:
-                # Annual - no scaling needed
-                base_display = base_final_price
-                surcharge_5_display = surcharge_5_annual
-                surcharge_20_display = surcharge_20_annual
-                poisoning_display = annual_poisoning
-                blood_checkup_display = annual_blood_checkup
-                frequency_label = "Ετήσια"
-                total = float(app.annual_premium or 0)
+            # Stored per-pet rows (same values as the premiums and the contract PDF).
+            # Without them (no tariff price at submission, priced before they
+            # existed) the recalculate_premium job is queued; nothing is priced here
+            premiums = list(app.pet_premiums.filter(frequency=payment_freq))
+            if not premiums:
+                from .utils import schedule_premium_recalculation
+                schedule_premium_recalculation(app)
+                total = app.get_premium_for_frequency()
+                if total is None:
+                    return 'Υπολογίζεται (σε εκκρεμότητα)'
+                return f"ΣΥΝΟΛΟ ({frequency_label}): {float(total):.2f}€ – ανάλυση σε εκκρεμότητα"
             
             # Build breakdown with frequency-adjusted display values
-            breakdown = [f"Βασική Τιμή: {base_display:.2f}€"]
-            calculated_total = base_display
+            breakdown = []
+            for premium in premiums:
+                if len(premiums) > 1:
+                    breakdown.append(f"<strong>{premium.pet_number}ο Κατοικίδιο</strong>")
+                breakdown.append(f"Βασική Τιμή: {premium.base_premium:.2f}€")
+                if premium.surcharge_5_percent:
+                    breakdown.append(f"+ Επασφάλιστρο 5%: {premium.surcharge_5_percent:.2f}€")
+                if premium.surcharge_20_percent:
+                    breakdown.append(f"+ Επασφάλιστρο 20%: {premium.surcharge_20_percent:.2f}€")
+                if premium.poisoning:
+                    breakdown.append(f"+ Δηλητηρίαση: {premium.poisoning:.2f}€")
+                if premium.blood_checkup:
+                    breakdown.append(f"+ Αιματολογικό Check Up: {premium.blood_checkup:.2f}€")
+                if premium.discount:
+                    label = "Έκπτωση 2ου κατοικιδίου" if premium.pet_number > 1 else "Έκπτωση"
+                    breakdown.append(f"− {label}: {premium.discount:.2f}€")
+                if len(premiums) > 1:
+                    breakdown.append(f"= {premium.gross:.2f}€")
+                breakdown.append(
+                    f"<small>Καθαρό: {premium.net:.2f}€ | Δικαίωμα: {premium.fee:.2f}€ | ΦΑΣ: {premium.ipt:.2f}€</small>"
+                )
             
-            if questionnaire.special_breed_5_percent:
-                breakdown.append(f"+ Επασφάλιστρο 5%: {surcharge_5_display:.2f}€")
-                calculated_total += surcharge_5_display
-            if questionnaire.special_breed_20_percent:
-                breakdown.append(f"+ Επασφάλιστρο 20%: {surcharge_20_display:.2f}€")
-                calculated_total += surcharge_20_display
-            if questionnaire.additional_poisoning_coverage:
-                breakdown.append(f"+ Δηλητηρίαση: {poisoning_display:.2f}€")
-                calculated_total += poisoning_display
-            if questionnaire.additional_blood_checkup:
-                breakdown.append(f"+ Αιματολογικό Check Up: {blood_checkup_display:.2f}€")
-                calculated_total += blood_checkup_display
-            
-            # Round calculated total
-            calculated_total = round(calculated_total, 2)
-
-            # Check if stored premium matches calculated total
-            stored_premium = total
-            if abs(stored_premium - calculated_total) > 0.01 and stored_premium > 0:
-                # Stored premium is outdated - automatically recalculate and update
-                from .utils import recalculate_application_premium
-                try:
-                    recalculate_application_premium(app)
-                    app.refresh_from_db()
-                    # Get updated stored premium
-                    if questionnaire.payment_frequency == "six_month":
-                        stored_premium = float(app.six_month_premium or 0)
-                    elif questionnaire.payment_frequency == "three_month":
-                        stored_premium = float(app.three_month_premium or 0)
-                    else:
-                        stored_premium = float(app.annual_premium or 0)
-                except Exception as e:
-                    logger.warning(f"Could not auto-recalculate premium: {e}")
+            calculated_total = sum(float(premium.gross) for premium in premiums)
             
             breakdown.append("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
             breakdown.append(f"ΣΥΝΟΛΟ ({frequency_label}): {calculated_total:.2f}€")
@@ -1987,7 +1852,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             return format_html('<br>'.join(breakdown))
         except Exception as e:
      
-            logger.error(f"Error in price_breakdown_display: {e}")
+            logger.error("Error in price_breakdown_display: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return format_html('<span style="color: #dc3545;">Error: {}</span>'.format(str(e)))
@@ -2100,7 +1965,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
             # Regenerate contract if relevant fields changed and application has a contract
             if fields_changed and obj.application and hasattr(obj.application, 'contract_generated') and obj.application.contract_generated:
               
-                logger.info(f"Questionnaire fields changed for application {obj.application.id}, regenerating contract...")
+                logger.info("Questionnaire fields changed for application %s, regenerating contract...", obj.application.id)
                 
                 try:
                     from .utils import generate_contract_pdf
@@ -2109,29 +1974,8 @@ class QuestionnaireAdmin(admin.ModelAdmin):
                     # Refresh application to get latest data
                     application = obj.application
                     
-                    # Recalculate premium if pricing-related fields changed
-                    pricing_fields = ['special_breed_5_percent', 'special_breed_20_percent', 
-                                    'additional_poisoning_coverage', 'additional_blood_checkup', 'program']
-                    pricing_changed = any(
-                        getattr(original_obj, field, None) != getattr(obj, field, None)
-                        for field in pricing_fields
-                    )
-                    
-                    if pricing_changed:
-                        from .utils import recalculate_application_premium
-                        logger.info(f"Pricing fields changed, recalculating premium for application {application.id}")
-                        recalculate_application_premium(application)
-                        # Refresh application after recalculation
-                        application.refresh_from_db()
-
-                        application.save(update_fields=[
-                        'annual_premium',
-                        'six_month_premium',
-                        'three_month_premium'
-                    ])
-
-                    
-                    # Generate new contract (will have unique timestamp in filename)
+                    # Generate new contract (will have unique timestamp in filename);
+                    # generate_contract_pdf() reprices first when a pricing input changed
                     pdf_paths = generate_contract_pdf(application)
 
                                         
@@ -2141,7 +1985,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
                         application.contract_generated = True
                         application.save(update_fields=['contract_pdf_path', 'contract_generated'])
                         
-                        logger.info(f"Contract regenerated successfully for application {application.id} due to questionnaire changes")
+                        logger.info("Contract regenerated successfully for application %s due to questionnaire changes", application.id)
                         try:
                             messages.success(request, 'Το συμβόλαιο αναδημιουργήθηκε αυτόματα λόγω αλλαγών στο ερωτηματολόγιο.')
                         except:
@@ -2149,7 +1993,7 @@ class QuestionnaireAdmin(admin.ModelAdmin):
                             pass
                 except Exception as e:
                 
-                    logger.error(f"Error regenerating contract for application {obj.application.id}: {e}")
+                    logger.error("Error regenerating contract for application %s: %s", obj.application.id, e)
                     import traceback
                     logger.error(traceback.format_exc())
                     try:
@@ -2163,5 +2007,299 @@ class QuestionnaireAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return True
-    
 
+
+class TariffVersionForm(forms.ModelForm):
+    """Tariff version form with an optional CSV upload that replaces all cells"""
+
+    csv_file = forms.FileField(
+        required=False,
+        label='Αρχείο CSV',
+        help_text=(
+            'Στήλες: ' + ', '.join(pricing.TARIFF_CSV_COLUMNS) + '. '
+            'Αντικαθιστά όλες τις τιμές της έκδοσης.'
+        ),
+    )
+
+    class Meta:
+        model = TariffVersion
+        fields = '__all__'
+
+    def clean_csv_file(self):
+        csv_file = self.cleaned_data.get('csv_file')
+        if not csv_file:
+            return None
+        try:
+            self.cleaned_cells = pricing.parse_tariff_csv(csv_file.read().decode('utf-8-sig'))
+        except UnicodeDecodeError:
+            raise forms.ValidationError('Το αρχείο πρέπει να είναι CSV σε κωδικοποίηση UTF-8.')
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return csv_file
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk and cleaned_data.get('csv_file') and self.instance.applications.exists():
+            raise forms.ValidationError('Η έκδοση έχει ήδη τιμολογήσει αιτήσεις. Δημιουργήστε νέα έκδοση για αλλαγές τιμών.')
+        if not self.instance.pk and not cleaned_data.get('csv_file'):
+            raise forms.ValidationError('Ανεβάστε αρχείο CSV με τις τιμές της νέας έκδοσης.')
+        return cleaned_data
+
+
+class TariffCellInline(admin.TabularInline):
+    model = TariffCell
+    extra = 0
+    fields = ['pet_type', 'program', 'weight_category', 'frequency', 'is_second_pet', 'net', 'fee', 'ipt', 'gross']
+
+    def _is_locked(self, obj):
+        # Cells of a version that already priced applications must stay reproducible
+        return obj is not None and obj.applications.exists()
+
+    def has_add_permission(self, request, obj=None):
+        return not self._is_locked(obj) and super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return not self._is_locked(obj) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not self._is_locked(obj) and super().has_delete_permission(request, obj)
+
+
+@admin.register(TariffVersion)
+class TariffVersionAdmin(admin.ModelAdmin):
+    """Admin interface for versioned Excel tariffs"""
+
+    form = TariffVersionForm
+    inlines = [TariffCellInline]
+    actions = ['export_csv', 'simulate']
+
+    list_display = [
+        'name',
+        'effective_from',
+        'is_published',
+        'active_display',
+        'cells_count',
+        'applications_count',
+        'updated_at',
+        'simulate_link',
+    ]
+
+    list_filter = ['is_published', 'effective_from']
+    search_fields = ['name', 'notes', 'created_by']
+    readonly_fields = ['created_at', 'updated_at']
+
+    fieldsets = (
+        ('📋 Έκδοση', {
+            'fields': ('name', 'effective_from', 'is_published', 'notes', 'created_by')
+        }),
+        ('📥 Εισαγωγή τιμών', {
+            'fields': ('csv_file',)
+        }),
+        ('📅 Χρονοσήματα', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def get_queryset(self, request):
+        from django.db.models import Count
+        return super().get_queryset(request).annotate(
+            _cells_count=Count('cells', distinct=True),
+            _applications_count=Count('applications', distinct=True),
+        )
+
+    def active_display(self, obj):
+        if obj.pk == pricing.get_active_tariff().version_id:
+            return format_html('<span style="color: #28a745; font-weight: bold;">✓ Ενεργή</span>')
+        return '-'
+    active_display.short_description = 'Ενεργή'
+
+    def cells_count(self, obj):
+        return obj._cells_count
+    cells_count.short_description = 'Τιμές'
+    cells_count.admin_order_field = '_cells_count'
+
+    def applications_count(self, obj):
+        return obj._applications_count
+    applications_count.short_description = 'Αιτήσεις'
+    applications_count.admin_order_field = '_applications_count'
+
+    def simulate_link(self, obj):
+        url = reverse('admin:main_tariffversion_simulate', args=[obj.pk])
+        return format_html('<a href="{}">📊 Προσομοίωση</a>', url)
+    simulate_link.short_description = 'What-if'
+
+    def save_model(self, request, obj, form, change):
+        from django.db import transaction
+
+        if not obj.created_by:
+            obj.created_by = request.user.get_username()
+
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            cells = getattr(form, 'cleaned_cells', None)
+            if cells:
+                obj.cells.all().delete()
+                TariffCell.objects.bulk_create(TariffCell(version=obj, **cell) for cell in cells)
+                obj.touch()
+                messages.success(request, f'Εισήχθησαν {len(cells)} τιμές στην έκδοση {obj}.')
+
+        pricing.invalidate_tariff_cache()
+
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        pricing.invalidate_tariff_cache()
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'export-builtin/',
+                self.admin_site.admin_view(self.export_builtin_view),
+                name='main_tariffversion_export_builtin'
+            ),
+            path(
+                '<int:version_id>/simulate/',
+                self.admin_site.admin_view(self.simulate_view),
+                name='main_tariffversion_simulate'
+            ),
+        ]
+        return custom_urls + urls
+
+    def get_fieldsets(self, request, obj=None):
+        url = reverse('admin:main_tariffversion_export_builtin')
+        fieldsets = list(super().get_fieldsets(request, obj))
+        fieldsets[1] = ('📥 Εισαγωγή τιμών', {
+            'fields': ('csv_file',),
+            'description': format_html(
+                'Χωρίς δημοσιευμένη έκδοση ισχύει το ενσωματωμένο τιμολόγιο Excel. '
+                '<a href="{}">Λήψη ως CSV</a> για πρότυπο εισαγωγής.', url
+            ),
+        })
+        return fieldsets
+
+    def export_builtin_view(self, request):
+        return self._csv_response(pricing.tariff_csv(pricing.BUILTIN_TARIFF), 'tariff_builtin.csv')
+
+    def export_csv(self, request, queryset):
+        if queryset.count() != 1:
+            messages.error(request, 'Επιλέξτε ακριβώς μία έκδοση για εξαγωγή.')
+            return None
+        version = queryset.first()
+        pricing.invalidate_tariff_cache()  # export what is stored right now
+        tariff = pricing.load_tariff_version(version.pk)
+        return self._csv_response(pricing.tariff_csv(tariff), f'tariff_{version.pk}.csv')
+    export_csv.short_description = 'Εξαγωγή τιμών σε CSV'
+
+    def simulate(self, request, queryset):
+        if queryset.count() != 1:
+            messages.error(request, 'Επιλέξτε ακριβώς μία έκδοση για προσομοίωση.')
+            return None
+        return redirect('admin:main_tariffversion_simulate', queryset.first().pk)
+    simulate.short_description = 'Προσομοίωση επίπτωσης στο χαρτοφυλάκιο'
+
+    def simulate_view(self, request, version_id):
+        """Read-only what-if: the portfolio repriced under this version vs a baseline."""
+        from django.shortcuts import get_object_or_404
+        from django.template.response import TemplateResponse
+
+        if not self.has_view_permission(request):
+            from django.core.exceptions import PermissionDenied
+            raise PermissionDenied
+
+        version = get_object_or_404(TariffVersion, pk=version_id)
+        baseline_id = request.GET.get('baseline', '')
+        pricing.invalidate_tariff_cache()  # simulate what is stored right now
+        baseline = None
+        if baseline_id.isdigit() and TariffVersion.objects.filter(pk=baseline_id).exists():
+            baseline = pricing.load_tariff_version(int(baseline_id))
+        report = pricing.simulate_tariff(pricing.load_tariff_version(version.pk), baseline)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Προσομοίωση τιμολογίου: {version}',
+            'version': version,
+            'versions': TariffVersion.objects.exclude(pk=version.pk),
+            'baseline_id': report.baseline.version_id,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/main/tariffversion/simulate.html', context)
+
+    def _csv_response(self, content, filename):
+        from django.http import HttpResponse
+        response = HttpResponse(content, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+@admin.register(Breed)
+class BreedAdmin(admin.ModelAdmin):
+    """Admin interface for the breed catalog (dropdowns, surcharges, weight bands)"""
+
+    list_display = ['name', 'pet_type', 'surcharge', 'default_weight_category', 'is_active', 'updated_at']
+    list_editable = ['surcharge', 'default_weight_category', 'is_active']
+    list_filter = ['pet_type', 'surcharge', 'default_weight_category', 'is_active']
+    search_fields = ['name', 'aliases']
+    readonly_fields = ['updated_at']
+
+    fieldsets = (
+        ('🐾 Ράτσα', {
+            'fields': ('pet_type', 'name', 'aliases', 'is_active')
+        }),
+        ('💶 Τιμολόγηση', {
+            'fields': ('surcharge', 'default_weight_category'),
+            'description': 'Το επασφάλιστρο εφαρμόζεται αυτόματα όταν η ράτσα (ή κάποιο συνώνυμο) εμφανίζεται στην αίτηση.'
+        }),
+        ('📅 Χρονοσήματα', {
+            'fields': ('updated_at',),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def delete_queryset(self, request, queryset):
+        from .breeds import invalidate_breed_index
+        super().delete_queryset(request, queryset)
+        invalidate_breed_index()
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """Admin interface for the background job queue (run by `manage.py run_workers`)"""
+
+    list_display = ['id', 'job_type', 'application', 'status_badge', 'attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'job_type']
+    search_fields = ['application__contract_number', 'application__application_number', 'idempotency_key', 'last_error']
+    raw_id_fields = ['application']
+    readonly_fields = ['idempotency_key', 'attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at', 'finished_at']
+    actions = ['retry_jobs']
+
+    STATUS_COLORS = {'queued': '#6c757d', 'running': '#007bff', 'done': '#28a745', 'failed': '#dc3545'}
+
+    def status_badge(self, obj):
+        return format_html(
+            '<span style="color:{};font-weight:bold;">{}</span>',
+            self.STATUS_COLORS.get(obj.status, '#333'), obj.get_status_display()
+        )
+    status_badge.short_description = 'Κατάσταση'
+
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        messages.success(request, f"{updated} εργασίες τέθηκαν ξανά σε αναμονή.")
+
+    retry_jobs.short_description = "Επανάληψη επιλεγμένων εργασιών"
+
+
+@admin.register(ContractDocument)
+class ContractDocumentAdmin(admin.ModelAdmin):
+    """Manifest of stored contract PDFs (written by generate_contract_pdf only)"""
+
+    list_display = ['id', 'application', 'version', 'pet_number', 'storage_key', 'size', 'created_at']
+    search_fields = ['application__contract_number', 'application__application_number', 'storage_key']
+    raw_id_fields = ['application']
+    readonly_fields = ['application', 'pet_number', 'version', 'storage_key', 'size', 'digest', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
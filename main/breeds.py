@@ -0,0 +1,207 @@
+"""
+Breed catalog – per-process index over the Breed table.
+
+Every worker keeps one compiled index: an exact-match dict keyed by
+(pet_type, lower-cased name or alias) and one precompiled alias regex per pet
+type for free text ("Cane Corso + Labrador", custom breeds). Classifying a
+breed string (surcharge tier, weight band) is a dict lookup, or one regex scan
+when the text is not a catalog name. The index is rebuilt only when the
+catalog stamp changes, like the tariff in pricing.py.
+"""
+
+import json
+import logging
+import re
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PET_TYPES = ("dog", "cat")
+
+# Weight labels the breed pages append to the breed, e.g. "Beagle (11-20 κιλά)"
+WEIGHT_LABEL_RE = re.compile(r"έως\s*10\s*κιλά|up to 10|11-20|21-40|>\s*40", re.IGNORECASE)
+WEIGHT_SUFFIX_RE = re.compile(r"\s*\((?:έως\s*10|up to 10|11-20|21-40|>\s*40)[^)]*\)\s*$", re.IGNORECASE)
+
+
+def weight_from_label(label):
+    """Excel weight band of a WEIGHT_LABEL_RE match."""
+    label = label.lower()
+    if label.startswith(("έως", "up to")):
+        return "10"
+    if label.startswith(">"):
+        return ">40"
+    return label
+
+
+class BreedInfo(NamedTuple):
+    pet_type: str
+    name: str
+    surcharge: str                          # '', '5' or '20'
+    default_weight_category: Optional[str]  # Excel weight band or None
+
+
+class BreedMatch(NamedTuple):
+    """Result of classify_breed()."""
+
+    breeds: tuple                   # matched BreedInfo, in text order
+    weight_category: Optional[str]  # from the weight label, else the breed default
+
+    @property
+    def breed(self):
+        return self.breeds[0] if self.breeds else None
+
+    @property
+    def special_breed_5_percent(self):
+        return any(breed.surcharge == "5" for breed in self.breeds)
+
+    @property
+    def special_breed_20_percent(self):
+        return any(breed.surcharge == "20" for breed in self.breeds)
+
+
+class BreedIndex(NamedTuple):
+    stamp: object
+    exact: Mapping       # (pet_type, lower-cased name / alias) -> BreedInfo
+    matchers: Mapping    # pet_type -> compiled alternation of its names / aliases
+    dropdown: Mapping    # pet_type -> tuple of active breed names
+    catalog_json: bytes  # served by /api/breeds/
+
+
+def compile_breed_index(rows, stamp=None):
+    """
+    Build a BreedIndex from (pet_type, name, aliases, surcharge,
+    default_weight_category, is_active) rows.
+    """
+    exact = {}
+    dropdown = {pet_type: [] for pet_type in PET_TYPES}
+    catalog = {pet_type: [] for pet_type in PET_TYPES}
+
+    for pet_type, name, aliases, surcharge, weight, is_active in rows:
+        info = BreedInfo(pet_type, name, surcharge or "", weight or None)
+        for text in (name, *(aliases or "").splitlines()):
+            text = text.strip().lower()
+            if text:
+                exact.setdefault((pet_type, text), info)
+        if is_active:
+            dropdown.setdefault(pet_type, []).append(name)
+            catalog.setdefault(pet_type, []).append({
+                "name": name,
+                "surcharge": info.surcharge,
+                "weight": info.default_weight_category,
+            })
+
+    matchers = {}
+    for pet_type in dropdown:
+        texts = sorted((text for (kind, text) in exact if kind == pet_type), key=len, reverse=True)
+        if texts:
+            # Longest first, so "french bulldog" wins over "bulldog"
+            matchers[pet_type] = re.compile(r"(?<!\w)(?:%s)(?!\w)" % "|".join(map(re.escape, texts)))
+
+    return BreedIndex(
+        stamp=stamp,
+        exact=MappingProxyType(exact),
+        matchers=MappingProxyType(matchers),
+        dropdown=MappingProxyType({pet_type: tuple(sorted(names)) for pet_type, names in dropdown.items()}),
+        catalog_json=json.dumps(catalog, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    )
+
+
+EMPTY_INDEX = compile_breed_index([])
+
+# Seconds between catalog-stamp checks; classifications in between never touch the DB
+BREED_STAMP_TTL = 30
+
+_breed_state = {
+    "index": EMPTY_INDEX,
+    "stamp": None,
+    "checked_at": None,
+}
+
+
+def invalidate_breed_index():
+    """Drop this process' index; the next lookup re-checks the catalog stamp."""
+    _breed_state["checked_at"] = None
+    _breed_state["stamp"] = None
+
+
+def get_breed_index():
+    """
+    The compiled catalog of this process. At most one aggregate query per
+    BREED_STAMP_TTL seconds; rows are only re-read when the stamp changes.
+    """
+    now = time.monotonic()
+    checked_at = _breed_state["checked_at"]
+    if checked_at is not None and now - checked_at < BREED_STAMP_TTL:
+        return _breed_state["index"]
+    _breed_state["checked_at"] = now
+
+    from django.db import DatabaseError
+    from django.db.models import Count, Max
+    from .models import Breed
+
+    try:
+        stamp = tuple(Breed.objects.aggregate(Count("id"), Max("updated_at")).values())
+        if stamp == _breed_state["stamp"]:
+            return _breed_state["index"]
+        index = compile_breed_index(
+            Breed.objects.values_list(
+                "pet_type", "name", "aliases", "surcharge", "default_weight_category", "is_active"
+            ),
+            stamp,
+        )
+    except DatabaseError as e:
+        # e.g. before migrations ran – keep classifying with what we have
+        logger.warning("[BREEDS] Could not check breed catalog, using cached index: %s", e)
+        return _breed_state["index"]
+
+    _breed_state["stamp"] = stamp
+    _breed_state["index"] = index
+    logger.info("[BREEDS] Loaded breed catalog (%s names / aliases)", len(index.exact))
+    return index
+
+
+def classify_breed(breed, pet_type=None):
+    """
+    Classify a breed string as stored on applications, e.g.
+    "Cane Corso (21-40 κιλά)" or "Μπόξερ + Pit Bull (>40 κιλά)".
+
+    Catalog names are a single dict lookup; any other text is scanned once
+    with the pet type's alias matcher (all pet types when ``pet_type`` is
+    not given). The weight band comes from the label in the text, else from
+    the first matched breed's default.
+    """
+    if not breed:
+        return BreedMatch((), None)
+
+    index = get_breed_index()
+    pet_types = (pet_type,) if pet_type in index.matchers else tuple(index.matchers)
+    text = breed.lower()
+    name = WEIGHT_SUFFIX_RE.sub("", text).strip()
+
+    breeds = ()
+    for kind in pet_types:
+        info = index.exact.get((kind, name))
+        if info is not None:
+            breeds = (info,)
+            break
+    else:
+        found = {}
+        for kind in pet_types:
+            for match in index.matchers[kind].finditer(text):
+                info = index.exact[(kind, match.group(0))]
+                found.setdefault(info, match.start())
+        breeds = tuple(sorted(found, key=found.get))
+
+    label = WEIGHT_LABEL_RE.search(breed)
+    if label:
+        weight = weight_from_label(label.group(0))
+    else:
+        weight = next((info.default_weight_category for info in breeds if info.default_weight_category), None)
+    return BreedMatch(breeds, weight)
+
+
+def breed_names(pet_type):
+    """Active breed names for the dropdown of ``pet_type`` (precomputed tuple)."""
+    return get_breed_index().dropdown.get(pet_type, ())
@@ -0,0 +1,373 @@
+"""
+Contract template – per-process parsed AcroForm template.
+
+fillpdf re-reads and re-parses the template for every contract, walks every
+annotation to find its ~35 fields and serializes all ~1300 objects again.
+Here each worker parses the template once, rewrites it without object
+streams (the file fillpdf would write) and indexes its fields by name,
+pre-serializing everything a contract does not change. A contract is those
+base bytes plus a PDF incremental update holding only the filled field and
+widget dictionaries (and the AcroForm with NeedAppearances set), built in
+memory from strings – the parsed tree is never modified, so renders need no
+locking. Field values match fillpdfs.write_fillable_pdf() (same /V, /AS and
+/AP entries, form not flattened). The base has no object streams because
+pdfrw (fillpdfs.get_form_fields() and friends) cannot override objects stored
+in one with an update. The template is re-parsed only when the file on disk
+changes.
+
+QR codes (contract verification, terms) are stamped on the first page of
+each copy by one extra content stream, appended to the page's /Contents in
+the same update; the terms QR is the same for every contract and encoded
+once per process.
+
+Two-pet applications can be rendered as one document: the template stacked
+twice, the fields of copy n grouped under a parent field "pet<n>" (so
+"pet2.text_3ksjz" is the second pet's holder name), filled in the same single
+pass.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+import pdfrw
+from pdfrw.objects import PdfIndirect, PdfString
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTRACT_TEMPLATE_NAME = 'ΑΣΦΑΛΙΣΤΗΡΙΟ ΣΥΜΒΟΛΑΙΟ ΤΕΛΙΚΟ PET (1) (2).pdf'
+
+# Entries a filled field rewrites, as fillpdfs.write_fillable_pdf() does:
+# text fields /V and /AP (the value; viewers draw it because of
+# NeedAppearances), checkboxes /V on the field and /AS on its widgets
+TEXT_KEYS = ('/V', '/AP')
+FIELD_VALUE_KEYS = ('/V',)
+WIDGET_STATE_KEYS = ('/AS',)
+
+
+class QrPlacement(NamedTuple):
+    """Square a QR code is drawn in, in PDF points from the bottom-left corner of the page."""
+
+    x: float
+    y: float
+    size: float
+
+
+# First page: verification QR right of the title, terms QR over the template's
+# printed one (bottom left, next to its "scan to read the terms" caption)
+QR_PLACEMENTS = {
+    'verification': QrPlacement(500, 702, 60),
+    'terms': QrPlacement(28.6, 50.29, 76.35),
+}
+# QR codes of the same data on every contract, encoded once per process
+CACHED_QR_CODES = ('terms',)
+
+
+def contract_template_path():
+    return os.path.join(settings.BASE_DIR, CONTRACT_TEMPLATE_NAME)
+
+
+def stack_template(pdf_bytes, copies):
+    """
+    PdfWriter holding the template ``copies`` times, the form fields of copy n
+    grouped under a new parent field ``pet<n>`` so the copies fill separately.
+    """
+    writer = pdfrw.PdfWriter()
+    groups = []
+    acroform = None
+    for copy in range(1, copies + 1):
+        # Separate readers: every copy gets its own objects
+        pdf = pdfrw.PdfReader(fdata=pdf_bytes)
+        acroform = pdf.Root.AcroForm
+        group = pdfrw.PdfDict(T=PdfString.encode(f'pet{copy}'), Kids=pdfrw.PdfArray())
+        group.indirect = True
+        for field in acroform.Fields:
+            field.Parent = group
+            group.Kids.append(field)
+        groups.append(group)
+        writer.addpages(pdf.pages)
+
+    form = pdfrw.PdfDict(acroform)
+    form.Fields = pdfrw.PdfArray(groups)
+    form.indirect = True
+    writer.trailer.Root.AcroForm = form
+    return writer
+
+
+def format_pdf_object(obj, references):
+    """PDF syntax of a parsed object; indirect objects become ``n g R``."""
+    if isinstance(obj, PdfIndirect):
+        return '%d %d R' % obj
+    reference = references.get(id(obj))
+    if reference is not None:
+        return '%d %d R' % reference
+    if isinstance(obj, pdfrw.PdfDict):
+        return '<<%s>>' % ' '.join(
+            f'{key} {format_pdf_object(value, references)}' for key, value in dict.items(obj)
+        )
+    if isinstance(obj, pdfrw.PdfArray):
+        return '[%s]' % ' '.join(format_pdf_object(value, references) for value in list.__iter__(obj))
+    if isinstance(obj, bool):
+        return 'true' if obj else 'false'
+    if type(obj) is str:
+        # Plain Python text, e.g. a field value (names, strings and numbers
+        # parsed by pdfrw are str subclasses already in PDF syntax)
+        return PdfString.encode(obj)
+    return str(obj)
+
+
+class PatchedObject(NamedTuple):
+    """A template object a contract rewrites: its number and unchanged entries."""
+
+    number: tuple      # (object number, generation)
+    static: str        # serialized entries that stay as in the template
+    keys: tuple        # entries supplied per contract
+
+
+class FormField(NamedTuple):
+    name: str
+    is_button: bool
+    on_states: frozenset     # checkbox: appearance states other than /Off
+    value_objects: tuple     # PatchedObject taking the value (text: /V + /AP, checkbox: /V)
+    state_objects: tuple     # checkbox widgets taking /AS
+
+
+class ContractTemplate:
+    """
+    Parsed template with a field name -> FormField index and everything
+    render() needs pre-serialized: the original bytes, the catalog with
+    NeedAppearances and the static part of each field / widget dictionary.
+    """
+
+    def __init__(self, pdf_bytes, stamp=None, copies=1):
+        self.stamp = stamp
+        self.copies = copies
+        # Identifies the template in contract content digests
+        self.digest = hashlib.sha256(pdf_bytes).hexdigest()
+        base = io.BytesIO()
+        if copies > 1:
+            stack_template(pdf_bytes, copies).write(base)
+        else:
+            pdfrw.PdfWriter().write(base, pdfrw.PdfReader(fdata=pdf_bytes))
+        self.pdf_bytes = base.getvalue()
+        pdf = pdfrw.PdfReader(fdata=self.pdf_bytes)
+        pdf.read_all()
+
+        references = {}
+        for number, obj in list(pdf.indirect_objects.items()):
+            if isinstance(obj, PdfIndirect):
+                obj = obj.real_value()
+            references[id(obj)] = number
+        self._references = references
+
+        self.previous_xref = int(self.pdf_bytes[self.pdf_bytes.rindex(b'startxref') + 9:].split()[0])
+        # Object numbers from /Size on are free for new objects
+        self.size = int(pdf['/Size'])
+        self.trailer = ' '.join(
+            f'{key} {format_pdf_object(pdf[key], references)}'
+            for key in ('/Root', '/Info', '/ID') if pdf[key] is not None
+        )
+
+        # AcroForm dictionary (or the catalog, when it is direct) with NeedAppearances set
+        acroform = pdf.Root.AcroForm
+        need_appearances = pdfrw.PdfDict(acroform)
+        need_appearances.NeedAppearances = pdfrw.PdfObject('true')
+        if id(acroform) in references:
+            holder = acroform
+            text = format_pdf_object(need_appearances, references)
+        else:
+            holder = pdf.Root
+            catalog = pdfrw.PdfDict(pdf.Root)
+            catalog.AcroForm = need_appearances
+            text = format_pdf_object(catalog, references)
+        self.catalog = (references[id(holder)], text)
+
+        self.fields = self._index_fields(pdf)
+
+        # First page of each copy, which the QR codes are stamped on
+        pages_per_copy = len(pdf.pages) // copies
+        self.qr_pages = []
+        for copy in range(copies):
+            page = pdf.pages[copy * pages_per_copy]
+            contents = format_pdf_object(page['/Contents'], references)
+            self.qr_pages.append((
+                self._patched(page, ('/Contents',)),
+                contents[1:-1] if contents.startswith('[') else contents,
+            ))
+        self._cached_qr_codes = {}
+
+    def _patched(self, obj, keys):
+        static = ' '.join(
+            f'{key} {format_pdf_object(value, self._references)}'
+            for key, value in dict.items(obj) if key not in keys
+        )
+        return PatchedObject(self._references[id(obj)], static, keys)
+
+    def _index_fields(self, pdf):
+        widgets = {}
+        for page in pdf.pages:
+            for annotation in page['/Annots'] or ():
+                if annotation['/Subtype'] != '/Widget':
+                    continue
+                target = annotation if annotation['/T'] else annotation['/Parent']
+                if not target:
+                    continue
+                widgets.setdefault(id(target), (target, []))[1].append(annotation)
+
+        fields = {}
+        for target, annotations in widgets.values():
+            name = target['/T'].to_unicode()
+            parent = target['/Parent']
+            while parent:
+                name = f"{parent['/T'].to_unicode()}.{name}"
+                parent = parent['/Parent']
+
+            if target['/FT'] == '/Btn':
+                on_states = set()
+                for annotation in annotations:
+                    appearances = (annotation['/AP'] or {}).get('/N')
+                    if isinstance(appearances, pdfrw.PdfDict):
+                        on_states.update(key[1:] for key in appearances.keys() if key != '/Off')
+                merged = any(annotation is target for annotation in annotations)
+                fields[name] = FormField(
+                    name=name,
+                    is_button=True,
+                    on_states=frozenset(on_states),
+                    value_objects=(
+                        self._patched(target, FIELD_VALUE_KEYS + WIDGET_STATE_KEYS if merged else FIELD_VALUE_KEYS),
+                    ),
+                    state_objects=tuple(
+                        self._patched(annotation, WIDGET_STATE_KEYS)
+                        for annotation in annotations if annotation is not target
+                    ),
+                )
+            else:
+                objects = {id(target): target, **{id(annotation): annotation for annotation in annotations}}
+                fields[name] = FormField(
+                    name=name,
+                    is_button=False,
+                    on_states=frozenset(),
+                    value_objects=tuple(self._patched(obj, TEXT_KEYS) for obj in objects.values()),
+                    state_objects=(),
+                )
+        return fields
+
+    def _field_objects(self, field, value):
+        """(number, dictionary) of every object ``field`` rewrites for ``value``."""
+        if field.is_button:
+            state = pdfrw.PdfName(value)
+            shown = state if value in field.on_states else '/Off'
+            for patched in field.value_objects:
+                entries = {'/V': state, '/AS': state}
+                yield patched.number, patched, ' '.join(f'{key} {entries[key]}' for key in patched.keys)
+            for patched in field.state_objects:
+                yield patched.number, patched, f'/AS {shown}'
+        else:
+            text = PdfString.encode(value)
+            for patched in field.value_objects:
+                yield patched.number, patched, f'/V {text} /AP {text}'
+
+    def _qr_operators(self, name, data):
+        from .qr_utils import pdf_qr_image
+
+        placement = QR_PLACEMENTS[name]
+        if name not in CACHED_QR_CODES:
+            return pdf_qr_image(data, *placement)
+        operators = self._cached_qr_codes.get((name, data))
+        if operators is None:
+            operators = self._cached_qr_codes[(name, data)] = pdf_qr_image(data, *placement)
+        return operators
+
+    def _stamp_qr_codes(self, objects, qr_codes):
+        """Add the content streams drawing ``qr_codes`` ({placement name: data}) to ``objects``."""
+        operators = ''.join(self._qr_operators(name, data) for name, data in qr_codes.items() if data)
+        if not operators:
+            return self.size
+        # The page content runs inside q ... Q, so the QR codes are drawn
+        # with the initial graphics state
+        save, stamp = (self.size, 0), (self.size + 1, 0)
+        objects[save] = '<</Length 2>>\nstream\nq\n\nendstream'
+        objects[stamp] = f'<</Length {len(operators) + 2}>>\nstream\nQ\n{operators}\nendstream'
+        for page, contents in self.qr_pages:
+            objects[page.number] = f'<<{page.static} /Contents [{save[0]} 0 R {contents} {stamp[0]} 0 R]>>'
+        return self.size + 2
+
+    def render(self, data, qr_codes=None):
+        """
+        Contract PDF bytes with ``data`` ({field name: value}) filled in and
+        ``qr_codes`` ({QR_PLACEMENTS name: encoded text}) stamped.
+        """
+        objects = {self.catalog[0]: self.catalog[1]}
+        for name, value in data.items():
+            field = self.fields.get(name)
+            if field is None:
+                continue
+            for number, patched, entries in self._field_objects(field, str(value)):
+                objects[number] = f'<<{patched.static} {entries}>>'
+        size = self._stamp_qr_codes(objects, qr_codes) if qr_codes else self.size
+
+        chunks = [self.pdf_bytes, b'\n']
+        offset = len(self.pdf_bytes) + 1
+        offsets = {}
+        for number in sorted(objects):
+            chunk = ('%d %d obj\n%s\nendobj\n' % (*number, objects[number])).encode('latin-1')
+            offsets[number] = offset
+            chunks.append(chunk)
+            offset += len(chunk)
+
+        # Cross-reference section of the update, one subsection per object
+        xref = ''.join(
+            '%d 1\n%010d %05d n \n' % (number[0], offsets[number], number[1]) for number in sorted(offsets)
+        )
+        chunks.append(
+            f'xref\n{xref}trailer\n<</Size {size} {self.trailer} /Prev {self.previous_xref}>>\n'
+            f'startxref\n{offset}\n%%EOF\n'.encode('latin-1')
+        )
+        return b''.join(chunks)
+
+
+_template_state = {
+    "templates": {},   # copies -> ContractTemplate
+}
+_template_lock = threading.Lock()
+
+
+def get_contract_template(copies=1):
+    """
+    The parsed template of this process (stacked ``copies`` times, see
+    stack_template). One stat() per call; the file is re-read only when its
+    size or modification time changes.
+    """
+    path = contract_template_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Fillable contract template not found: {path}")
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    template = _template_state["templates"].get(copies)
+    if template is not None and template.stamp == stamp:
+        return template
+
+    with _template_lock:
+        template = _template_state["templates"].get(copies)
+        if template is None or template.stamp != stamp:
+            with open(path, 'rb') as f:
+                template = ContractTemplate(f.read(), stamp, copies)
+            _template_state["templates"][copies] = template
+            logger.info("[PDF] Loaded contract template x%s (%s fields)", copies, len(template.fields))
+    return template
+
+
+def render_contract(data, copies=1, qr_codes=None):
+    """
+    Contract PDF bytes for a field mapping (see
+    fillpdf_utils.create_contract_field_mapping); with ``copies`` > 1 the
+    field names are qualified by copy, e.g. "pet2.text_3ksjz". ``qr_codes``
+    see fillpdf_utils.contract_qr_codes.
+    """
+    return get_contract_template(copies).render(data, qr_codes)
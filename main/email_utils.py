@@ -23,20 +23,24 @@ def send_application_notification_emails(application):
         # Send email to company
         send_company_notification_email(application)
     except Exception as e:
-        logger.error(f"Error sending company notification email for application {application.id}: {e}")
+        logger.error("Error sending company notification email for application %s: %s", application.id, e)
         # Don't raise - continue to try customer email
     
     try:
         # Send email to customer
         send_customer_confirmation_email(application)
     except Exception as e:
-        logger.error(f"Error sending customer confirmation email for application {application.id}: {e}")
+        logger.error("Error sending customer confirmation email for application %s: %s", application.id, e)
         # Don't raise - email failure doesn't prevent application submission
     
-    logger.info(f"Email sending attempt completed for application {application.application_number}")
+    logger.info("Email sending attempt completed for application %s", application.application_number)
 
-def send_company_notification_email(application):
-    """Send email to company about new application submission"""
+def send_company_notification_email(application, fail_silently=True):
+    """
+    Send email to company about new application submission.
+    Errors are logged; with ``fail_silently=False`` they are raised as well
+    (background jobs retry them).
+    """
     try:
         subject = f'Νέα Αίτηση Ασφάλισης - {application.application_number}'
         
@@ -72,25 +76,28 @@ def send_company_notification_email(application):
         if application.contract_pdf_path:
             try:
                 from django.core.files.storage import default_storage
+                from .pdf_optimize import optimize_contract_pdf
                 if default_storage.exists(application.contract_pdf_path):
                     with default_storage.open(application.contract_pdf_path, 'rb') as pdf:
                         email.attach(
                             f'application_{application.application_number}.pdf',
-                            pdf.read(),
+                            optimize_contract_pdf(pdf.read(), 'email'),
                             'application/pdf'
                         )
             except Exception as e:
-                logger.warning(f"Could not attach PDF to company email: {e}")
+                logger.warning("Could not attach PDF to company email: %s", e)
         
         email.send(fail_silently=False)
-        logger.info(f"Company notification email sent for application {application.application_number}")
+        logger.info("Company notification email sent for application %s", application.application_number)
         
     except Exception as e:
-        logger.error(f"Error sending company notification email: {e}")
-        # Don't raise - allow application to continue even if email fails
+        logger.error("Error sending company notification email: %s", e)
+        # Only raise when asked to - the application continues even if email fails
+        if not fail_silently:
+            raise
 
-def send_customer_confirmation_email(application):
-    """Send confirmation email to customer (with CC to company)."""
+def send_customer_confirmation_email(application, fail_silently=True):
+    """Send confirmation email to customer (with CC to company). See send_company_notification_email()."""
     try:
         # Determine greeting
         name_parts = application.full_name.split() if application.full_name else []
@@ -143,9 +150,11 @@ def send_customer_confirmation_email(application):
         result = server.sendmail(settings.DEFAULT_FROM_EMAIL, recipients, msg.as_string())
         server.quit()
 
-        logger.info(f"Confirmation email sent to {application.email}, CC {settings.COMPANY_EMAIL}")
+        logger.info("Confirmation email sent to %s, CC %s", application.email, settings.COMPANY_EMAIL)
 
     except Exception as e:
-        logger.error(f"Error sending customer confirmation email: {e}")
+        logger.error("Error sending customer confirmation email: %s", e)
+        if not fail_silently:
+            raise
 
 
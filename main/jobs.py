@@ -0,0 +1,319 @@
+"""
+Background jobs – a database-backed queue for post-submit work.
+
+The queue is a transactional outbox: enqueue() writes the BackgroundJob row
+in the caller's transaction, so a submission and the side effects it owes
+(contract PDF, emails, repricing) commit or roll back together, and the
+request itself only writes to the database. `manage.py run_workers` is the
+dispatcher: it claims due jobs with SELECT ... FOR UPDATE SKIP LOCKED, runs
+the handler registered for the job type and records the outcome. Failed
+jobs are retried with exponential backoff up to the type's max_attempts, and
+each type has a concurrency limit across all workers: a claim counts the
+type's running jobs under a per-type advisory lock, so claims of one type
+are serialized across worker processes. A job whose worker died is
+re-queued once its lease (the type's timeout) expires, or failed when it
+used its last attempt. No broker is needed: the queue lives in the
+application database.
+
+Jobs with an idempotency key exist at most once per key, so replaying the
+enqueue (a retried request) never duplicates an effect. Handlers must be
+safe to run again after a crash: contracts are content addressed and
+repricing is skipped when the inputs are unchanged. An email is sent twice
+only when its worker dies between sending it and recording the job as done.
+"""
+
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Retry backoff: RETRY_DELAY * 2 ** (attempt - 1) seconds, at most RETRY_MAX_DELAY
+RETRY_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+
+
+class JobType(NamedTuple):
+    name: str
+    handler: Callable    # handler(job), raises to fail / retry the job
+    concurrency: int     # running jobs of this type at once, all workers together
+    max_attempts: int
+    timeout: int         # seconds before a running job counts as abandoned
+
+
+JOB_TYPES = {}
+
+
+def job_type(name, concurrency=2, max_attempts=5, timeout=10 * 60):
+    """Register the decorated function as the handler of ``name`` jobs."""
+    def register(handler):
+        JOB_TYPES[name] = JobType(name, handler, concurrency, max_attempts, timeout)
+        return handler
+    return register
+
+
+class JobDeferred(Exception):
+    """Raised by a handler that cannot run yet; re-queued without using an attempt."""
+
+    def __init__(self, message='', delay=RETRY_DELAY):
+        super().__init__(message)
+        self.delay = delay
+
+
+# ----------------------------------------------------
+#  ENQUEUE
+# ----------------------------------------------------
+
+def enqueue(name, application=None, payload=None, delay=0, key=None):
+    """
+    Write a ``name`` job in the current transaction (right away in
+    autocommit): workers see it once the transaction commits and never for
+    rows that were rolled back. A queued job of the same type for the same
+    application and payload is not added twice.
+
+    With an idempotency ``key`` the job is added at most once, whatever the
+    state of the first one; an equal queued job without a key (e.g. repricing
+    scheduled by a model save) takes the key instead of a second row.
+    """
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import BackgroundJob
+
+    if name not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {name}")
+
+    application_id = application.pk if application is not None else None
+    payload = payload or {}
+    queued = Q(job_type=name, application_id=application_id, payload=payload, status='queued')
+    if key is None:
+        if BackgroundJob.objects.filter(queued).exists():
+            return
+    else:
+        existing = list(
+            BackgroundJob.objects.filter(Q(idempotency_key=key) | queued & Q(idempotency_key=None))
+            .values_list('pk', 'idempotency_key')
+        )
+        if any(existing_key == key for _, existing_key in existing):
+            return
+        if existing:
+            BackgroundJob.objects.filter(pk=existing[0][0]).update(idempotency_key=key)
+            return
+    # ignore_conflicts: a concurrent transaction adding the same key wins
+    BackgroundJob.objects.bulk_create([BackgroundJob(
+        job_type=name,
+        application_id=application_id,
+        payload=payload,
+        idempotency_key=key,
+        max_attempts=JOB_TYPES[name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=key is not None)
+
+
+# ----------------------------------------------------
+#  WORKER SIDE
+# ----------------------------------------------------
+
+# Serializes claims of the threads of one process, so they never race each
+# other past a concurrency limit
+_claim_lock = threading.Lock()
+
+# First key of the PostgreSQL advisory locks of job types ('JOBS'); the
+# second is hashtext(job type)
+JOB_LOCK_NAMESPACE = 0x4A4F4253
+
+
+def lock_job_types(names):
+    """
+    Take the transaction-level lock of every job type in ``names`` that no
+    other worker holds and return those types. Another worker's claim of a
+    type is never waited for: its types are left to it this round.
+
+    PostgreSQL only; elsewhere every type is returned, which is safe where
+    write transactions are serialized anyway (SQLite, during development).
+    """
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        return list(names)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM unnest(%s::text[]) AS name "
+            "WHERE pg_try_advisory_xact_lock(%s, hashtext(name))",
+            [list(names), JOB_LOCK_NAMESPACE],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def retry_delay(attempts):
+    """Seconds before retrying a job that failed its ``attempts``-th attempt (with 10% jitter)."""
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def claim_job(worker, names=None):
+    """
+    Mark the oldest due job of a type with free capacity as running by
+    ``worker`` and return it, or None when there is nothing to do. The
+    running jobs of a type are counted and the job claimed under the type's
+    lock (lock_job_types), so no two workers fill its last slot.
+    """
+    from django.db import transaction
+    from django.db.models import Count, F
+    from django.utils import timezone
+    from .models import BackgroundJob
+
+    with _claim_lock, transaction.atomic():
+        locked = lock_job_types([name for name in JOB_TYPES if names is None or name in names])
+        running = dict(
+            BackgroundJob.objects.filter(status='running', job_type__in=locked)
+            .values_list('job_type').annotate(Count('id')).order_by()
+        )
+        available = [name for name in locked if running.get(name, 0) < JOB_TYPES[name].concurrency]
+        if not available:
+            return None
+
+        now = timezone.now()
+        job = (
+            BackgroundJob.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_at__lte=now, job_type__in=available)
+            .order_by('run_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        # Conditional update: also safe on databases without row locks (SQLite)
+        claimed = BackgroundJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns the job's new status."""
+    from django.utils import timezone
+    from .models import BackgroundJob
+
+    spec = JOB_TYPES.get(job.job_type)
+    pending = BackgroundJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by)
+    try:
+        if spec is None:
+            raise LookupError(f"No handler registered for job type {job.job_type}")
+        spec.handler(job)
+    except JobDeferred as e:
+        logger.info("[JOBS] %s deferred for %ss: %s", job, e.delay, e)
+        pending.update(
+            status='queued', attempts=job.attempts - 1, locked_by='', locked_at=None,
+            run_at=timezone.now() + timedelta(seconds=e.delay),
+        )
+        return 'queued'
+    except Exception as e:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("[JOBS] %s failed permanently after %s attempts: %s", job, job.attempts, e)
+            pending.update(status='failed', last_error=error, locked_by='', locked_at=None, finished_at=timezone.now())
+            return 'failed'
+        delay = retry_delay(job.attempts)
+        logger.warning("[JOBS] %s attempt %s/%s failed, retrying in %.0fs: %s", job, job.attempts, job.max_attempts, delay, e)
+        pending.update(
+            status='queued', last_error=error, locked_by='', locked_at=None,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        return 'queued'
+
+    pending.update(status='done', locked_by='', locked_at=None, finished_at=timezone.now())
+    logger.info("[JOBS] %s done (attempt %s)", job, job.attempts)
+    return 'done'
+
+
+def requeue_abandoned_jobs():
+    """
+    Put running jobs whose lease expired (worker killed mid-job) back in the
+    queue. Jobs that used their last attempt fail instead: a job that keeps
+    crashing its worker is not run forever.
+    """
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import BackgroundJob
+
+    now = timezone.now()
+    requeued = failed = 0
+    for spec in JOB_TYPES.values():
+        abandoned = BackgroundJob.objects.filter(
+            job_type=spec.name, status='running', locked_at__lt=now - timedelta(seconds=spec.timeout),
+        )
+        failed += abandoned.filter(attempts__gte=F('max_attempts')).update(
+            status='failed', last_error='Worker lost the job on its last attempt (lease expired)',
+            locked_by='', locked_at=None, finished_at=now,
+        )
+        requeued += abandoned.update(status='queued', locked_by='', locked_at=None, run_at=now)
+    if failed:
+        logger.error("[JOBS] %s abandoned job(s) failed after their last attempt", failed)
+    if requeued:
+        logger.warning("[JOBS] Re-queued %s abandoned job(s)", requeued)
+    return requeued
+
+
+def run_pending_jobs(worker='inline', names=None):
+    """Run due jobs in this thread until none is left; returns {status: count}."""
+    results = {}
+    while True:
+        job = claim_job(worker, names)
+        if job is None:
+            return results
+        status = run_job(job)
+        results[status] = results.get(status, 0) + 1
+
+
+# ----------------------------------------------------
+#  HANDLERS
+# ----------------------------------------------------
+
+def job_application(job):
+    from .models import InsuranceApplication
+    return InsuranceApplication.objects.select_related('questionnaire').get(pk=job.application_id)
+
+
+@job_type('generate_contract', concurrency=2)
+def generate_contract(job):
+    """Contract PDF(s) of a submitted application."""
+    from .utils import generate_contract_pdf
+
+    application = job_application(job)
+    pdf_paths = generate_contract_pdf(application)
+    if not pdf_paths:
+        raise RuntimeError(f"No contract PDF generated for application {application.id}")
+    # Store the first PDF (or the only one) - this contains all application data
+    application.contract_pdf_path = pdf_paths[0]
+    application.contract_generated = True
+    application.save(update_fields=['contract_pdf_path', 'contract_generated'])
+
+
+@job_type('recalculate_premium', concurrency=4)
+def recalculate_premium(job):
+    from .utils import recalculate_application_premium
+    recalculate_application_premium(job_application(job), raise_errors=True)
+
+
+@job_type('company_email', concurrency=2)
+def company_email(job):
+    """Company notification; waits for the contract job so the PDF is attached."""
+    from .email_utils import send_company_notification_email
+    from .models import BackgroundJob
+
+    if BackgroundJob.objects.filter(
+        application_id=job.application_id, job_type='generate_contract', status__in=['queued', 'running']
+    ).exists():
+        raise JobDeferred('contract PDF not generated yet')
+    send_company_notification_email(job_application(job), fail_silently=False)
+
+
+@job_type('customer_email', concurrency=2)
+def customer_email(job):
+    from .email_utils import send_customer_confirmation_email
+    send_customer_confirmation_email(job_application(job), fail_silently=False)
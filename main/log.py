@@ -0,0 +1,115 @@
+"""
+Logging off the request thread, with request-id correlation.
+
+settings.LOGGING sends the records of the app's loggers to a
+QueueListenerHandler: the request thread only merges the %-style message
+and puts the record on an in-process queue, and a listener thread formats
+it and writes it to the real handlers (console, payments.log). Messages
+are only merged for enabled levels, so a disabled DEBUG line costs one
+isEnabledFor() check.
+
+Every record carries the id of the request it was logged in
+(``%(request_id)s``, set by main.middleware.RequestIdMiddleware), and
+DEBUG records can be sampled with DebugSamplingFilter.
+"""
+
+import contextvars
+import copy
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Id of the request being handled, '-' outside of requests (jobs, commands)
+request_id = contextvars.ContextVar('request_id', default='-')
+
+
+def handler_by_name(name):
+    """Handler configured as ``name`` in settings.LOGGING, or None."""
+    # logging.getHandlerByName() is Python 3.12+
+    if hasattr(logging, 'getHandlerByName'):
+        return logging.getHandlerByName(name)
+    return logging._handlers.get(name)
+
+
+class RequestIdFilter(logging.Filter):
+    """Sets ``record.request_id``; must run on the logging thread (a handler before the queue)."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Passes every record above DEBUG and a ``rate`` fraction (0 to 1) of the DEBUG ones."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Queues the records for the handlers named in ``targets`` of
+    settings.LOGGING, which a listener thread writes them to (each at its
+    own level). The listener starts with the first record, and again in a
+    forked process (e.g. a generate_contracts worker), which does not
+    inherit the thread.
+    """
+
+    def __init__(self, targets=()):
+        super().__init__(queue.SimpleQueue())
+        self.targets = []
+        for name in targets:
+            handler = handler_by_name(name)
+            if handler is None:
+                # dictConfig retries the handlers that fail with this message
+                raise ValueError(f"Queue handler {name!r}: target not configured yet")
+            self.targets.append(handler)
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            # A fresh queue: a forked process must not share its parent's
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+            # Drains the queue at exit, also in multiprocessing workers,
+            # which end without running atexit handlers
+            from multiprocessing import util
+            util.Finalize(None, self.stop, exitpriority=10)
+
+    def stop(self):
+        with self.start_lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def prepare(self, record):
+        # Only the message is merged here, while its arguments (model
+        # instances, request data) are current: formatters run on the
+        # listener thread. exc_info stays for them to format.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        super().close()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: contract PDF filling before and after the cached template.
+
+"fillpdf" is what every contract used to do: fillpdfs.write_fillable_pdf()
+re-reads and re-parses the template, walks every annotation and writes the
+result to a file. "cached template" fills the per-process parsed template
+(main.contract_template) in memory. Both get the same field values;
+"cached template + QR codes" also stamps the verification and terms QR
+codes, as contracts are generated.
+"""
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.contract_template import contract_template_path, get_contract_template, render_contract
+from main.fillpdf_utils import contract_field_data, contract_qr_codes
+from main.models import InsuranceApplication
+
+
+class Command(BaseCommand):
+    help = 'Benchmark contracts per second: fillpdf (parse per contract) vs the cached in-memory template'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--application',
+            type=int,
+            help='Application id whose contract is rendered (default: latest with a generated contract)'
+        )
+        parser.add_argument(
+            '--number',
+            type=int,
+            default=50,
+            help='Contracts rendered per measurement (default: 50)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Measurements to take, best one is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        from fillpdf import fillpdfs
+
+        applications = InsuranceApplication.objects.select_related('questionnaire')
+        if options['application']:
+            application = applications.filter(pk=options['application']).first()
+        else:
+            application = applications.filter(contract_generated=True).order_by('-id').first()
+        if application is None:
+            raise CommandError('No application to render')
+
+        try:
+            data = contract_field_data(application)
+            qr_codes = contract_qr_codes(application)
+        except (AttributeError, ValueError) as e:
+            raise CommandError(f'Cannot build contract fields for application #{application.pk}: {e}')
+
+        number = options['number']
+        template_path = contract_template_path()
+
+        started = time.perf_counter()
+        get_contract_template()
+        self.stdout.write(f'\nTemplate parsed and indexed once in {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, 'contract.pdf')
+
+            def fillpdf():
+                fillpdfs.write_fillable_pdf(template_path, output_path, data, flatten=False)
+
+            cases = [
+                ('fillpdf (parse + walk + write file)', fillpdf),
+                ('cached template (in memory)', lambda: render_contract(data)),
+                ('cached template + QR codes', lambda: render_contract(data, qr_codes=qr_codes)),
+            ]
+
+            self.stdout.write(f'\nContract #{application.pk} (best of {options["repeat"]} x {number} contracts)\n')
+            results = {}
+            for label, func in cases:
+                best = float('inf')
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    for _ in range(number):
+                        func()
+                    best = min(best, time.perf_counter() - started)
+                results[label] = number / best
+                self.stdout.write(
+                    f'  {label:<40} {best / number * 1000:8.2f} ms/contract  {number / best:8.1f} contracts/s'
+                )
+
+        before, after, with_qr = results.values()
+        self.stdout.write(self.style.SUCCESS(
+            f'\nSpeed-up: {after / before:.1f}x ({with_qr / before:.1f}x with QR codes)'
+        ))
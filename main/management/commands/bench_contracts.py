@@ -0,0 +1,162 @@
+"""
+Benchmark: stage timings of contract generation on synthetic applications.
+
+Creates N applications covering dog / cat, one / two pets and every payment
+frequency and program, generates their contracts with
+generate_contract_pdf() (and generate_contract_with_fillpdf() per pet) on
+a temporary local storage and reports p50 / p95 / p99 of every stage, from
+the [TIMING] records of main.timing. Everything runs in one transaction
+that is rolled back, and nothing leaves the machine: no S3, no email.
+"""
+import logging
+import math
+import os
+import tempfile
+import time
+from datetime import date
+from itertools import product
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from main.contract_template import get_contract_template
+from main.fillpdf_utils import generate_contract_with_fillpdf
+from main.models import InsuranceApplication, Questionnaire
+from main.utils import generate_contract_pdf
+
+PET_TYPES = ['dog', 'cat']
+PET_COUNTS = [1, 2]
+FREQUENCIES = [value for value, _ in Questionnaire.PAYMENT_FREQUENCY_CHOICES]
+PROGRAMS = ['silver', 'gold', 'platinum']
+WEIGHTS = ['up_10', '10_25', '25_40', 'over_40']
+
+
+def weight(index, pet_type):
+    # Cats are priced in the first weight band
+    return WEIGHTS[index % len(WEIGHTS)] if pet_type == 'dog' else WEIGHTS[0]
+
+
+class TimingRecords(logging.Handler):
+    """Collects the stage durations of main.timing records: {operation: {stage: [seconds]}}."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.timings = {}
+
+    def emit(self, record):
+        stages = self.timings.setdefault(record.operation, {})
+        for name, seconds in record.stages.items():
+            stages.setdefault(name, []).append(seconds)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted ``values``."""
+    return values[max(math.ceil(p / 100 * len(values)), 1) - 1]
+
+
+def synthetic_application(index, pet_type, pets, frequency, program):
+    application = InsuranceApplication.objects.create(
+        full_name=f'Bench Customer {index}', afm=f'{100000000 + index}'[:9], phone='6900000000',
+        address=f'Bench Street {index}', postal_code='11111', email=f'bench{index}@example.com',
+        pet_name=f'Pet {index}', pet_type=pet_type, pet_gender='male', pet_breed='Mixed',
+        pet_birthdate=date(2020, 1 + index % 12, 1),
+        pet_weight_category=weight(index, pet_type),
+        has_second_pet=pets == 2,
+        second_pet_name=f'Second Pet {index}' if pets == 2 else None,
+        second_pet_type=pet_type if pets == 2 else None,
+        second_pet_gender='female' if pets == 2 else None,
+        second_pet_breed='Mixed' if pets == 2 else None,
+        second_pet_birthdate=date(2021, 1 + index % 12, 1) if pets == 2 else None,
+        second_pet_weight_category=weight(index + 1, pet_type) if pets == 2 else None,
+        program=program, health_status='healthy',
+    )
+    Questionnaire.objects.create(
+        application=application, program=program, payment_frequency=frequency, payment_method='card',
+        additional_poisoning_coverage=index % 2 == 0, additional_blood_checkup=index % 3 == 0,
+        special_breed_5_percent=index % 5 == 0,
+    )
+    return application
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate the contracts of N synthetic applications (dog/cat, one/two pets, every '
+        'payment frequency) on local storage and report p50/p95/p99 per generation stage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--number',
+            type=int,
+            default=48,
+            help='Synthetic applications to generate (default: 48, four of each kind)'
+        )
+        parser.add_argument(
+            '--merged',
+            action='store_true',
+            help='One PDF with both contracts for two-pet applications'
+        )
+
+    def handle(self, *args, **options):
+        kinds = list(product(PET_TYPES, PET_COUNTS, FREQUENCIES))
+        number = max(options['number'], 1)
+
+        timing_logger = logging.getLogger('main.timing')
+        records = TimingRecords()
+        saved = timing_logger.handlers, timing_logger.level, timing_logger.propagate, logging.getLogger('main').level
+        timing_logger.handlers, timing_logger.propagate = [records], False
+        timing_logger.setLevel(logging.INFO)
+        if options['verbosity'] < 2:
+            # Per-contract INFO lines of the PDF code
+            logging.getLogger('main').setLevel(logging.WARNING)
+
+        storages = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        }
+        # Parsed once per process: not part of any contract's timings
+        started = time.perf_counter()
+        get_contract_template()
+        self.stdout.write(f'Template parsed in {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        started = time.perf_counter()
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir, \
+                    override_settings(STORAGES=storages, MEDIA_ROOT=temp_dir), \
+                    transaction.atomic():
+                self.stdout.write(
+                    f'Generating contracts of {number} synthetic application(s) '
+                    f'({len(kinds)} kinds) on local storage in {temp_dir}'
+                )
+                for index in range(number):
+                    pet_type, pets, frequency = kinds[index % len(kinds)]
+                    program = PROGRAMS[index // len(kinds) % len(PROGRAMS)]
+                    application = synthetic_application(index, pet_type, pets, frequency, program)
+                    generate_contract_pdf(application, merged=options['merged'], force=True)
+                    for pet_number in range(1, pets + 1):
+                        generate_contract_with_fillpdf(
+                            application, os.path.join(temp_dir, f'fillpdf_{index}_{pet_number}.pdf'), pet_number
+                        )
+                # Synthetic rows never reach the database
+                transaction.set_rollback(True)
+        finally:
+            timing_logger.handlers, level, timing_logger.propagate, main_level = saved
+            timing_logger.setLevel(level)
+            logging.getLogger('main').setLevel(main_level)
+
+        for operation, stages in records.timings.items():
+            self.stdout.write(f'\n{operation} ({len(stages["total"])} runs, ms)')
+            self.stdout.write(f'  {"stage":<16} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9}')
+            for name, values in stages.items():
+                values.sort()
+                self.stdout.write(
+                    f'  {name:<16} ' + ' '.join(
+                        f'{value * 1000:9.2f}'
+                        for value in (percentile(values, 50), percentile(values, 95), percentile(values, 99), values[-1])
+                    )
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{number} application(s) in {time.perf_counter() - started:.1f}s, all rolled back'
+        ))
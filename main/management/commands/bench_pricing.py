@@ -0,0 +1,132 @@
+"""
+Micro-benchmark: quote latency before and after the pricing engine.
+
+"before" replays what a request used to do: rebuild the DOG/CAT pricing dict
+literals, walk the nested tables and apply surcharges / add-ons by hand.
+"after" is a single main.pricing quote against the precompiled index, with
+and without the quote cache.
+"""
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from main import pricing
+
+
+def legacy_quote(pet_type, program, weight, frequency, s5, s20, poisoning, blood):
+    """Per-request pricing as done inline in views.user_data before the engine."""
+    DOG_PRICING = {
+        'silver': {
+            '10': {'annual': 166.75, 'six_month': 87.54, 'three_month': 45.86},
+            '11-20': {'annual': 207.20, 'six_month': 108.78, 'three_month': 56.98},
+            '21-40': {'annual': 234.14, 'six_month': 122.92, 'three_month': 64.39},
+            '>40': {'annual': 254.36, 'six_month': 133.54, 'three_month': 69.95}
+        },
+        'gold': {
+            '10': {'annual': 234.14, 'six_month': 122.92, 'three_month': 64.39},
+            '11-20': {'annual': 261.09, 'six_month': 137.07, 'three_month': 71.80},
+            '21-40': {'annual': 288.05, 'six_month': 151.23, 'three_month': 79.21},
+            '>40': {'annual': 308.26, 'six_month': 161.84, 'three_month': 84.77}
+        },
+        'platinum': {
+            '10': {'annual': 368.92, 'six_month': 193.68, 'three_month': 101.45},
+            '11-20': {'annual': 389.15, 'six_month': 204.30, 'three_month': 107.02},
+            '21-40': {'annual': 409.36, 'six_month': 214.91, 'three_month': 112.57},
+            '>40': {'annual': 436.32, 'six_month': 229.07, 'three_month': 119.99}
+        }
+    }
+    CAT_PRICING = {
+        'silver': {
+            '10': {'annual': 113.81, 'six_month': 59.75, 'three_month': 31.30},
+            '11-20': {'annual': 141.02, 'six_month': 74.04, 'three_month': 38.78}
+        },
+        'gold': {
+            '10': {'annual': 168.22, 'six_month': 88.31, 'three_month': 46.26},
+            '11-20': {'annual': 188.61, 'six_month': 99.02, 'three_month': 51.87}
+        },
+        'platinum': {
+            '10': {'annual': 277.02, 'six_month': 145.44, 'three_month': 76.18},
+            '11-20': {'annual': 311.02, 'six_month': 163.29, 'three_month': 85.53}
+        }
+    }
+    weight_mapping = {
+        "up_10": "10", "10_25": "11-20", "25_40": "21-40", "over_40": ">40",
+        "10": "10", "11-20": "11-20", "21-40": "21-40", ">40": ">40",
+    }
+    poisoning_prices = {'silver': 18, 'gold': 20, 'platinum': 25, 'dynasty': 25}
+    addon_factor = {'annual': 1, 'six_month': 0.5, 'three_month': 0.25}[frequency]
+
+    table = DOG_PRICING if pet_type == 'dog' else CAT_PRICING
+    value = table[program][weight_mapping[weight]][frequency]
+    if s5:
+        value = value * 1.05
+    if s20:
+        value = value * 1.20
+    if poisoning:
+        value += round(poisoning_prices[program] * addon_factor, 2)
+    if blood:
+        value += round(28.00 * addon_factor, 2)
+    return round(value, 2)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark quote latency: legacy inline tables vs the precompiled pricing engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--number',
+            type=int,
+            default=20000,
+            help='Quotes per measurement (default: 20000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Measurements to take, best one is reported (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        number = options['number']
+        repeat = options['repeat']
+
+        args = ('dog', 'gold', '21-40', 'six_month', True, False, True, True)
+        legacy = legacy_quote(*args)
+        engine = pricing.quote(
+            'dog', 'gold', '21-40', 'six_month',
+            special_breed_5_percent=True, poisoning=True, blood_checkup=True,
+        ).gross
+        if legacy != engine:
+            self.stdout.write(self.style.ERROR(f'Mismatch: legacy={legacy} engine={engine}'))
+            return
+
+        tariff = pricing.get_active_tariff()
+        cases = [
+            ('legacy inline tables (1 frequency)', lambda: legacy_quote(*args)),
+            ('legacy inline tables (3 frequencies)', lambda: [
+                legacy_quote('dog', 'gold', '21-40', freq, True, False, True, True)
+                for freq in ('annual', 'six_month', 'three_month')
+            ]),
+            ('pricing engine, uncached (1 frequency)', lambda: pricing._price(
+                tariff, 'dog', 'gold', '21-40', '6m', False, True, False, True, True, None,
+            )),
+            ('pricing.quote (1 frequency)', lambda: pricing.quote(
+                'dog', 'gold', '21-40', 'six_month',
+                special_breed_5_percent=True, poisoning=True, blood_checkup=True,
+            )),
+            ('pricing.quote_frequencies (3 frequencies)', lambda: pricing.quote_frequencies(
+                'dog', 'gold', '21-40',
+                special_breed_5_percent=True, poisoning=True, blood_checkup=True,
+            )),
+        ]
+
+        self.stdout.write(f'\nQuote latency (best of {repeat} x {number} calls)\n')
+        for label, func in cases:
+            best = min(timeit.repeat(func, number=number, repeat=repeat))
+            self.stdout.write(f'  {label:<45} {best / number * 1e6:8.2f} µs/call')
+
+        info = pricing.QUOTE_CACHE.info()
+        self.stdout.write(
+            f"\nQuote cache: {info['hits']} hits, {info['misses']} misses "
+            f"(hit ratio {info['hit_ratio']:.2%}), {info['size']}/{info['maxsize']} entries\n"
+        )
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from main.models import InsuranceApplication
-from main.fillpdf_utils import create_contract_field_mapping, get_pricing_values, normalize_weight
+from main.fillpdf_utils import create_contract_field_mapping, get_pet_premium, normalize_weight
 
 
 class Command(BaseCommand):
@@ -26,18 +26,11 @@ class Command(BaseCommand):
         self.stdout.write(f"PDF Path: {app.contract_pdf_path}")
         self.stdout.write(f"{'='*80}\n")
         
-        # Get pricing with correct frequency key
+        # Stored pricing of the first pet for its payment frequency
         weight = normalize_weight(str(app.pet_weight_category))
-        payment_freq = app.get_payment_frequency() or "annual"
-        freq_map = {"annual": "annual", "six_month": "6m", "three_month": "3m"}
-        freq_key = freq_map.get(payment_freq, "annual")
-        
-        try:
-            net, fee, ipt, gross = get_pricing_values(
-                app, app.pet_type, weight, app.program, freq_key
-            )
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error getting pricing: {e}"))
+        premium = get_pet_premium(app, 1, app.get_payment_frequency() or "annual")
+        if premium is None:
+            self.stdout.write(self.style.ERROR("No stored premium for this application"))
             return
         
         # Create field mapping
@@ -49,10 +42,11 @@ class Command(BaseCommand):
             pet_weight=app.get_weight_display(weight) if weight else "",
             pet_birthdate=app.pet_birthdate.strftime('%d/%m/%Y') if app.pet_birthdate else "",
             contract_suffix="",
-            net_premium=net,
-            fee=fee,
-            ipt=ipt,
-            gross=gross
+            net_premium=premium.net,
+            fee=premium.fee,
+            ipt=premium.ipt,
+            gross=premium.gross,
+            premium=premium,
         )
         
         self.stdout.write("\n📝 PDF FIELD VALUES:\n")
@@ -0,0 +1,62 @@
+"""
+Before/after byte sizes of a contract PDF at every optimization level
+(main.pdf_optimize), to choose the CONTRACT_PDF_OPTIMIZE settings.
+"""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from main.contract_template import render_contract
+from main.fillpdf_utils import contract_field_data, contract_qr_codes
+from main.models import InsuranceApplication
+from main.pdf_optimize import OPTIMIZATION_LEVELS, contract_pdf_optimization, optimize_pdf
+
+
+class Command(BaseCommand):
+    help = 'Report contract PDF sizes and optimization time for each level (none, compress, flatten)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--application',
+            type=int,
+            help='Application id whose contract is rendered (default: latest with a generated contract)'
+        )
+        parser.add_argument(
+            '--stored',
+            action='store_true',
+            help="Optimize the application's stored PDF instead of a fresh render"
+        )
+
+    def handle(self, *args, **options):
+        applications = InsuranceApplication.objects.select_related('questionnaire')
+        if options['application']:
+            application = applications.filter(pk=options['application']).first()
+        else:
+            application = applications.filter(contract_generated=True).order_by('-id').first()
+        if application is None:
+            raise CommandError('No application found')
+
+        if options['stored']:
+            if not application.contract_pdf_path:
+                raise CommandError(f'Application #{application.pk} has no stored contract')
+            with default_storage.open(application.contract_pdf_path, 'rb') as pdf:
+                pdf_bytes = pdf.read()
+            source = application.contract_pdf_path
+        else:
+            try:
+                pdf_bytes = render_contract(contract_field_data(application), qr_codes=contract_qr_codes(application))
+            except (AttributeError, ValueError) as e:
+                raise CommandError(f'Cannot build contract fields for application #{application.pk}: {e}')
+            source = 'rendered'
+
+        self.stdout.write(f'\nContract #{application.pk} ({source}): {len(pdf_bytes)} bytes\n')
+        for level in OPTIMIZATION_LEVELS:
+            result = optimize_pdf(pdf_bytes, level)
+            saved = 1 - result.size / result.original_size
+            self.stdout.write(
+                f'  {level:<10} {result.size:>10} bytes  {saved:6.1%} smaller  {result.seconds * 1000:8.1f} ms'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nConfigured: archive={contract_pdf_optimization('archive')}, "
+            f"email={contract_pdf_optimization('email')}"
+        ))
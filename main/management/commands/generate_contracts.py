@@ -0,0 +1,314 @@
+"""
+Batch contract generation, e.g. after a template or tariff change.
+
+PDFs are filled in a process pool sized to the CPU count; every worker
+process parses the contract template once (main.contract_template) and
+renders batches of applications in memory. The PDF bytes come back to the
+parent, which uploads them through a bounded thread pool, records them as
+the application's next ContractDocument version and writes each finished
+application to a progress file, so a crashed or interrupted run continues
+where it stopped with --resume.
+"""
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from main.models import InsuranceApplication
+from main.utils import record_contract_documents
+
+
+def init_worker():
+    """Process pool initializer: Django (for spawned workers) and the parsed template."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+    from main.contract_template import get_contract_template
+    get_contract_template()
+
+
+def render_batch(application_ids, merged=False, force=False):
+    """
+    Worker process: render the contracts of a batch of applications.
+    Returns [(application id, [(pet number, storage key, content digest, PDF
+    bytes)] or None when the stored contract is current, content digest,
+    error or None)].
+    """
+    from main.contract_template import render_contract
+    from main.fillpdf_utils import contract_contents
+    from main.pdf_optimize import optimize_contract_pdf
+    from main.utils import (
+        contract_digest, contract_storage_keys, current_contract_documents, recalculate_application_premium,
+    )
+
+    applications = InsuranceApplication.objects.select_related('questionnaire').in_bulk(application_ids)
+    stored = {}
+    for document in current_contract_documents(application_ids):
+        stored.setdefault(document.application_id, []).append(document.storage_key)
+    results = []
+    for application_id in application_ids:
+        application = applications.get(application_id)
+        if application is None:
+            results.append((application_id, None, '', 'application not found'))
+            continue
+        try:
+            # Same as generate_contract_pdf(): premiums must match the current inputs
+            recalculate_application_premium(application, force=application.annual_premium is None)
+            contents = contract_contents(application, merged=merged)
+            keys = contract_storage_keys(application, contents)
+            digest = contract_digest(contents)
+            if (
+                not force and application.contract_generated
+                and application.contract_digest == digest and application.contract_pdf_path == keys[0]
+                and sorted(stored.get(application_id, [])) == sorted(keys)
+            ):
+                results.append((application_id, None, digest, None))
+                continue
+            documents = [
+                (
+                    content.pet_number, key, content.digest,
+                    optimize_contract_pdf(render_contract(content.data, content.copies, content.qr_codes), 'archive'),
+                )
+                for content, key in zip(contents, keys)
+            ]
+            results.append((application_id, documents, digest, None))
+        except Exception as e:
+            results.append((application_id, None, '', f'{type(e).__name__}: {e}'))
+    return results
+
+
+def upload_documents(documents):
+    """Upload thread: store the PDFs of one application, returns [(pet number, path, size, digest)]."""
+    from main.utils import store_contract_pdf
+    stored = []
+    for pet_number, key, digest, data in documents:
+        path, size, _ = store_contract_pdf(key, lambda data=data: data)
+        stored.append((pet_number, path, size, digest))
+    return stored
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenerate contract PDFs for the selected applications in parallel: '
+        'rendering in a process pool, uploads in a thread pool, with progress '
+        'reporting and --resume after an interrupted run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Applications created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Applications created on or before this date (YYYY-MM-DD)')
+        parser.add_argument(
+            '--status',
+            choices=[value for value, _ in InsuranceApplication.STATUS_CHOICES],
+            help='Only applications with this status'
+        )
+        parser.add_argument(
+            '--program',
+            choices=['silver', 'gold', 'platinum'],
+            help='Only applications of this program'
+        )
+        parser.add_argument(
+            '--missing-pdf',
+            action='store_true',
+            help='Only applications without a generated contract'
+        )
+        parser.add_argument('--ids', help='Comma-separated application ids')
+        parser.add_argument('--limit', type=int, help='At most this many applications')
+        parser.add_argument(
+            '--merged',
+            action='store_true',
+            default=None,
+            help='One PDF with both contracts for two-pet applications (default: CONTRACT_MERGE_PETS setting)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render even when the stored contract has the same content digest'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Rendering processes (default: CPU count)'
+        )
+        parser.add_argument(
+            '--upload-threads',
+            type=int,
+            default=8,
+            help='Concurrent uploads to storage (default: 8)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=25,
+            help='Applications rendered per worker task (default: 25)'
+        )
+        parser.add_argument(
+            '--progress-file',
+            default='generate_contracts.progress',
+            help='Ids of finished applications, one per line (default: generate_contracts.progress)'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Skip applications already listed in the progress file'
+        )
+        parser.add_argument(
+            '--report-every',
+            type=float,
+            default=5.0,
+            help='Seconds between progress lines (default: 5)'
+        )
+
+    def selected_ids(self, options):
+        queryset = InsuranceApplication.objects.all()
+        try:
+            if options['since']:
+                queryset = queryset.filter(created_at__date__gte=datetime.strptime(options['since'], '%Y-%m-%d').date())
+            if options['until']:
+                queryset = queryset.filter(created_at__date__lte=datetime.strptime(options['until'], '%Y-%m-%d').date())
+            if options['ids']:
+                queryset = queryset.filter(pk__in=[int(pk) for pk in options['ids'].split(',') if pk.strip()])
+        except ValueError as e:
+            raise CommandError(f'Invalid filter: {e}')
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if options['program']:
+            queryset = queryset.filter(program=options['program'])
+        if options['missing_pdf']:
+            queryset = queryset.filter(Q(contract_generated=False) | Q(contract_pdf_path='') | Q(contract_pdf_path__isnull=True))
+        ids = queryset.order_by('pk').values_list('pk', flat=True)
+        if options['limit']:
+            ids = ids[:options['limit']]
+        return list(ids)
+
+    def handle(self, *args, **options):
+        ids = self.selected_ids(options)
+        progress_path = options['progress_file']
+
+        finished = set()
+        if options['resume'] and os.path.exists(progress_path):
+            with open(progress_path) as f:
+                finished = {int(line) for line in f if line.strip()}
+            ids = [pk for pk in ids if pk not in finished]
+            self.stdout.write(f'Resuming: {len(finished)} application(s) already done')
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('Nothing to generate'))
+            return
+
+        if options['verbosity'] < 2:
+            # Per-contract INFO lines of the PDF code, in every worker
+            logging.getLogger('main').setLevel(logging.WARNING)
+
+        merged = options['merged'] if options['merged'] is not None else getattr(settings, 'CONTRACT_MERGE_PETS', False)
+        batch_size = max(options['batch_size'], 1)
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        processes = max(options['processes'], 1)
+        upload_threads = max(options['upload_threads'], 1)
+        self.stdout.write(
+            f'Generating contracts for {len(ids)} application(s): {processes} process(es), '
+            f'{upload_threads} upload thread(s), {len(batches)} batch(es)'
+        )
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+
+        done = unchanged = pdfs = uploaded_bytes = 0
+        failures = []
+        started = last_report = time.monotonic()
+
+        def report(final=False):
+            elapsed = time.monotonic() - started
+            processed = done + unchanged + len(failures)
+            rate = processed / elapsed if elapsed else 0
+            eta = f', ETA {(len(ids) - processed) / rate:.0f}s' if rate and not final else ''
+            self.stdout.write(
+                f'  {processed}/{len(ids)} applications, {pdfs} PDFs, {unchanged} unchanged, '
+                f'{len(failures)} failed, {rate:.1f} applications/s{eta}'
+            )
+
+        with open(progress_path, 'a' if options['resume'] else 'w') as progress, \
+                ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as renderers, \
+                ThreadPoolExecutor(max_workers=upload_threads) as uploaders:
+            pending_batches = iter(batches)
+            rendering = {}
+            uploading = {}
+
+            def submit_batches():
+                # At most two batches per process in flight, and rendered PDFs
+                # wait for a bounded number of uploads, to bound memory
+                while len(rendering) < processes * 2 and len(uploading) < upload_threads * 4:
+                    batch = next(pending_batches, None)
+                    if batch is None:
+                        return
+                    rendering[renderers.submit(render_batch, batch, merged, options['force'])] = batch
+
+            submit_batches()
+            while rendering or uploading:
+                completed, _ = wait(set(rendering) | set(uploading), timeout=1, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    if future in rendering:
+                        batch = rendering.pop(future)
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            # A worker process died; --resume retries its batch
+                            failures.extend((application_id, f'render worker: {e}') for application_id in batch)
+                            continue
+                        for application_id, documents, digest, error in results:
+                            if error:
+                                failures.append((application_id, error))
+                            elif documents is None:
+                                # Stored contract has this content already
+                                progress.write(f'{application_id}\n')
+                                unchanged += 1
+                            else:
+                                uploading[uploaders.submit(upload_documents, documents)] = (
+                                    application_id, digest, sum(len(data) for *_, data in documents)
+                                )
+                        progress.flush()
+                    else:
+                        application_id, digest, size = uploading.pop(future)
+                        try:
+                            stored = future.result()
+                        except Exception as e:
+                            failures.append((application_id, f'upload: {type(e).__name__}: {e}'))
+                            continue
+                        record_contract_documents(application_id, stored)
+                        InsuranceApplication.objects.filter(pk=application_id).update(
+                            contract_pdf_path=stored[0][1], contract_generated=True, contract_digest=digest
+                        )
+                        progress.write(f'{application_id}\n')
+                        progress.flush()
+                        done += 1
+                        pdfs += len(stored)
+                        uploaded_bytes += size
+                submit_batches()
+
+                if time.monotonic() - last_report >= options['report_every']:
+                    report()
+                    last_report = time.monotonic()
+
+        elapsed = time.monotonic() - started
+        report(final=True)
+        self.stdout.write(
+            f'\n{done} application(s) regenerated, {unchanged} unchanged, '
+            f'{pdfs} PDFs ({uploaded_bytes / 1024 / 1024:.1f} MB) in {elapsed:.1f}s: '
+            f'{done / elapsed:.1f} applications/s, {pdfs / elapsed:.1f} PDFs/s'
+        )
+        if failures:
+            self.stdout.write(self.style.WARNING(f'{len(failures)} failed:'))
+            for application_id, error in failures[:20]:
+                self.stdout.write(f'  #{application_id}: {error}')
+            if len(failures) > 20:
+                self.stdout.write(f'  ... and {len(failures) - 20} more')
+        else:
+            self.stdout.write(self.style.SUCCESS('No failures'))
@@ -30,7 +30,7 @@ class Command(BaseCommand):
         self.stdout.write(f"  3-Month: {app.three_month_premium}")
         
         self.stdout.write(f"\nRecalculating premiums...")
-        recalculate_application_premium(app)
+        recalculate_application_premium(app, force=True)
         app.refresh_from_db()
         
         self.stdout.write(f"\nUpdated Premiums:")
@@ -40,7 +40,7 @@ class Command(BaseCommand):
         
         self.stdout.write(f"\nRegenerating contract PDF...")
         try:
-            result = generate_contract_pdf(app)
+            result = generate_contract_pdf(app, force=True)
             app.refresh_from_db()
             
             if isinstance(result, list):
@@ -0,0 +1,186 @@
+from collections import defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from main import pricing
+from main.models import AmbassadorCode, InsuranceApplication, PetPremium
+from main.utils import pet_premium_rows
+
+PREMIUM_FIELDS = ('annual_premium', 'six_month_premium', 'three_month_premium')
+
+
+class Command(BaseCommand):
+    help = (
+        'Reprice every application against the current Excel tariff. '
+        'Household premiums (second pet included) are computed per chunk with '
+        'NumPy and written back in bulk, with the per-pet breakdown of changed policies.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Applications loaded and priced per batch (default: 2000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report which applications would change, do not write'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+
+        # Pin one tariff for the whole run; repriced rows record its version
+        tariff = pricing.get_active_tariff()
+        row_index, _ = pricing.get_premium_matrix(tariff)
+
+        columns = (
+            'pk', 'contract_number', 'pet_type', 'program', 'pet_weight_category',
+            *PREMIUM_FIELDS,
+            'questionnaire__special_breed_5_percent',
+            'questionnaire__special_breed_20_percent',
+            'questionnaire__additional_poisoning_coverage',
+            'questionnaire__additional_blood_checkup',
+            'tariff_version',
+            'has_second_pet', 'second_pet_type', 'second_pet_weight_category',
+            'affiliate_code', 'discount_applied', 'priced_per_pet',
+        )
+        # Plain tuples: no model instances for rows that do not change. Policies
+        # priced before per-pet rows existed are backfilled as changed
+        queryset = InsuranceApplication.objects.annotate(
+            priced_per_pet=Exists(PetPremium.objects.filter(application=OuterRef('pk')))
+        ).order_by('pk').values_list(*columns)
+
+        scanned = changed = skipped = 0
+        last_pk = 0
+        # Per-pet breakdowns only depend on the household key, priced once per run
+        households = {}
+
+        # Keyset pagination keeps memory flat and lets each chunk commit on its own
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            scanned += len(chunk)
+
+            records, rows, flags, second_rows, same_band = [], [], [], [], []
+            for record in chunk:
+                pk, contract_number, pet_type, program, weight = record[:5]
+                has_second_pet, second_type, second_weight = record[13:16]
+                weight = pricing.normalize_weight(weight)
+                row = row_index.get((pet_type, program, weight))
+                second_row = -1
+                if row is not None and has_second_pet and second_type and second_weight:
+                    second_weight = pricing.normalize_weight(second_weight)
+                    second_row = row_index.get((second_type, program, second_weight))
+                if row is None or second_row is None:
+                    skipped += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'Skipped #{pk} ({contract_number}): no tariff for {pet_type} {program} {record[4]}'
+                        + (f' + {second_type} {record[15]}' if row is not None else '')
+                    ))
+                    continue
+                records.append(record)
+                rows.append(row)
+                flags.append(pricing.flag_index(*record[8:12]))
+                second_rows.append(second_row)
+                same_band.append(second_type == pet_type and second_weight == weight)
+
+            if not records:
+                continue
+
+            new = pricing.quote_batch(
+                np.array(rows), np.array(flags), tariff,
+                second_rows=np.array(second_rows), same_band=np.array(same_band),
+            )
+            # A stored version may lack some frequencies; never write partial premiums
+            incomplete = np.isnan(new).any(axis=1)
+            # Policies sold with an affiliate discount keep it (as in
+            # recalculate_application_premium): priced one by one, with the code
+            discounted = [i for i, record in enumerate(records) if record[16] and record[17] and not incomplete[i]]
+            codes = AmbassadorCode.objects.in_bulk({records[i][16] for i in discounted}, field_name='code')
+            for i in discounted:
+                totals = self._household(households, records[i], tariff, codes).totals
+                new[i] = [totals[frequency] for frequency in pricing.FREQUENCIES]
+            skipped += int(incomplete.sum())
+            current = np.array(
+                [[np.nan if value is None else float(value) for value in record[5:8]] for record in records]
+            )
+            # NaN never compares equal, so missing premiums always count as changed
+            diff = np.abs(new - current) >= 0.005
+            moved = np.array([record[12] != tariff.version_id or not record[18] for record in records])
+            dirty = np.flatnonzero((diff.any(axis=1) | np.isnan(current).any(axis=1) | moved) & ~incomplete)
+            if not len(dirty):
+                continue
+
+            # Every policy priced from the same tariff row and flags gets the same
+            # premiums, so group dirty rows and write each group with one UPDATE
+            groups = defaultdict(list)
+            for i in dirty:
+                pk = records[i][0]
+                if dry_run:
+                    self.stdout.write(self._format_diff(records[i], current[i], new[i], tariff))
+                groups[tuple(Decimal(str(round(float(value), 2))) for value in new[i])].append(pk)
+            changed += len(dirty)
+
+            if not dry_run:
+                breakdowns = []
+                for i in dirty:
+                    household = self._household(households, records[i], tariff, codes)
+                    breakdowns.extend(pet_premium_rows(records[i][0], household))
+                with transaction.atomic():
+                    for premiums, pks in groups.items():
+                        InsuranceApplication.objects.filter(pk__in=pks).update(
+                            tariff_version=tariff.version_id,
+                            **dict(zip(PREMIUM_FIELDS, premiums)),
+                        )
+                    PetPremium.objects.filter(application_id__in=[records[i][0] for i in dirty]).delete()
+                    PetPremium.objects.bulk_create(breakdowns, batch_size=chunk_size)
+
+        label = f'tariff version #{tariff.version_id}' if tariff.version_id else 'built-in Excel tariff'
+        verb = 'would change' if dry_run else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} applications against the {label}: {changed} {verb}, {skipped} skipped'
+        ))
+
+    def _household(self, households, record, tariff, codes):
+        """HouseholdQuote of a record, shared by every policy with the same household key."""
+        pet_type, program, weight = record[2:5]
+        has_second_pet, second_type, second_weight = record[13:16]
+        # The affiliate code the policy was sold with, as application_ambassador_code()
+        code = codes.get(record[16]) if record[16] and record[17] else None
+        key = (
+            pet_type, program, weight, *record[8:12], has_second_pet, second_type, second_weight,
+            code.pk if code else None,
+        )
+        if key not in households:
+            pets = [pricing.HouseholdPet(pet_type, program, weight, {
+                'special_breed_5_percent': record[8],
+                'special_breed_20_percent': record[9],
+                'poisoning': record[10],
+                'blood_checkup': record[11],
+            })]
+            if has_second_pet and second_type and second_weight:
+                pets.append(pricing.HouseholdPet(second_type, program, second_weight))
+            households[key] = pricing.quote_household(pets, ambassador_code=code, tariff=tariff)
+        return households[key]
+
+    def _format_diff(self, record, old, new, tariff):
+        pk, contract_number = record[:2]
+        parts = []
+        for label, before, after in zip(('annual', '6m', '3m'), old, new):
+            before = '—' if np.isnan(before) else f'{before:.2f}'
+            parts.append(f'{label} {before} → {after:.2f}')
+        if record[12] != tariff.version_id:
+            parts.append(f'tariff {record[12] or "built-in"} → {tariff.version_id or "built-in"}')
+        if not record[18]:
+            parts.append('per-pet breakdown missing')
+        return f'#{pk} ({contract_number}): ' + ', '.join(parts)
@@ -0,0 +1,106 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from main import jobs
+
+# Seconds between checks for jobs abandoned by killed workers
+REQUEUE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs (contract PDFs, emails, premium recalculation) from the '
+        'database queue. Each thread claims due jobs with SELECT ... FOR UPDATE SKIP LOCKED, '
+        'failed jobs are retried with backoff and every job type keeps its concurrency limit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Jobs run at once by this process (default: 4)'
+        )
+        parser.add_argument(
+            '--types',
+            help=f'Comma-separated job types to run (default: all of {", ".join(jobs.JOB_TYPES)})'
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when no job is due (default: 2)'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no job is due instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        names = None
+        if options['types']:
+            names = [name.strip() for name in options['types'].split(',') if name.strip()]
+            unknown = set(names) - set(jobs.JOB_TYPES)
+            if unknown:
+                raise CommandError(f'Unknown job type(s): {", ".join(sorted(unknown))}')
+
+        stop = threading.Event()
+        counts = {}
+        counts_lock = threading.Lock()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+        def work(index):
+            worker = f'{prefix}:{index}'
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    job = jobs.claim_job(worker, names)
+                    if job is None:
+                        if options['burst']:
+                            return
+                        stop.wait(options['poll'])
+                        continue
+                    status = jobs.run_job(job)
+                    with counts_lock:
+                        counts[status] = counts.get(status, 0) + 1
+            finally:
+                connection.close()
+
+        def shutdown(signum, frame):
+            # Heroku sends SIGTERM on restarts: finish running jobs, claim no more
+            self.stdout.write('Stopping after the running jobs...')
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        jobs.requeue_abandoned_jobs()
+        threads = [
+            threading.Thread(target=work, args=(index,), name=f'job-worker-{index}', daemon=True)
+            for index in range(max(options['threads'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'{len(threads)} worker thread(s) running {", ".join(names or jobs.JOB_TYPES)}')
+
+        started = last_requeue = time.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+            if time.monotonic() - last_requeue > REQUEUE_INTERVAL and not stop.is_set():
+                close_old_connections()
+                jobs.requeue_abandoned_jobs()
+                last_requeue = time.monotonic()
+        connection.close()
+
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items())) or 'no jobs'
+        self.stdout.write(self.style.SUCCESS(
+            f'Workers stopped after {time.monotonic() - started:.1f}s: {summary}'
+        ))
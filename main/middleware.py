@@ -1,3 +1,13 @@
+import re
+import uuid
+
+from .log import request_id
+
+# Set by the Heroku router; echoed in the response
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'[\w.:-]{1,200}')
+
+
 class SkipNgrokWarningMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -7,3 +17,27 @@ class SkipNgrokWarningMiddleware:
         response.headers['ngrok-skip-browser-warning'] = "true"
         response.headers['User-Agent'] = "CustomUserAgent"
         return response
+
+
+class RequestIdMiddleware:
+    """
+    Tags the log records of a request with its id (%(request_id)s, see
+    main.log): the router's X-Request-ID when it is well-formed, else a
+    new one.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        value = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_PATTERN.fullmatch(value):
+            value = uuid.uuid4().hex
+        request.request_id = value
+        token = request_id.set(value)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response.headers[REQUEST_ID_HEADER] = value
+        return response
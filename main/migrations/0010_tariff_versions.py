@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_add_admin_workflow_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TariffVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='e.g. Excel 2026', max_length=200)),
+                ('effective_from', models.DateField(help_text='Ισχύει από - the newest published version already in effect prices new quotes')),
+                ('is_published', models.BooleanField(default=True, help_text='Unpublished versions are never used for new quotes')),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Version stamp - workers reload the tariff when it changes')),
+                ('created_by', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'verbose_name': 'Tariff Version',
+                'verbose_name_plural': 'Tariff Versions',
+                'ordering': ['-effective_from', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TariffCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pet_type', models.CharField(choices=[('dog', 'Σκύλος'), ('cat', 'Γάτα')], max_length=10)),
+                ('program', models.CharField(choices=[('silver', 'Silver'), ('gold', 'Gold'), ('platinum', 'Platinum'), ('dynasty', 'Dynasty')], max_length=20)),
+                ('weight_category', models.CharField(help_text='Excel weight band: 10, 11-20, 21-40, >40', max_length=10)),
+                ('frequency', models.CharField(choices=[('annual', 'Ετήσια'), ('6m', 'Εξάμηνη'), ('3m', 'Τριμηνιαία')], max_length=10)),
+                ('is_second_pet', models.BooleanField(default=False, help_text='Combined price for two pets (Excel *_2nd rows)')),
+                ('net', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('ipt', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('gross', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cells', to='main.tariffversion')),
+            ],
+            options={
+                'verbose_name': 'Tariff Cell',
+                'verbose_name_plural': 'Tariff Cells',
+                'ordering': ['pet_type', 'program', 'weight_category', 'is_second_pet', 'frequency'],
+            },
+        ),
+        migrations.AddField(
+            model_name='insuranceapplication',
+            name='tariff_version',
+            field=models.ForeignKey(blank=True, help_text='Tariff version that priced this application (empty = built-in Excel tariff)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='applications', to='main.tariffversion'),
+        ),
+        migrations.AddConstraint(
+            model_name='tariffcell',
+            constraint=models.UniqueConstraint(fields=('version', 'pet_type', 'program', 'weight_category', 'frequency', 'is_second_pet'), name='unique_tariff_cell'),
+        ),
+    ]
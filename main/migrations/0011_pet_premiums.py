@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_tariff_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PetPremium',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pet_number', models.PositiveSmallIntegerField(default=1, help_text='1 = πρώτο, 2 = δεύτερο κατοικίδιο')),
+                ('frequency', models.CharField(choices=[('annual', 'Ετήσια Πληρωμή'), ('six_month', 'Εξάμηνη Πληρωμή'), ('three_month', 'Τριμηνιαία Πληρωμή')], max_length=20)),
+                ('net', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('ipt', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('base_premium', models.DecimalField(decimal_places=2, default=0, help_text='Τιμή Excel για το κατοικίδιο μόνο του', max_digits=10)),
+                ('surcharge_5_percent', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('surcharge_20_percent', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('poisoning', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('blood_checkup', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, help_text='Έκπτωση 2ου κατοικιδίου ή κωδικού συνεργάτη', max_digits=10)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, help_text='Τελικό ασφάλιστρο του κατοικιδίου', max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pet_premiums', to='main.insuranceapplication')),
+            ],
+            options={
+                'verbose_name': 'Pet Premium',
+                'verbose_name_plural': 'Pet Premiums',
+                'ordering': ['application', 'pet_number', 'frequency'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='petpremium',
+            constraint=models.UniqueConstraint(fields=('application', 'pet_number', 'frequency'), name='unique_pet_premium'),
+        ),
+    ]
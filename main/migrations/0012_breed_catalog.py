@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+# Dropdown lists of views.pet_breed / views.cat_breed at the time of the
+# migration: (name, surcharge tier, default weight band[, aliases])
+DOG_BREEDS = [
+    ("Airedale Terrier", "", "21-40"), ("Alaskan Malamute", "", "21-40"), ("Akita", "", "21-40"),
+    ("Australian Terrier", "", "10"), ("Australian Cattle Dog", "", "11-20"),
+    ("American Water Spaniel", "", "11-20"), ("American Staffordshire Terrier", "", "21-40"),
+    ("American English Coonhound", "", "21-40"), ("Afghan Hound", "", "21-40"),
+    ("Affenpinscher", "", "10"), ("American Foxhound", "", "21-40"), ("American Eskimo", "", "11-20"),
+    ("Anatolian Shepherd", "", ">40"), ("Basset Hound", "", "21-40"), ("Basset Griffon Vendeen", "", "11-20"),
+    ("Beagle", "", "11-20"), ("Berger Picard", "", "21-40"), ("Belgian Tervuren", "", "21-40"),
+    ("Belgian Sheepdog", "", "21-40"), ("Belgian Malinois", "", "21-40"), ("Bedlington Terrier", "", "10"),
+    ("Bearded Collie", "", "21-40"), ("Bergamasco", "", "21-40"), ("Beauceron", "", "21-40"),
+    ("Black Russian Terrier", "", ">40"), ("Black and Tan Coonhound", "", "21-40"),
+    ("Bluetick Coonhound", "", "21-40"), ("Border Collie", "", "11-20"), ("Borzoi", "", "21-40"),
+    ("Boxer", "", "21-40"), ("Boerboel", "", ">40"), ("Bernese Mountain", "", ">40"),
+    ("Bichon Frise", "", "10"), ("Border Terrier", "", "10"), ("Boston Terrier", "", "10"),
+    ("Brittany", "", "11-20"), ("Brussels Griffon", "", "10"), ("Bulldog", "", "21-40"),
+    ("Canaan Dog", "", "11-20"), ("Cane Corso", "5", ">40"), ("Caniche Poodle", "", "10"),
+    ("Cavalier King Charles Spaniel", "", "10"), ("Chihuahua", "", "10"), ("Chow Chow", "20", "21-40"),
+    ("Clumber Spaniel", "", "21-40"), ("Cockapoo", "", "10"), ("Cocker Spaniel", "", "11-20"),
+    ("Collie", "", "21-40"), ("Dalmatian", "", "21-40"), ("Doberman", "", "21-40"),
+    ("Dogue de Bordeaux", "", ">40"), ("Dachshund", "", "10"), ("English Bull Terrier", "", "21-40"),
+    ("English Setter", "", "21-40"), ("Fox Terrier Wire Coat", "", "10"),
+    ("French Bulldog", "20", "11-20"), ("Flat Coated Retriever", "", "21-40"),
+    ("German Shorthaired Pointer", "", "21-40"), ("German Shepherd", "", "21-40"),
+    ("Golden Retriever", "", "21-40"), ("Great Dane", "", ">40"), ("Hungarian Vizsla", "", "21-40"),
+    ("Irish Setter", "", "21-40"), ("Irish Terrier", "", "11-20"), ("Italian Greyhound", "", "10"),
+    ("Jack Russell Terrier", "", "10"), ("Labradoodle", "", "21-40"), ("Labrador Retriever", "", "21-40"),
+    ("Lhasa Apso", "", "10"), ("Lurcher", "", "21-40"), ("Maltese", "", "10"),
+    ("Miniature Schnauzer", "", "10"), ("Miniature Pinscher", "", "10"), ("Newfoundland Breed", "", ">40"),
+    ("Nova Scotia Duck Tolling Retriever", "", "11-20"), ("Old English Sheepdog", "", "21-40"),
+    ("Papillion", "", "10"), ("Patterdale", "", "10"), ("Pomeranian", "", "10"), ("Poodle", "", "11-20"),
+    ("Pointer", "", "21-40"), ("Portuguese Water Dog", "", "11-20"), ("Pug", "", "10"),
+    ("Rhodesian Ridgeback", "", "21-40"), ("Rottweiler", "5", ">40"), ("Redbone Coonhound", "", "21-40"),
+    ("Samoyed", "", "21-40"), ("Shih Tzu", "", "10"), ("Staffordshire Bull Terrier", "", "11-20"),
+    ("Shetland Sheepdog", "", "10"), ("Shiba Inu", "", "10"), ("Silky Terrier", "", "10"),
+    ("Standard Schnauzer", "", "11-20"), ("Swedish Vallhund", "", "11-20"), ("Siberian Husky", "", "21-40"),
+    ("Soft Coated Wheaten Terrier", "", "11-20"), ("Springer Spaniel", "", "21-40"),
+    ("Spanish Water Dog", "", "11-20"), ("St Bernard", "", ">40"), ("Sussex Spaniel", "", "11-20"),
+    ("Transylvanian Hound", "", "21-40"), ("Tibetan Terrier", "", "11-20"), ("Toy Fox Terrier", "", "10"),
+    ("Whippet", "", "11-20"), ("Welsh Terrier", "", "10"), ("Welsh Springer Spaniel", "", "11-20"),
+    ("Weimaraner", "", "21-40"), ("Wirehaired Pointing Griffon", "", "21-40"),
+    ("West Highland Terrier", "", "10"), ("Yorkshire Terrier", "", "10"), ("Xoloitzcuintli", "", "11-20"),
+    ("Greek Shepherd", "", "21-40"), ("Kokoni", "", "10"),
+    ("Dogo Argentino", "5", "21-40"), ("Pit Bull", "5", "21-40", "Pitbull\nAmerican Pit Bull Terrier"),
+    ("English Bulldog", "20", "21-40"),
+]
+
+CAT_BREEDS = [
+    "Abyssinian", "Aegean Cat", "American Bobtail", "American Curl",
+    "American Shorthair", "Bengal", "Birman", "Bombay", "British Shorthair",
+    "Chartreux", "Devon Rex", "Domestic Shorthair", "European Burmese",
+    "Exotic Shorthair Cat", "Himalayan", "Lykos Cat", "Maine Coon",
+    "Munchkin", "Nebelung", "Norwegian Forest Cat", "Oriental Shorthair",
+    "Persian", "Ragdoll", "Russian Blue", "Savanah Cat", "Scottish Fold",
+    "Scottish Straight", "Siamese", "Selkirk Rex", "Somali Cat", "Siberian",
+    "Snowshoe", "Sphynx", "Tonkinese", "Turkish Angora", "Turkish Van",
+]
+
+
+def seed_breeds(apps, schema_editor):
+    Breed = apps.get_model('main', 'Breed')
+    rows = [
+        Breed(pet_type='dog', name=name, surcharge=surcharge, default_weight_category=weight, aliases=aliases)
+        for name, surcharge, weight, *extra in DOG_BREEDS
+        for aliases in [extra[0] if extra else '']
+    ]
+    rows += [Breed(pet_type='cat', name=name, default_weight_category='10') for name in CAT_BREEDS]
+    Breed.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_pet_premiums'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Breed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pet_type', models.CharField(choices=[('dog', 'Σκύλος'), ('cat', 'Γάτα')], max_length=10)),
+                ('name', models.CharField(help_text='Shown in the breed dropdown', max_length=100)),
+                ('aliases', models.TextField(blank=True, help_text='Other spellings, one per line (e.g. Pitbull, Πίτμπουλ)')),
+                ('surcharge', models.CharField(blank=True, choices=[('', 'Χωρίς επασφάλιστρο'), ('5', 'Επασφάλιστρο 5%'), ('20', 'Επασφάλιστρο 20%')], default='', max_length=2)),
+                ('default_weight_category', models.CharField(blank=True, choices=[('10', 'έως 10 κιλά'), ('11-20', '11-20 κιλά'), ('21-40', '21-40 κιλά'), ('>40', '>40 κιλά')], help_text='Preselected weight band; used when the breed text carries none', max_length=10)),
+                ('is_active', models.BooleanField(default=True, help_text='Inactive breeds are hidden from the dropdown but still classified')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Catalog stamp - workers reload the breed index when it changes')),
+            ],
+            options={
+                'verbose_name': 'Breed',
+                'verbose_name_plural': 'Breeds',
+                'ordering': ['pet_type', 'name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='breed',
+            constraint=models.UniqueConstraint(fields=('pet_type', 'name'), name='unique_breed_name'),
+        ),
+        migrations.RunPython(seed_breeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_breed_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceapplication',
+            name='pricing_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the pricing inputs the stored premiums were computed from', max_length=40),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:20
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def split_gross(apps, schema_editor):
+    # Rows stored the tariff cell components; split gross with their fee / IPT
+    # rates exactly like pricing.split_gross() (net takes the rounding).
+    # Few distinct (net, fee, ipt, gross) combinations: one split each.
+    PetPremium = apps.get_model('main', 'PetPremium')
+
+    def money(value):
+        return Decimal(str(value))
+
+    groups = defaultdict(list)
+    rows = PetPremium.objects.exclude(net=0, fee=0, ipt=0).values_list('pk', 'net', 'fee', 'ipt', 'gross')
+    for pk, *values in rows.iterator(chunk_size=5000):
+        groups[tuple(values)].append(pk)
+
+    for (net, fee, ipt, gross), pks in groups.items():
+        gross = round(float(gross), 2)
+        total = float(net) + float(fee) + float(ipt)
+        new_fee = round(gross * float(fee) / total, 2)
+        new_ipt = round(gross * float(ipt) / total, 2)
+        components = {
+            'net': money(round(gross - new_fee - new_ipt, 2)),
+            'fee': money(new_fee),
+            'ipt': money(new_ipt),
+        }
+        for start in range(0, len(pks), 900):
+            PetPremium.objects.filter(pk__in=pks[start:start + 900]).update(**components)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_pricing_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='petpremium',
+            name='fee',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Δικαίωμα συμβολαίου', max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='petpremium',
+            name='ipt',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Φόρος ασφαλίστρων (ΦΑΣ)', max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='petpremium',
+            name='net',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Καθαρό ασφάλιστρο', max_digits=10),
+        ),
+        migrations.RunPython(split_gross, migrations.RunPython.noop),
+    ]
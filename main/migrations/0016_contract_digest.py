@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceapplication',
+            name='contract_digest',
+            field=models.CharField(blank=True, editable=False, help_text='Content hash (template + field values) of the stored contract PDFs', max_length=64),
+        ),
+    ]
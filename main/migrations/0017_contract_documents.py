@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_contract_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pet_number', models.PositiveSmallIntegerField(blank=True, help_text='1 = πρώτο, 2 = δεύτερο κατοικίδιο, κενό = ενιαίο PDF', null=True)),
+                ('version', models.PositiveIntegerField(default=1, help_text='Αύξων αριθμός έκδοσης του συμβολαίου')),
+                ('storage_key', models.CharField(help_text='Path in default storage (S3 key)', max_length=500)),
+                ('size', models.PositiveIntegerField(default=0, help_text='Bytes')),
+                ('digest', models.CharField(help_text='SHA-256 of the contract content', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contract_documents', to='main.insuranceapplication')),
+            ],
+            options={
+                'verbose_name': 'Contract Document',
+                'verbose_name_plural': 'Contract Documents',
+                'ordering': ['application', '-version', 'pet_number'],
+                'indexes': [models.Index(fields=['application', '-version'], name='contract_doc_version_idx')],
+            },
+        ),
+    ]
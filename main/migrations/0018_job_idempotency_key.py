@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_contract_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Effects enqueued with a key (e.g. submission:<id>:customer_email) exist at most once', max_length=200, null=True, unique=True),
+        ),
+    ]
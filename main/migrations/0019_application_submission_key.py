@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_job_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceapplication',
+            name='submission_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the submitted fields', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='insuranceapplication',
+            name='submission_key',
+            field=models.CharField(blank=True, editable=False, help_text='Idempotency key of the submitted form', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -51,6 +51,8 @@ class InsuranceApplication(models.Model):
     annual_premium = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     six_month_premium = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     three_month_premium = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    tariff_version = models.ForeignKey('TariffVersion', on_delete=models.PROTECT, null=True, blank=True, related_name='applications', help_text="Tariff version that priced this application (empty = built-in Excel tariff)")
+    pricing_fingerprint = models.CharField(max_length=40, blank=True, editable=False, help_text="Hash of the pricing inputs the stored premiums were computed from")
 
     # Status
     STATUS_CHOICES = [
@@ -100,11 +102,16 @@ class InsuranceApplication(models.Model):
     # Contract generation (PDF contains all application data for admin access)
     contract_generated = models.BooleanField(default=False)
     contract_pdf_path = models.CharField(max_length=500, blank=True, null=True, help_text="Contract PDF with all application data")
+    contract_digest = models.CharField(max_length=64, blank=True, editable=False, help_text="Content hash (template + field values) of the stored contract PDFs")
     
     # Ambassador/Partner Code
     affiliate_code = models.CharField(max_length=50, blank=True, null=True, db_index=True)
     discount_applied = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Discount amount applied from affiliate code")
     
+    # Submission idempotency: replays of the form's token return this application
+    submission_key = models.CharField(max_length=64, unique=True, blank=True, null=True, editable=False, help_text="Idempotency key of the submitted form")
+    submission_fingerprint = models.CharField(max_length=64, blank=True, editable=False, help_text="Hash of the submitted fields")
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -340,6 +347,47 @@ class PaymentPlan(models.Model):
         return round(amount, 2)
 
 
+class PetPremium(models.Model):
+    """Stored premium breakdown of one pet of an application for one payment frequency"""
+
+    FREQUENCY_CHOICES = [
+        ('annual', 'Ετήσια Πληρωμή'),
+        ('six_month', 'Εξάμηνη Πληρωμή'),
+        ('three_month', 'Τριμηνιαία Πληρωμή'),
+    ]
+
+    application = models.ForeignKey(InsuranceApplication, on_delete=models.CASCADE, related_name='pet_premiums')
+    pet_number = models.PositiveSmallIntegerField(default=1, help_text="1 = πρώτο, 2 = δεύτερο κατοικίδιο")
+    frequency = models.CharField(max_length=20, choices=FREQUENCY_CHOICES)
+
+    # Exact components of gross (net + fee + ipt == gross): surcharges, add-ons and
+    # discounts carry the fee / IPT rates of the tariff cell (second pet: its share)
+    net = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Καθαρό ασφάλιστρο")
+    fee = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Δικαίωμα συμβολαίου")
+    ipt = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Φόρος ασφαλίστρων (ΦΑΣ)")
+
+    base_premium = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Τιμή Excel για το κατοικίδιο μόνο του")
+    surcharge_5_percent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    surcharge_20_percent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    poisoning = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    blood_checkup = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Έκπτωση 2ου κατοικιδίου ή κωδικού συνεργάτη")
+    gross = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Τελικό ασφάλιστρο του κατοικιδίου")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['application', 'pet_number', 'frequency']
+        verbose_name = 'Pet Premium'
+        verbose_name_plural = 'Pet Premiums'
+        constraints = [
+            models.UniqueConstraint(fields=['application', 'pet_number', 'frequency'], name='unique_pet_premium'),
+        ]
+
+    def __str__(self):
+        return f"{self.application_id} - pet {self.pet_number} ({self.frequency}): {self.gross}€"
+
+
 class AmbassadorCode(models.Model):
     """Model for Ambassador and Partner discount codes"""
     
@@ -405,7 +453,10 @@ class AmbassadorCode(models.Model):
         """Calculate discount amount for a given base amount"""
         if not self.is_valid():
             return 0
-        
+        return self.discount_for(base_amount)
+
+    def discount_for(self, base_amount):
+        """Discount on ``base_amount`` under this code's terms, valid now or not"""
         amount = float(base_amount)
         discount = 0
         
@@ -607,13 +658,13 @@ class Questionnaire(models.Model):
                 if self.payment_frequency:
                     self.application.update_contract_dates_for_frequency()
                 
-                # Recalculate premiums to ensure six_month_premium and three_month_premium are set
-                from .utils import recalculate_application_premium
-                recalculate_application_premium(self.application)
+                # Reprice once per transaction, and only if a pricing input changed
+                from .utils import schedule_premium_recalculation
+                schedule_premium_recalculation(self.application)
             except Exception as e:
                 import logging
                 logger = logging.getLogger(__name__)
-                logger.warning(f"Could not update contract dates/premiums for application {self.application.id}: {e}")
+                logger.warning("Could not update contract dates/premiums for application %s: %s", self.application.id, e)
     
     def __str__(self):
         try:
@@ -622,4 +673,215 @@ class Questionnaire(models.Model):
                 return f"Questionnaire for {app_id}"
         except Exception:
             pass
-        return f"Questionnaire {self.id}"
\ No newline at end of file
+        return f"Questionnaire {self.id}"
+
+
+class TariffVersion(models.Model):
+    """A dated, versioned copy of the Excel tariff"""
+
+    name = models.CharField(max_length=200, help_text="e.g. Excel 2026")
+    effective_from = models.DateField(help_text="Ισχύει από - the newest published version already in effect prices new quotes")
+    is_published = models.BooleanField(default=True, help_text="Unpublished versions are never used for new quotes")
+    notes = models.TextField(blank=True)
+
+    # Tracking
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Version stamp - workers reload the tariff when it changes")
+    created_by = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        ordering = ['-effective_from', '-id']
+        verbose_name = 'Tariff Version'
+        verbose_name_plural = 'Tariff Versions'
+
+    def __str__(self):
+        return f"{self.name} (από {self.effective_from:%d/%m/%Y})"
+
+    def touch(self):
+        """Bump the version stamp so every worker reloads its cached tariff"""
+        self.updated_at = timezone.now()
+        TariffVersion.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
+
+
+class TariffCell(models.Model):
+    """One Excel price: (pet, program, weight band, frequency, 1st/2nd pet) -> net/fee/IPT/gross"""
+
+    FREQUENCY_CHOICES = [
+        ('annual', 'Ετήσια'),
+        ('6m', 'Εξάμηνη'),
+        ('3m', 'Τριμηνιαία'),
+    ]
+
+    version = models.ForeignKey(TariffVersion, on_delete=models.CASCADE, related_name='cells')
+    pet_type = models.CharField(max_length=10, choices=[('dog', 'Σκύλος'), ('cat', 'Γάτα')])
+    program = models.CharField(max_length=20, choices=[('silver', 'Silver'), ('gold', 'Gold'), ('platinum', 'Platinum'), ('dynasty', 'Dynasty')])
+    weight_category = models.CharField(max_length=10, help_text="Excel weight band: 10, 11-20, 21-40, >40")
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    is_second_pet = models.BooleanField(default=False, help_text="Combined price for two pets (Excel *_2nd rows)")
+
+    net = models.DecimalField(max_digits=10, decimal_places=2)
+    fee = models.DecimalField(max_digits=10, decimal_places=2)
+    ipt = models.DecimalField(max_digits=10, decimal_places=2)
+    gross = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ['pet_type', 'program', 'weight_category', 'is_second_pet', 'frequency']
+        verbose_name = 'Tariff Cell'
+        verbose_name_plural = 'Tariff Cells'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['version', 'pet_type', 'program', 'weight_category', 'frequency', 'is_second_pet'],
+                name='unique_tariff_cell',
+            ),
+        ]
+
+    def __str__(self):
+        suffix = ' (2nd)' if self.is_second_pet else ''
+        return f"{self.pet_type} {self.program} {self.weight_category} {self.frequency}{suffix}: {self.gross}€"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.version.touch()
+
+    def delete(self, *args, **kwargs):
+        version = self.version
+        result = super().delete(*args, **kwargs)
+        version.touch()
+        return result
+
+
+class Breed(models.Model):
+    """Catalog entry of a dog / cat breed: surcharge tier and default weight band"""
+
+    SURCHARGE_CHOICES = [
+        ('', 'Χωρίς επασφάλιστρο'),
+        ('5', 'Επασφάλιστρο 5%'),
+        ('20', 'Επασφάλιστρο 20%'),
+    ]
+
+    WEIGHT_CHOICES = [
+        ('10', 'έως 10 κιλά'),
+        ('11-20', '11-20 κιλά'),
+        ('21-40', '21-40 κιλά'),
+        ('>40', '>40 κιλά'),
+    ]
+
+    pet_type = models.CharField(max_length=10, choices=[('dog', 'Σκύλος'), ('cat', 'Γάτα')])
+    name = models.CharField(max_length=100, help_text="Shown in the breed dropdown")
+    aliases = models.TextField(blank=True, help_text="Other spellings, one per line (e.g. Pitbull, Πίτμπουλ)")
+    surcharge = models.CharField(max_length=2, choices=SURCHARGE_CHOICES, blank=True, default='')
+    default_weight_category = models.CharField(
+        max_length=10, choices=WEIGHT_CHOICES, blank=True,
+        help_text="Preselected weight band; used when the breed text carries none"
+    )
+    is_active = models.BooleanField(default=True, help_text="Inactive breeds are hidden from the dropdown but still classified")
+    updated_at = models.DateTimeField(auto_now=True, help_text="Catalog stamp - workers reload the breed index when it changes")
+
+    class Meta:
+        ordering = ['pet_type', 'name']
+        verbose_name = 'Breed'
+        verbose_name_plural = 'Breeds'
+        constraints = [
+            models.UniqueConstraint(fields=['pet_type', 'name'], name='unique_breed_name'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.pet_type})"
+
+    def alias_list(self):
+        return [alias.strip() for alias in self.aliases.splitlines() if alias.strip()]
+
+    def save(self, *args, **kwargs):
+        """Save and drop this process' breed index"""
+        super().save(*args, **kwargs)
+        from .breeds import invalidate_breed_index
+        invalidate_breed_index()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .breeds import invalidate_breed_index
+        invalidate_breed_index()
+        return result
+
+
+class BackgroundJob(models.Model):
+    """Post-submit work (contract PDF, emails, repricing) run by `manage.py run_workers`"""
+
+    STATUS_CHOICES = [
+        ('queued', 'Σε αναμονή'),
+        ('running', 'Σε εξέλιξη'),
+        ('done', 'Ολοκληρώθηκε'),
+        ('failed', 'Αποτυχία'),
+    ]
+
+    job_type = models.CharField(max_length=50, help_text="Handler name registered in main.jobs")
+    application = models.ForeignKey(
+        InsuranceApplication, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(
+        max_length=200, unique=True, null=True, blank=True,
+        help_text="Effects enqueued with a key (e.g. submission:<id>:customer_email) exist at most once"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retry backoff)")
+    locked_by = models.CharField(max_length=100, blank=True, help_text="Worker running the job")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Background Job'
+        verbose_name_plural = 'Background Jobs'
+        indexes = [
+            # Claim query: queued jobs that are due, oldest first
+            models.Index(fields=['status', 'run_at'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} #{self.pk} ({self.status})"
+
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+
+class ContractDocument(models.Model):
+    """
+    Manifest entry of one stored contract PDF. Every generation that uploads
+    new content adds a version with one row per PDF (per pet, or a single row
+    without pet number for merged two-pet contracts); the highest version is
+    the current contract, looked up without listing storage.
+    """
+
+    application = models.ForeignKey(InsuranceApplication, on_delete=models.CASCADE, related_name='contract_documents')
+    pet_number = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text="1 = πρώτο, 2 = δεύτερο κατοικίδιο, κενό = ενιαίο PDF"
+    )
+    version = models.PositiveIntegerField(default=1, help_text="Αύξων αριθμός έκδοσης του συμβολαίου")
+    storage_key = models.CharField(max_length=500, help_text="Path in default storage (S3 key)")
+    size = models.PositiveIntegerField(default=0, help_text="Bytes")
+    digest = models.CharField(max_length=64, help_text="SHA-256 of the contract content")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['application', '-version', 'pet_number']
+        verbose_name = 'Contract Document'
+        verbose_name_plural = 'Contract Documents'
+        indexes = [
+            # Current documents of an application: highest version first
+            models.Index(fields=['application', '-version'], name='contract_doc_version_idx'),
+        ]
+
+    def __str__(self):
+        pet = f" pet {self.pet_number}" if self.pet_number else ""
+        return f"{self.application_id} v{self.version}{pet}: {self.storage_key}"
+
+    @property
+    def filename(self):
+        return self.storage_key.rsplit('/', 1)[-1]
@@ -69,7 +69,7 @@ class PaymentSelectionView(View):
                 qr_data = generate_payment_qr_for_application(application, temp_order_code)
                 qr_codes[option['plan_type']] = qr_data
         except Exception as e:
-            logger.warning(f"Could not generate QR codes: {e}")
+            logger.warning("Could not generate QR codes: %s", e)
         
         context = {
             'application': application,
@@ -188,14 +188,14 @@ class VivaWalletWebhookView(View):
             result = verify_payment_webhook(request)
             
             if result['success']:
-                logger.info(f"Webhook processed successfully: {result}")
+                logger.info("Webhook processed successfully: %s", result)
                 return HttpResponse('OK', status=200)
             else:
-                logger.error(f"Webhook processing failed: {result}")
+                logger.error("Webhook processing failed: %s", result)
                 return HttpResponse('Error', status=400)
                 
         except Exception as e:
-            logger.error(f"Webhook error: {e}")
+            logger.error("Webhook error: %s", e)
             return HttpResponse('Error', status=500)
 
 
@@ -373,5 +373,5 @@ def create_payment_intent(request):
             })
             
     except Exception as e:
-        logger.error(f"Payment intent creation error: {e}")
+        logger.error("Payment intent creation error: %s", e)
         return JsonResponse({'success': False, 'error': str(e)})
@@ -0,0 +1,90 @@
+"""
+Contract PDF output optimization (PyMuPDF, installed with fillpdf).
+
+Contracts are rendered as the template plus an incremental update with the
+field values, not flattened and uncompressed, so every copy (S3 object,
+email attachment, daily export) carries the full template. Levels:
+
+- ``none``: the PDF as rendered.
+- ``compress``: rewritten with object streams and deflated streams, unused
+  and duplicate objects (fonts, images, XObjects) merged. Still fillable.
+- ``flatten``: field appearances generated from the values (the contract
+  stores /AP as plain text, which only viewers honoring NeedAppearances
+  draw), baked into the page content at the widget rectangles, embedded
+  fonts subset to the glyphs used, then compressed. Not fillable anymore.
+
+The level is configured per use in settings.CONTRACT_PDF_OPTIMIZE.
+"""
+
+import logging
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZATION_LEVELS = ('none', 'compress', 'flatten')
+
+
+class OptimizedPdf(NamedTuple):
+    data: bytes
+    level: str
+    original_size: int
+    size: int
+    seconds: float
+
+
+def optimize_pdf(pdf_bytes, level):
+    """``pdf_bytes`` optimized at ``level`` (see OPTIMIZATION_LEVELS), with before/after sizes."""
+    if level not in OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown PDF optimization level: {level}")
+    started = time.perf_counter()
+    if level == 'none':
+        return OptimizedPdf(pdf_bytes, level, len(pdf_bytes), len(pdf_bytes), 0.0)
+
+    import pymupdf
+
+    doc = pymupdf.open(stream=pdf_bytes, filetype='pdf')
+    try:
+        if level == 'flatten':
+            # Drop the plain-text /AP entries before pages are loaded, so
+            # update() builds real appearance streams
+            for xref in range(1, doc.xref_length()):
+                if doc.xref_get_key(xref, 'AP')[0] == 'string':
+                    doc.xref_set_key(xref, 'AP', 'null')
+            for page in doc:
+                for widget in page.widgets(types=(pymupdf.PDF_WIDGET_TYPE_TEXT, pymupdf.PDF_WIDGET_TYPE_COMBOBOX)):
+                    widget.update()
+            doc.bake(annots=False, widgets=True)
+            doc.subset_fonts()
+        data = doc.tobytes(garbage=4, deflate=True, deflate_fonts=True, use_objstms=1, no_new_id=True)
+    finally:
+        doc.close()
+    return OptimizedPdf(data, level, len(pdf_bytes), len(data), time.perf_counter() - started)
+
+
+def contract_pdf_optimization(use):
+    """Configured optimization level of contract PDFs for ``use`` ('archive' or 'email')."""
+    return getattr(settings, 'CONTRACT_PDF_OPTIMIZE', {}).get(use, 'none')
+
+
+def optimize_contract_pdf(pdf_bytes, use):
+    """
+    Contract PDF bytes optimized for ``use``. An optimization error is logged
+    and the PDF returned as rendered.
+    """
+    level = contract_pdf_optimization(use)
+    if level == 'none':
+        return pdf_bytes
+    try:
+        result = optimize_pdf(pdf_bytes, level)
+    except Exception as e:
+        logger.warning("[PDF OPTIMIZE] %s/%s failed, using the PDF as rendered: %s", use, level, e)
+        return pdf_bytes
+    logger.info(
+        "[PDF OPTIMIZE] %s/%s: %s -> %s bytes (%+.0f%%) in %.0f ms",
+        use, level, result.original_size, result.size,
+        (result.size - result.original_size) / result.original_size * 100, result.seconds * 1000,
+    )
+    return result.data
@@ -0,0 +1,1378 @@
+"""
+Pricing engine – single source of truth for the Excel tariff.
+
+The tariff below is compiled ONCE per process into a flat, read-only index
+keyed by (pet_type, program, weight, frequency, is_second_pet). When a
+TariffVersion is published in the admin, workers load it into the same kind
+of index and keep it until its version stamp changes. Every caller
+(user_data, application submission, premium recalculation, contract PDF and
+admin breakdown) asks ``quote()`` for the full premium instead of walking or
+rebuilding its own copy of the tables; households with a second pet are
+priced once by ``quote_household()`` and stored per pet (PetPremium).
+"""
+
+import logging
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------
+#  PRICING TABLE (EXCEL VALUES)
+# ----------------------------------------------------
+PRICING = {
+    "dog": {
+        "silver": {
+            "10": {
+                "annual": {"net": 111.54, "fee": 33.46, "ipt": 21.75, "gross": 166.75},
+                "6m":     {"net": 58.56, "fee": 17.57, "ipt": 11.42, "gross": 87.54},
+                "3m":     {"net": 30.67, "fee": 9.20, "ipt": 5.98, "gross": 45.86},
+                "annual_2nd": {"net": 200.77, "fee": 60.23, "ipt": 39.15, "gross": 300.15},
+                "6m_2nd":     {"net": 105.41, "fee": 31.62, "ipt": 20.55, "gross": 157.58},
+                "3m_2nd":     {"net": 55.21, "fee": 16.56, "ipt": 10.77, "gross": 82.54},
+            },
+            "11-20": {
+                "annual": {"net": 138.60, "fee": 41.58, "ipt": 27.03, "gross": 207.20},
+                "6m":     {"net": 72.76, "fee": 21.83, "ipt": 14.19, "gross": 108.78},
+                "3m":     {"net": 38.11, "fee": 11.43, "ipt": 7.43, "gross": 56.98},
+                "annual_2nd": {"net": 249.48, "fee": 74.84, "ipt": 48.65, "gross": 372.97},
+                "6m_2nd":     {"net": 130.98, "fee": 39.29, "ipt": 25.54, "gross": 195.81},
+                "3m_2nd":     {"net": 68.61, "fee": 20.58, "ipt": 13.38, "gross": 102.57},
+            },
+            "21-40": {
+                "annual": {"net": 156.62, "fee": 46.98, "ipt": 30.54, "gross": 234.14},
+                "6m":     {"net": 82.22, "fee": 24.67, "ipt": 16.03, "gross": 122.92},
+                "3m":     {"net": 43.07, "fee": 12.92, "ipt": 8.40, "gross": 64.39},
+                "annual_2nd": {"net": 281.91, "fee": 84.57, "ipt": 54.97, "gross": 421.45},
+                "6m_2nd":     {"net": 148.00, "fee": 44.40, "ipt": 28.86, "gross": 221.26},
+                "3m_2nd":     {"net": 77.52, "fee": 23.26, "ipt": 15.12, "gross": 115.90},
+            },
+            ">40": {
+                "annual": {"net": 170.14, "fee": 51.04, "ipt": 33.18, "gross": 254.36},
+                "6m":     {"net": 89.32, "fee": 26.80, "ipt": 17.42, "gross": 133.54},
+                "3m":     {"net": 46.79, "fee": 14.04, "ipt": 9.12, "gross": 69.95},
+                "annual_2nd": {"net": 306.25, "fee": 91.88, "ipt": 59.72, "gross": 457.85},
+                "6m_2nd":     {"net": 160.78, "fee": 48.23, "ipt": 31.35, "gross": 240.37},
+                "3m_2nd":     {"net": 84.22, "fee": 25.27, "ipt": 16.42, "gross": 125.91},
+            },
+        },
+
+        "gold": {
+            "10": {
+                "annual": {"net": 156.62, "fee": 46.98, "ipt": 30.54, "gross": 234.14},
+                "6m":     {"net": 82.22, "fee": 24.67, "ipt": 16.03, "gross": 122.92},
+                "3m":     {"net": 43.07, "fee": 12.92, "ipt": 8.40, "gross": 64.39},
+                "annual_2nd": {"net": 281.91, "fee": 84.57, "ipt": 54.97, "gross": 421.45},
+                "6m_2nd":     {"net": 148.00, "fee": 44.40, "ipt": 28.86, "gross": 221.26},
+                "3m_2nd":     {"net": 77.52, "fee": 23.26, "ipt": 15.12, "gross": 115.90},
+            },
+            "11-20": {
+                "annual": {"net": 174.64, "fee": 52.39, "ipt": 34.05, "gross": 261.09},
+                "6m":     {"net": 91.69, "fee": 27.51, "ipt": 17.88, "gross": 137.07},
+                "3m":     {"net": 48.03, "fee": 14.41, "ipt": 9.37, "gross": 71.80},
+                "annual_2nd": {"net": 314.35, "fee": 94.31, "ipt": 61.30, "gross": 469.96},
+                "6m_2nd":     {"net": 165.03, "fee": 49.51, "ipt": 32.18, "gross": 246.73},
+                "3m_2nd":     {"net": 86.45, "fee": 25.93, "ipt": 16.86, "gross": 129.24},
+            },
+            "21-40": {
+                "annual": {"net": 192.68, "fee": 57.80, "ipt": 37.57, "gross": 288.05},
+                "6m":     {"net": 101.16, "fee": 30.35, "ipt": 19.73, "gross": 151.23},
+                "3m":     {"net": 52.99, "fee": 15.90, "ipt": 10.33, "gross": 79.21},
+                "annual_2nd": {"net": 346.82, "fee": 104.05, "ipt": 67.63, "gross": 518.50},
+                "6m_2nd":     {"net": 182.08, "fee": 54.62, "ipt": 35.51, "gross": 272.21},
+                "3m_2nd":     {"net": 95.38, "fee": 28.61, "ipt": 18.60, "gross": 142.59},
+            },
+            ">40": {
+                "annual": {"net": 206.20, "fee": 61.86, "ipt": 40.21, "gross": 308.26},
+                "6m":     {"net": 108.25, "fee": 32.48, "ipt": 21.11, "gross": 161.84},
+                "3m":     {"net": 56.70, "fee": 17.01, "ipt": 11.06, "gross": 84.77},
+                "annual_2nd": {"net": 371.15, "fee": 111.35, "ipt": 72.37, "gross": 554.87},
+                "6m_2nd":     {"net": 194.85, "fee": 58.46, "ipt": 38.00, "gross": 291.31},
+                "3m_2nd":     {"net": 102.07, "fee": 30.62, "ipt": 19.90, "gross": 152.59},
+            },
+        },
+
+        "platinum": {
+            "10": {
+                "annual": {"net": 246.77, "fee": 74.03, "ipt": 48.12, "gross": 368.92},
+                "6m":     {"net": 129.55, "fee": 38.87, "ipt": 25.26, "gross": 193.68},
+                "3m":     {"net": 67.86, "fee": 20.36, "ipt": 13.23, "gross": 101.45},
+                "annual_2nd": {"net": 444.19, "fee": 133.26, "ipt": 86.62, "gross": 664.06},
+                "6m_2nd":     {"net": 233.20, "fee": 69.96, "ipt": 45.47, "gross": 348.63},
+                "3m_2nd":     {"net": 122.15, "fee": 36.65, "ipt": 23.82, "gross": 182.62},
+            },
+            "11-20": {
+                "annual": {"net": 260.30, "fee": 78.09, "ipt": 50.76, "gross": 389.15},
+                "6m":     {"net": 136.66, "fee": 41.00, "ipt": 26.65, "gross": 204.30},
+                "3m":     {"net": 71.58, "fee": 21.47, "ipt": 13.96, "gross": 107.02},
+                "annual_2nd": {"net": 468.54, "fee": 140.56, "ipt": 91.37, "gross": 700.47},
+                "6m_2nd":     {"net": 245.98, "fee": 73.80, "ipt": 47.97, "gross": 367.75},
+                "3m_2nd":     {"net": 128.85, "fee": 38.65, "ipt": 25.13, "gross": 192.63},
+            },
+            "21-40": {
+                "annual": {"net": 273.82, "fee": 82.15, "ipt": 53.39, "gross": 409.36},
+                "6m":     {"net": 143.76, "fee": 43.13, "ipt": 28.03, "gross": 214.91},
+                "3m":     {"net": 75.30, "fee": 22.59, "ipt": 14.68, "gross": 112.57},
+                "annual_2nd": {"net": 492.88, "fee": 147.86, "ipt": 96.11, "gross": 736.85},
+                "6m_2nd":     {"net": 258.76, "fee": 77.63, "ipt": 50.46, "gross": 386.85},
+                "3m_2nd":     {"net": 135.54, "fee": 40.66, "ipt": 26.43, "gross": 202.63},
+            },
+            ">40": {
+                "annual": {"net": 291.85, "fee": 87.56, "ipt": 56.91, "gross": 436.32},
+                "6m":     {"net": 153.22, "fee": 45.97, "ipt": 29.88, "gross": 229.07},
+                "3m":     {"net": 80.26, "fee": 24.08, "ipt": 15.65, "gross": 119.99},
+                "annual_2nd": {"net": 525.33, "fee": 157.60, "ipt": 102.44, "gross": 785.37},
+                "6m_2nd":     {"net": 275.80, "fee": 82.74, "ipt": 53.78, "gross": 412.32},
+                "3m_2nd":     {"net": 144.47, "fee": 43.34, "ipt": 28.17, "gross": 215.98},
+            },
+        }
+    },
+
+    # ---------------------------
+    #            CAT
+    # ---------------------------
+
+    "cat": {
+        "silver": {
+            "10": {
+                "annual": {"net": 76.13, "fee": 22.84, "ipt": 14.85, "gross": 113.81},
+                "6m":     {"net": 39.97, "fee": 11.99, "ipt": 7.79, "gross": 59.75},
+                "3m":     {"net": 20.94, "fee": 6.28, "ipt": 4.08, "gross": 31.30},
+                "annual_2nd": {"net": 137.03, "fee": 41.11, "ipt": 26.72, "gross": 204.87},
+                "6m_2nd":     {"net": 71.94, "fee": 21.58, "ipt": 14.03, "gross": 107.55},
+                "3m_2nd":     {"net": 37.68, "fee": 11.31, "ipt": 7.35, "gross": 56.34},
+            },
+            "11-20": {
+                "annual": {"net": 94.33, "fee": 28.30, "ipt": 18.39, "gross": 141.02},
+                "6m":     {"net": 49.52, "fee": 14.86, "ipt": 9.66, "gross": 74.04},
+                "3m":     {"net": 25.94, "fee": 7.78, "ipt": 5.06, "gross": 38.78},
+                "annual_2nd": {"net": 169.79, "fee": 50.94, "ipt": 33.11, "gross": 253.84},
+                "6m_2nd":     {"net": 89.14, "fee": 26.74, "ipt": 17.38, "gross": 133.27},
+                "3m_2nd":     {"net": 46.69, "fee": 14.01, "ipt": 9.11, "gross": 69.81},
+            },
+        },
+
+        "gold": {
+            "10": {
+                "annual": {"net": 112.52, "fee": 33.76, "ipt": 21.94, "gross": 168.22},
+                "6m":     {"net": 59.07, "fee": 17.72, "ipt": 11.52, "gross": 88.31},
+                "3m":     {"net": 30.94, "fee": 9.28, "ipt": 6.03, "gross": 46.26},
+                "annual_2nd": {"net": 202.54, "fee": 60.76, "ipt": 39.49, "gross": 302.79},
+                "6m_2nd":     {"net": 106.33, "fee": 31.90, "ipt": 20.73, "gross": 158.97},
+                "3m_2nd":     {"net": 55.70, "fee": 16.71, "ipt": 10.86, "gross": 83.27},
+            },
+            "11-20": {
+                "annual": {"net": 126.16, "fee": 37.85, "ipt": 24.60, "gross": 188.61},
+                "6m":     {"net": 66.23, "fee": 19.87, "ipt": 12.92, "gross": 99.02},
+                "3m":     {"net": 34.69, "fee": 10.41, "ipt": 6.77, "gross": 51.87},
+                "annual_2nd": {"net": 227.09, "fee": 68.13, "ipt": 44.28, "gross": 339.50},
+                "6m_2nd":     {"net": 119.22, "fee": 35.77, "ipt": 23.25, "gross": 178.24},
+                "3m_2nd":     {"net": 62.45, "fee": 18.73, "ipt": 12.18, "gross": 93.36},
+            },
+        },
+
+        "platinum": {
+            "10": {
+                "annual": {"net": 185.30, "fee": 55.59, "ipt": 36.13, "gross": 277.02},
+                "6m":     {"net": 97.28, "fee": 29.18, "ipt": 18.97, "gross": 145.44},
+                "3m":     {"net": 50.96, "fee": 15.29, "ipt": 9.94, "gross": 76.18},
+                "annual_2nd": {"net": 333.54, "fee": 100.06, "ipt": 65.04, "gross": 498.64},
+                "6m_2nd":     {"net": 175.11, "fee": 52.53, "ipt": 34.15, "gross": 261.79},
+                "3m_2nd":     {"net": 91.72, "fee": 27.52, "ipt": 17.89, "gross": 137.13},
+            },
+            "11-20": {
+                "annual": {"net": 208.04, "fee": 62.41, "ipt": 40.57, "gross": 311.02},
+                "6m":     {"net": 109.22, "fee": 32.77, "ipt": 21.30, "gross": 163.29},
+                "3m":     {"net": 57.21, "fee": 17.16, "ipt": 11.16, "gross": 85.53},
+                "annual_2nd": {"net": 374.47, "fee": 112.34, "ipt": 73.02, "gross": 559.84},
+                "6m_2nd":     {"net": 196.60, "fee": 58.98, "ipt": 38.34, "gross": 293.91},
+                "3m_2nd":     {"net": 102.98, "fee": 30.89, "ipt": 20.08, "gross": 153.95},
+            },
+        },
+    },
+}
+
+# ----------------------------------------------------
+#  ADD-ONS & SURCHARGES
+# ----------------------------------------------------
+POISONING_ANNUAL_PRICES = {
+    "silver": 18,
+    "gold": 20,
+    "platinum": 25,
+    "dynasty": 25,
+}
+
+BLOOD_CHECKUP_ANNUAL_PRICE = 28.00
+
+# Add-ons are scaled with their own factors: 50% for 6-month, 25% for 3-month
+ADDON_FACTORS = {
+    "annual": 1,
+    "6m": 0.5,
+    "3m": 0.25,
+}
+
+# Breed surcharges are cumulative – 5% first, then 20% on the result
+SURCHARGE_5_PERCENT = 1.05
+SURCHARGE_20_PERCENT = 1.20
+
+# Second pet without an Excel combined row (different type / weight band): 5% off
+SECOND_PET_FACTOR = 0.95
+
+FREQUENCIES = ("annual", "6m", "3m")
+
+# Questionnaire / PaymentTransaction keys -> Excel keys
+FREQUENCY_KEYS = {
+    "annual": "annual",
+    "six_month": "6m",
+    "three_month": "3m",
+    "6m": "6m",
+    "3m": "3m",
+}
+
+# Excel keys -> Questionnaire keys
+FREQUENCY_NAMES = {
+    "annual": "annual",
+    "6m": "six_month",
+    "3m": "three_month",
+}
+
+
+# ---------------------------------
+# FIX WEIGHT FOR EXCEL PRICING
+# ---------------------------------
+WEIGHT_MAPPING = MappingProxyType({
+    "up_10": "10",
+    "10_25": "11-20",
+    "25_40": "21-40",
+    "over_40": ">40",
+
+    "10": "10",
+    "11-20": "11-20",
+    "21-40": "21-40",
+    ">40": ">40",
+
+    # Plain kilo values (weights below 10 map to the first band)
+    **{str(kg): "10" for kg in range(1, 10)},
+    **{str(kg): "11-20" for kg in range(11, 21)},
+    **{str(kg): "21-40" for kg in range(21, 41)},
+    **{str(kg): ">40" for kg in range(41, 46)},
+})
+
+
+def normalize_weight(raw_weight):
+    return WEIGHT_MAPPING.get(str(raw_weight))
+
+
+def normalize_frequency(frequency):
+    """Map any frequency spelling ('six_month', '6m', ...) to the Excel key."""
+    return FREQUENCY_KEYS.get(frequency or "annual", "annual")
+
+
+# ----------------------------------------------------
+#  COMPILED TARIFF INDEX
+# ----------------------------------------------------
+
+class TariffCell(NamedTuple):
+    net: float
+    fee: float
+    ipt: float
+    gross: float
+
+
+def split_gross(gross, cell):
+    """
+    TariffCell of ``gross`` with the fee / IPT rates of ``cell``: surcharges,
+    add-ons and discounts carry the same fee and IPT as the tariff premium.
+    Net takes the rounding, so net + fee + ipt == gross to the cent.
+    """
+    gross = round(gross, 2)
+    total = cell.net + cell.fee + cell.ipt
+    if total <= 0:
+        return TariffCell(gross, 0.0, 0.0, gross)
+    fee = round(gross * cell.fee / total, 2)
+    ipt = round(gross * cell.ipt / total, 2)
+    return TariffCell(round(gross - fee - ipt, 2), fee, ipt, gross)
+
+
+def compile_tariff(pricing):
+    """Flatten the nested Excel table into a tuple-keyed read-only index."""
+    index = {}
+    for pet_type, programs in pricing.items():
+        for program, weights in programs.items():
+            for weight, rows in weights.items():
+                for key, values in rows.items():
+                    frequency, _, suffix = key.partition("_")
+                    index[(pet_type, program, weight, frequency, suffix == "2nd")] = TariffCell(
+                        values["net"], values["fee"], values["ipt"], values["gross"]
+                    )
+    return MappingProxyType(index)
+
+
+TARIFF = compile_tariff(PRICING)
+
+
+# ----------------------------------------------------
+#  TARIFF VERSIONS (DB) – PER-WORKER CACHE
+# ----------------------------------------------------
+
+class Tariff(NamedTuple):
+    version_id: Optional[int]   # None = built-in Excel table above
+    stamp: object               # TariffVersion.updated_at when loaded
+    cells: Mapping
+
+
+BUILTIN_TARIFF = Tariff(None, None, TARIFF)
+
+# Seconds between version-stamp checks; quotes in between never touch the DB
+TARIFF_STAMP_TTL = 30
+
+_tariff_state = {
+    "active": BUILTIN_TARIFF,
+    "stamp": None,       # (today, count, max updated_at) of all versions
+    "checked_at": None,
+    "versions": {},      # version_id -> Tariff
+}
+
+
+def invalidate_tariff_cache():
+    """Drop this process' loaded versions; the next quote re-checks the stamp."""
+    _tariff_state["checked_at"] = None
+    _tariff_state["stamp"] = None
+    _tariff_state["versions"] = {}
+
+
+def load_tariff_version(version_id):
+    """Compile one stored TariffVersion into a Tariff (one query, cached)."""
+    tariff = _tariff_state["versions"].get(version_id)
+    if tariff is not None:
+        return tariff
+
+    from .models import TariffVersion
+
+    version = TariffVersion.objects.get(pk=version_id)
+    cells = {}
+    for pet_type, program, weight, frequency, second, net, fee, ipt, gross in version.cells.values_list(
+        "pet_type", "program", "weight_category", "frequency", "is_second_pet", "net", "fee", "ipt", "gross"
+    ):
+        cells[(pet_type, program, weight, frequency, second)] = TariffCell(
+            float(net), float(fee), float(ipt), float(gross)
+        )
+
+    tariff = Tariff(version.pk, version.updated_at, MappingProxyType(cells))
+    _tariff_state["versions"][version_id] = tariff
+    logger.info("[TARIFF] Loaded version %s (%s cells)", version, len(cells))
+    return tariff
+
+
+def get_active_tariff():
+    """
+    Tariff that prices new quotes: the newest published TariffVersion already
+    in effect, or the built-in Excel table when none exists.
+
+    At most one cheap aggregate query per TARIFF_STAMP_TTL seconds; cells are
+    only re-read when the stamp (version count / last update / day) changes.
+    """
+    now = time.monotonic()
+    checked_at = _tariff_state["checked_at"]
+    if checked_at is not None and now - checked_at < TARIFF_STAMP_TTL:
+        return _tariff_state["active"]
+    _tariff_state["checked_at"] = now
+
+    from datetime import date
+    from django.db import DatabaseError
+    from django.db.models import Count, Max
+    from .models import TariffVersion
+
+    try:
+        today = date.today()
+        stamp = (today, *TariffVersion.objects.aggregate(Count("id"), Max("updated_at")).values())
+        if stamp == _tariff_state["stamp"]:
+            return _tariff_state["active"]
+
+        _tariff_state["versions"] = {}
+        _premium_matrices.clear()
+        QUOTE_CACHE.clear()
+        active_id = (
+            TariffVersion.objects
+            .filter(is_published=True, effective_from__lte=today)
+            .values_list("id", flat=True)
+            .first()
+        )
+        active = load_tariff_version(active_id) if active_id else BUILTIN_TARIFF
+    except DatabaseError as e:
+        # e.g. before migrations ran – keep pricing with what we have
+        logger.warning("[TARIFF] Could not check tariff version, using cached tariff: %s", e)
+        return _tariff_state["active"]
+
+    _tariff_state["stamp"] = stamp
+    _tariff_state["active"] = active
+    return active
+
+
+def get_application_tariff(application):
+    """Tariff an application was priced with, so recalculations stay reproducible."""
+    version_id = getattr(application, "tariff_version_id", None)
+    if not version_id:
+        return BUILTIN_TARIFF
+    get_active_tariff()  # refresh the stamp so edited versions are reloaded
+    return load_tariff_version(version_id)
+
+
+def get_tariff_cell(pet_type, program, weight_category, frequency="annual", is_second_pet=False, tariff=None):
+    """
+    Return the exact Excel (net, fee, ipt, gross) cell.
+    ``tariff`` defaults to the active tariff.
+    Raises ValueError when the tariff has no price for the combination.
+    """
+    tariff = tariff or get_active_tariff()
+    frequency = normalize_frequency(frequency)
+    cell = tariff.cells.get((pet_type, program, weight_category, frequency, bool(is_second_pet)))
+    if cell is None:
+        key = frequency if not is_second_pet else f"{frequency}_2nd"
+        raise ValueError(f"[PRICING ERROR] Missing Excel price for {pet_type} {program} {weight_category} {key}")
+    return cell
+
+
+def get_addon_price(annual_price, frequency):
+    """Scale an annual add-on price to the given payment frequency."""
+    factor = ADDON_FACTORS[normalize_frequency(frequency)]
+    if factor == 1:
+        return annual_price
+    return round(annual_price * factor, 2)
+
+
+def get_poisoning_price(program, frequency):
+    return get_addon_price(POISONING_ANNUAL_PRICES.get(program, 0), frequency)
+
+
+def get_blood_checkup_price(frequency):
+    return get_addon_price(BLOOD_CHECKUP_ANNUAL_PRICE, frequency)
+
+
+# ----------------------------------------------------
+#  CSV IMPORT / EXPORT
+# ----------------------------------------------------
+TARIFF_CSV_COLUMNS = ("pet_type", "program", "weight_category", "frequency", "is_second_pet", "net", "fee", "ipt", "gross")
+
+_CSV_TRUE = {"1", "true", "yes", "ναι", "2nd"}
+_CSV_FALSE = {"", "0", "false", "no", "όχι"}
+
+
+def parse_tariff_csv(text):
+    """
+    Parse a tariff CSV (one row per Excel cell, TARIFF_CSV_COLUMNS header)
+    into a list of dicts ready for TariffCell(**row).
+    Raises ValueError listing every invalid line.
+    """
+    import csv
+    import io
+    from decimal import Decimal, InvalidOperation
+
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    missing = [c for c in TARIFF_CSV_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Λείπουν στήλες: {', '.join(missing)}")
+
+    cells, errors, seen = [], [], set()
+    for line, row in enumerate(reader, start=2):
+        pet_type = (row["pet_type"] or "").strip().lower()
+        program = (row["program"] or "").strip().lower()
+        weight = normalize_weight((row["weight_category"] or "").strip())
+        frequency = FREQUENCY_KEYS.get((row["frequency"] or "").strip().lower())
+        second = (row["is_second_pet"] or "").strip().lower()
+
+        if pet_type not in ("dog", "cat"):
+            errors.append(f"Γραμμή {line}: άγνωστο pet_type '{row['pet_type']}'")
+            continue
+        if not program:
+            errors.append(f"Γραμμή {line}: κενό program")
+            continue
+        if not weight:
+            errors.append(f"Γραμμή {line}: άγνωστο weight_category '{row['weight_category']}'")
+            continue
+        if not frequency:
+            errors.append(f"Γραμμή {line}: άγνωστο frequency '{row['frequency']}'")
+            continue
+        if second not in _CSV_TRUE | _CSV_FALSE:
+            errors.append(f"Γραμμή {line}: άγνωστο is_second_pet '{row['is_second_pet']}'")
+            continue
+        try:
+            amounts = {c: Decimal(row[c].strip().replace(",", ".")) for c in ("net", "fee", "ipt", "gross")}
+        except (InvalidOperation, AttributeError):
+            errors.append(f"Γραμμή {line}: μη έγκυρο ποσό")
+            continue
+
+        key = (pet_type, program, weight, frequency, second in _CSV_TRUE)
+        if key in seen:
+            errors.append(f"Γραμμή {line}: διπλή εγγραφή για {' '.join(map(str, key))}")
+            continue
+        seen.add(key)
+        cells.append({
+            "pet_type": pet_type,
+            "program": program,
+            "weight_category": weight,
+            "frequency": frequency,
+            "is_second_pet": key[4],
+            **amounts,
+        })
+
+    if errors:
+        raise ValueError("; ".join(errors))
+    if not cells:
+        raise ValueError("Το CSV δεν περιέχει τιμές")
+    return cells
+
+
+def tariff_csv(tariff):
+    """Render a Tariff as CSV text in the format parse_tariff_csv() reads."""
+    import csv
+    import io
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(TARIFF_CSV_COLUMNS)
+    for (pet_type, program, weight, frequency, second), cell in sorted(tariff.cells.items()):
+        writer.writerow([pet_type, program, weight, frequency, int(second), *(f"{v:.2f}" for v in cell)])
+    return out.getvalue()
+
+
+def tariff_from_csv(text):
+    """
+    Compile tariff CSV text into an unsaved Tariff (e.g. a candidate tariff
+    for simulate_tariff()). Raises ValueError like parse_tariff_csv().
+    """
+    import hashlib
+
+    cells = {
+        (row["pet_type"], row["program"], row["weight_category"], row["frequency"], row["is_second_pet"]):
+            TariffCell(float(row["net"]), float(row["fee"]), float(row["ipt"]), float(row["gross"]))
+        for row in parse_tariff_csv(text)
+    }
+    # The stamp keeps its quotes / matrices apart from the built-in tariff's
+    stamp = ("csv", hashlib.sha1(text.encode("utf-8")).hexdigest())
+    return Tariff(None, stamp, MappingProxyType(cells))
+
+
+# ----------------------------------------------------
+#  QUOTES
+# ----------------------------------------------------
+
+class Quote(NamedTuple):
+    """Full premium for one pet at one payment frequency."""
+
+    pet_type: str
+    program: str
+    weight: str
+    frequency: str
+    is_second_pet: bool
+
+    # Excel tariff components (before surcharges / add-ons)
+    net: float
+    fee: float
+    ipt: float
+    base_gross: float
+
+    surcharge_5_percent: float
+    surcharge_20_percent: float
+    poisoning: float
+    blood_checkup: float
+    discount: float
+
+    # Final premium: base + surcharges + add-ons - discount
+    gross: float
+
+    # TariffVersion id that priced this quote (None = built-in Excel table)
+    tariff_version: Optional[int] = None
+
+    @property
+    def surcharges(self):
+        return round(self.surcharge_5_percent + self.surcharge_20_percent, 2)
+
+    @property
+    def addons(self):
+        return round(self.poisoning + self.blood_checkup, 2)
+
+    @property
+    def gross_before_discount(self):
+        return round(self.gross + self.discount, 2)
+
+    @property
+    def gross_components(self):
+        """TariffCell of the final premium: exact net / fee / IPT of ``gross``."""
+        return split_gross(self.gross, TariffCell(self.net, self.fee, self.ipt, self.base_gross))
+
+
+class QuoteCache:
+    """
+    Bounded LRU of Quote objects keyed by normalized pricing inputs.
+    Quotes are immutable, so cached objects are shared between callers.
+    """
+
+    def __init__(self, maxsize):
+        import threading
+        from collections import OrderedDict
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+# The whole input space (pets x programs x weights x frequencies x flags,
+# per tariff and affiliate code) is a few thousand entries
+QUOTE_CACHE_SIZE = 4096
+QUOTE_CACHE = QuoteCache(QUOTE_CACHE_SIZE)
+
+
+def quote(pet_type, program, weight_category, frequency="annual", *,
+          is_second_pet=False, special_breed_5_percent=False,
+          special_breed_20_percent=False, poisoning=False,
+          blood_checkup=False, ambassador_code=None, tariff=None):
+    """
+    Price one pet in one call.
+
+    ``weight_category`` may be any value understood by ``normalize_weight``.
+    ``ambassador_code`` is an optional AmbassadorCode whose discount is
+    applied to the final premium. Its validity is the caller's check: a
+    submission passes only codes valid now, a recalculation the code the
+    application was sold with (see application_ambassador_code).
+    ``tariff`` defaults to the active tariff.
+    Results are served from QUOTE_CACHE when the same inputs were priced before.
+    Raises ValueError for weights or combinations missing from the tariff.
+    """
+    weight = normalize_weight(weight_category)
+    if not weight:
+        raise ValueError(f"Invalid weight category: {weight_category}")
+
+    tariff = tariff or get_active_tariff()
+    frequency = normalize_frequency(frequency)
+    key = (
+        tariff.version_id, tariff.stamp,
+        pet_type, program, weight, frequency, bool(is_second_pet),
+        bool(special_breed_5_percent), bool(special_breed_20_percent),
+        bool(poisoning), bool(blood_checkup),
+        # The discount terms, not updated_at: increment_usage() saves the
+        # code on every submission without changing its prices
+        affiliate_terms(ambassador_code),
+    )
+    cached = QUOTE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    result = _price(
+        tariff, pet_type, program, weight, frequency, bool(is_second_pet),
+        special_breed_5_percent, special_breed_20_percent, poisoning,
+        blood_checkup, ambassador_code,
+    )
+    QUOTE_CACHE.put(key, result)
+    return result
+
+
+def _price(tariff, pet_type, program, weight, frequency, is_second_pet,
+           special_breed_5_percent, special_breed_20_percent, poisoning,
+           blood_checkup, ambassador_code):
+    """Uncached quote() body; inputs are already normalized."""
+    cell = get_tariff_cell(pet_type, program, weight, frequency, is_second_pet, tariff)
+
+    total = cell.gross
+    surcharge_5 = 0.0
+    surcharge_20 = 0.0
+    if special_breed_5_percent:
+        surcharge_5 = round(total * (SURCHARGE_5_PERCENT - 1), 2)
+        total = total * SURCHARGE_5_PERCENT
+    if special_breed_20_percent:
+        surcharge_20 = round(total * (SURCHARGE_20_PERCENT - 1), 2)
+        total = total * SURCHARGE_20_PERCENT
+
+    poisoning_price = get_poisoning_price(program, frequency) if poisoning else 0.0
+    blood_price = get_blood_checkup_price(frequency) if blood_checkup else 0.0
+    total = round(total + poisoning_price + blood_price, 2)
+
+    discount = 0.0
+    if ambassador_code is not None:
+        discount = ambassador_code.discount_for(total)
+        total = round(max(0, total - discount), 2)
+
+    return Quote(
+        pet_type=pet_type,
+        program=program,
+        weight=weight,
+        frequency=frequency,
+        is_second_pet=is_second_pet,
+        net=cell.net,
+        fee=cell.fee,
+        ipt=cell.ipt,
+        base_gross=cell.gross,
+        surcharge_5_percent=surcharge_5,
+        surcharge_20_percent=surcharge_20,
+        poisoning=poisoning_price,
+        blood_checkup=blood_price,
+        discount=discount,
+        gross=total,
+        tariff_version=tariff.version_id,
+    )
+
+
+def quote_frequencies(pet_type, program, weight_category, **options):
+    """Quote every payment frequency at once: {'annual': Quote, '6m': ..., '3m': ...}."""
+    if options.get("tariff") is None:
+        options["tariff"] = get_active_tariff()
+    return {
+        frequency: quote(pet_type, program, weight_category, frequency, **options)
+        for frequency in FREQUENCIES
+    }
+
+
+def questionnaire_options(questionnaire):
+    """Surcharge / add-on flags stored on a Questionnaire, as quote() keywords."""
+    if not questionnaire:
+        return {}
+    return {
+        "special_breed_5_percent": bool(questionnaire.special_breed_5_percent),
+        "special_breed_20_percent": bool(questionnaire.special_breed_20_percent),
+        "poisoning": bool(questionnaire.additional_poisoning_coverage),
+        "blood_checkup": bool(questionnaire.additional_blood_checkup),
+    }
+
+
+# ----------------------------------------------------
+#  HOUSEHOLD (MULTI-PET) QUOTES
+# ----------------------------------------------------
+
+class HouseholdPet(NamedTuple):
+    pet_type: str
+    program: str
+    weight_category: str
+    options: Optional[dict] = None   # quote() surcharge / add-on flags
+
+
+def quote_second_pet(pet_type, program, weight_category, frequency="annual", *,
+                     first_pet_type, first_pet_weight, tariff=None):
+    """
+    Price an additional pet of a household (no surcharges / add-ons).
+
+    Same pet type and weight band as the first pet: its share of the Excel
+    combined two-pet row (combined minus single). Otherwise its single-pet
+    price with SECOND_PET_FACTOR applied. net/fee/ipt/gross are the pet's
+    share; base_gross is its single-pet price and discount the difference.
+    """
+    weight = normalize_weight(weight_category)
+    if not weight:
+        raise ValueError(f"Invalid weight category: {weight_category}")
+
+    tariff = tariff or get_active_tariff()
+    frequency = normalize_frequency(frequency)
+    single = get_tariff_cell(pet_type, program, weight, frequency, False, tariff)
+    combined = tariff.cells.get((pet_type, program, weight, frequency, True))
+
+    if combined and pet_type == first_pet_type and weight == normalize_weight(first_pet_weight):
+        share = TariffCell(*(round(c - s, 2) for c, s in zip(combined, single)))
+    else:
+        share = TariffCell(*(round(v * SECOND_PET_FACTOR, 2) for v in single))
+
+    return Quote(
+        pet_type=pet_type,
+        program=program,
+        weight=weight,
+        frequency=frequency,
+        is_second_pet=True,
+        net=share.net,
+        fee=share.fee,
+        ipt=share.ipt,
+        base_gross=single.gross,
+        surcharge_5_percent=0.0,
+        surcharge_20_percent=0.0,
+        poisoning=0.0,
+        blood_checkup=0.0,
+        discount=round(single.gross - share.gross, 2),
+        gross=share.gross,
+        tariff_version=tariff.version_id,
+    )
+
+
+class HouseholdQuote(NamedTuple):
+    """Every pet of a household priced for every frequency."""
+
+    # One {Excel frequency: Quote} dict per pet, first pet first
+    pets: tuple
+
+    @property
+    def totals(self):
+        """Household premium per Excel frequency."""
+        return {
+            frequency: round(sum(quotes[frequency].gross for quotes in self.pets), 2)
+            for frequency in FREQUENCIES
+        }
+
+
+def quote_household(pets, *, ambassador_code=None, tariff=None):
+    """
+    Price a household in one pass: the first pet with its surcharges, add-ons
+    and the affiliate discount, every further pet with quote_second_pet().
+    ``pets`` is a sequence of HouseholdPet. Raises ValueError like quote().
+    """
+    tariff = tariff or get_active_tariff()
+    first, *others = pets
+
+    priced = [quote_frequencies(
+        first.pet_type, first.program, first.weight_category,
+        tariff=tariff, ambassador_code=ambassador_code, **(first.options or {})
+    )]
+    for pet in others:
+        priced.append({
+            frequency: quote_second_pet(
+                pet.pet_type, pet.program, pet.weight_category, frequency,
+                first_pet_type=first.pet_type,
+                first_pet_weight=first.weight_category,
+                tariff=tariff,
+            )
+            for frequency in FREQUENCIES
+        })
+    return HouseholdQuote(tuple(priced))
+
+
+def application_pets(application):
+    """HouseholdPet list of a stored application (second pet only when complete)."""
+    questionnaire = getattr(application, "questionnaire", None)
+    pets = [HouseholdPet(
+        application.pet_type,
+        application.program,
+        application.pet_weight_category,
+        questionnaire_options(questionnaire),
+    )]
+    if application.has_second_pet and application.second_pet_type and application.second_pet_weight_category:
+        pets.append(HouseholdPet(
+            application.second_pet_type,
+            application.program,
+            application.second_pet_weight_category,
+        ))
+    return pets
+
+
+def application_ambassador_code(application):
+    """
+    AmbassadorCode whose discount the application was sold with: its
+    affiliate_code when the submission applied a discount, else None. The
+    code may have expired or reached its usage limit since; the discount
+    still belongs to the application.
+    """
+    if not application.affiliate_code or not application.discount_applied:
+        return None
+    from .models import AmbassadorCode
+    return AmbassadorCode.objects.filter(code=application.affiliate_code).first()
+
+
+def quote_application_household(application, ambassador_code=None):
+    """
+    Price every pet of a stored application with the tariff version it
+    recorded; ``ambassador_code`` is application_ambassador_code().
+    """
+    return quote_household(
+        application_pets(application),
+        ambassador_code=ambassador_code,
+        tariff=get_application_tariff(application),
+    )
+
+
+def affiliate_terms(ambassador_code):
+    """
+    Fields of an AmbassadorCode its discount is computed from (see
+    discount_for), or None. As floats, like discount_for reads them:
+    Decimal('10') and a reloaded Decimal('10.00') are the same terms.
+    """
+    if ambassador_code is None:
+        return None
+    return (ambassador_code.code, *(
+        None if value is None else float(value)
+        for value in (ambassador_code.discount_percentage, ambassador_code.discount_amount, ambassador_code.max_discount)
+    ))
+
+
+# ----------------------------------------------------
+#  QUOTE MATRIX (GET /api/quote/)
+# ----------------------------------------------------
+
+def _by_frequency(values):
+    """Excel-keyed values -> {'annual': .., 'six_month': .., 'three_month': ..}."""
+    return {FREQUENCY_NAMES[frequency]: value for frequency, value in zip(FREQUENCIES, values)}
+
+
+def quote_matrix(pet_type, weight_category, tariff=None, first_pet=None):
+    """
+    Every program x frequency x surcharge/add-on combination for one pet,
+    keyed by program (programs missing from the tariff are left out):
+
+        base                 Excel gross per frequency
+        second_pet_combined  Excel combined two-pet gross (same weight band)
+        poisoning / blood_checkup   add-on price per frequency
+        surcharges[flags & 3]       [5% amount, 20% amount] per frequency
+        gross[flags]                final premium per frequency
+        as_second_pet        household share per frequency (only with ``first_pet``)
+
+    ``flags`` is ``flag_index()`` of the policy. ``first_pet`` is the
+    (pet_type, weight_category) of the household's first pet.
+    """
+    tariff = tariff or get_active_tariff()
+    weight = normalize_weight(weight_category)
+    programs = sorted({key[1] for key in tariff.cells if key[0] == pet_type and key[2] == weight})
+
+    matrix = {}
+    for program in programs:
+        try:
+            quotes = [
+                [
+                    quote(
+                        pet_type, program, weight, frequency, tariff=tariff,
+                        special_breed_5_percent=bool(flags & 1),
+                        special_breed_20_percent=bool(flags & 2),
+                        poisoning=bool(flags & 4),
+                        blood_checkup=bool(flags & 8),
+                    )
+                    for frequency in FREQUENCIES
+                ]
+                for flags in range(FLAG_COMBINATIONS)
+            ]
+        except ValueError:
+            continue  # incomplete row in this tariff version
+
+        second = [tariff.cells.get((pet_type, program, weight, frequency, True)) for frequency in FREQUENCIES]
+        full = quotes[FLAG_COMBINATIONS - 1]
+        matrix[program] = {
+            "base": _by_frequency(q.base_gross for q in quotes[0]),
+            "second_pet_combined": _by_frequency(c.gross for c in second) if all(second) else None,
+            "poisoning": _by_frequency(q.poisoning for q in full),
+            "blood_checkup": _by_frequency(q.blood_checkup for q in full),
+            "surcharges": [
+                _by_frequency([q.surcharge_5_percent, q.surcharge_20_percent] for q in quotes[flags])
+                for flags in range(4)
+            ],
+            "gross": [_by_frequency(q.gross for q in quotes[flags]) for flags in range(FLAG_COMBINATIONS)],
+        }
+        if first_pet:
+            matrix[program]["as_second_pet"] = _by_frequency(
+                quote_second_pet(
+                    pet_type, program, weight, frequency, tariff=tariff,
+                    first_pet_type=first_pet[0], first_pet_weight=first_pet[1],
+                ).gross
+                for frequency in FREQUENCIES
+            )
+    return matrix
+
+
+# ----------------------------------------------------
+#  BATCH PRICING (PORTFOLIO REPRICING)
+# ----------------------------------------------------
+# Final premiums only depend on the tariff row, the four questionnaire flags
+# and the frequency, so the whole result space is small enough to price once
+# with quote() and then look up with NumPy fancy indexing. Results are
+# identical to quote() by construction.
+
+FLAG_COMBINATIONS = 16
+
+
+def flag_index(special_breed_5_percent=False, special_breed_20_percent=False,
+               poisoning=False, blood_checkup=False):
+    """Pack the surcharge / add-on flags into an index 0..15."""
+    return (
+        bool(special_breed_5_percent)
+        | bool(special_breed_20_percent) << 1
+        | bool(poisoning) << 2
+        | bool(blood_checkup) << 3
+    )
+
+
+_premium_matrices = {}
+
+
+def get_premium_matrix(tariff=None):
+    """
+    Return (row_index, premiums) for first-pet policies of ``tariff``
+    (default: the active tariff).
+
+    ``row_index`` maps (pet_type, program, weight) to a row of ``premiums``,
+    a float array of shape (rows, FLAG_COMBINATIONS, len(FREQUENCIES)).
+    Built lazily once per tariff version; NumPy is only imported by batch callers.
+    """
+    tariff = tariff or get_active_tariff()
+    key = (tariff.version_id, tariff.stamp)
+    if key in _premium_matrices:
+        return _premium_matrices[key]
+
+    import numpy as np
+
+    rows = sorted({cell_key[:3] for cell_key in tariff.cells if not cell_key[4]})
+    premiums = np.full((len(rows), FLAG_COMBINATIONS, len(FREQUENCIES)), np.nan)
+    for row, (pet_type, program, weight) in enumerate(rows):
+        for flags in range(FLAG_COMBINATIONS):
+            options = {
+                "special_breed_5_percent": bool(flags & 1),
+                "special_breed_20_percent": bool(flags & 2),
+                "poisoning": bool(flags & 4),
+                "blood_checkup": bool(flags & 8),
+            }
+            for column, frequency in enumerate(FREQUENCIES):
+                try:
+                    premiums[row, flags, column] = quote(
+                        pet_type, program, weight, frequency, tariff=tariff, **options
+                    ).gross
+                except ValueError:
+                    pass  # frequency missing from this version – stays NaN
+    premiums.setflags(write=False)
+
+    _premium_matrices[key] = (MappingProxyType({k: row for row, k in enumerate(rows)}), premiums)
+    return _premium_matrices[key]
+
+
+def get_second_pet_matrix(tariff=None):
+    """
+    Return (row_index, shares) for second pets of ``tariff``.
+
+    ``row_index`` is the one of ``get_premium_matrix()``; ``shares`` has shape
+    (rows, 2, len(FREQUENCIES)): quote_second_pet() gross for a pet of another
+    type / weight band than the first pet ([:, 0]) and of the same ([:, 1]).
+    """
+    tariff = tariff or get_active_tariff()
+    key = (tariff.version_id, tariff.stamp, "second_pet")
+    if key in _premium_matrices:
+        return _premium_matrices[key]
+
+    import numpy as np
+
+    row_index, _ = get_premium_matrix(tariff)
+    shares = np.full((len(row_index), 2, len(FREQUENCIES)), np.nan)
+    for (pet_type, program, weight), row in row_index.items():
+        other_type = "cat" if pet_type == "dog" else "dog"
+        for column, frequency in enumerate(FREQUENCIES):
+            for same, first_pet_type in enumerate((other_type, pet_type)):
+                try:
+                    shares[row, same, column] = quote_second_pet(
+                        pet_type, program, weight, frequency, tariff=tariff,
+                        first_pet_type=first_pet_type, first_pet_weight=weight,
+                    ).gross
+                except ValueError:
+                    pass
+    shares.setflags(write=False)
+
+    _premium_matrices[key] = (row_index, shares)
+    return _premium_matrices[key]
+
+
+def quote_batch(rows, flags, tariff=None, second_rows=None, same_band=None):
+    """
+    Vectorized quote_frequencies() for many policies at once.
+
+    ``rows`` and ``flags`` are integer arrays from ``get_premium_matrix()``'s
+    row index and ``flag_index()``. Returns a (n, 3) array of gross premiums in
+    FREQUENCIES order.
+
+    For households pass ``second_rows`` (row of the second pet, -1 for none)
+    and ``same_band`` (second pet has the first pet's type and weight band);
+    the result is then the household total of quote_household().
+    """
+    _, premiums = get_premium_matrix(tariff)
+    result = premiums[rows, flags]
+    if second_rows is None:
+        return result
+
+    import numpy as np
+
+    _, shares = get_second_pet_matrix(tariff)
+    has_second = second_rows >= 0
+    second = shares[second_rows[has_second], same_band[has_second].astype(int)]
+    result[has_second] = np.round(result[has_second] + second, 2)
+    return result
+
+
+# ----------------------------------------------------
+#  WHAT-IF SIMULATION (CANDIDATE TARIFF)
+# ----------------------------------------------------
+# Reprices the stored portfolio under two tariffs without writing anything:
+# policies are streamed in chunks, looked up in each tariff's premium /
+# component matrices and summed per (program, pet type, weight) with NumPy.
+
+# Payments per year, to compare policies on different frequencies
+INSTALLMENTS = {"annual": 1, "6m": 2, "3m": 4}
+
+SIMULATION_CHUNK_SIZE = 5000
+
+
+def get_component_matrix(tariff=None):
+    """
+    Return (row_index, components, second_components): net / fee / ipt of
+    the final premiums, as Quote.gross_components splits them (surcharges,
+    add-ons and discounts carry the fee and IPT of the tariff premium, like
+    the stored PetPremium rows).
+
+    ``components`` is the premium matrix of ``get_premium_matrix()`` with a
+    last axis of (net, fee, ipt): shape (rows, FLAG_COMBINATIONS,
+    len(FREQUENCIES), 3). ``second_components`` has shape (rows, 2,
+    len(FREQUENCIES), 3), for quote_second_pet() like get_second_pet_matrix().
+    """
+    tariff = tariff or get_active_tariff()
+    key = (tariff.version_id, tariff.stamp, "components")
+    if key in _premium_matrices:
+        return _premium_matrices[key]
+
+    import numpy as np
+
+    row_index, _ = get_premium_matrix(tariff)
+    components = np.full((len(row_index), FLAG_COMBINATIONS, len(FREQUENCIES), 3), np.nan)
+    second_components = np.full((len(row_index), 2, len(FREQUENCIES), 3), np.nan)
+    for (pet_type, program, weight), row in row_index.items():
+        other_type = "cat" if pet_type == "dog" else "dog"
+        for column, frequency in enumerate(FREQUENCIES):
+            try:
+                for flags in range(FLAG_COMBINATIONS):
+                    components[row, flags, column] = quote(
+                        pet_type, program, weight, frequency, tariff=tariff,
+                        special_breed_5_percent=bool(flags & 1),
+                        special_breed_20_percent=bool(flags & 2),
+                        poisoning=bool(flags & 4),
+                        blood_checkup=bool(flags & 8),
+                    ).gross_components[:3]
+                for same, first_pet_type in enumerate((other_type, pet_type)):
+                    second_components[row, same, column] = quote_second_pet(
+                        pet_type, program, weight, frequency, tariff=tariff,
+                        first_pet_type=first_pet_type, first_pet_weight=weight,
+                    ).gross_components[:3]
+            except ValueError:
+                pass  # frequency missing from this version – stays NaN
+    components.setflags(write=False)
+    second_components.setflags(write=False)
+
+    _premium_matrices[key] = (row_index, components, second_components)
+    return _premium_matrices[key]
+
+
+class SimulationRow(NamedTuple):
+    """Annualized portfolio figures of one group under both tariffs."""
+
+    program: Optional[str]
+    pet_type: Optional[str]
+    weight: Optional[str]
+    policies: int
+    gross_before: float
+    gross_after: float
+    net_before: float
+    net_after: float
+    ipt_before: float
+    ipt_after: float
+
+    @property
+    def gross_delta(self):
+        return round(self.gross_after - self.gross_before, 2)
+
+    @property
+    def net_delta(self):
+        return round(self.net_after - self.net_before, 2)
+
+    @property
+    def ipt_delta(self):
+        return round(self.ipt_after - self.ipt_before, 2)
+
+    @property
+    def gross_delta_percent(self):
+        return self.gross_delta / self.gross_before * 100 if self.gross_before else None
+
+
+class SimulationReport(NamedTuple):
+    baseline: Tariff
+    candidate: Tariff
+    rows: tuple             # SimulationRow per (program, pet type, weight)
+    totals: SimulationRow
+    skipped: int            # policies one of the tariffs cannot price
+    seconds: float
+
+
+def simulate_tariff(candidate, baseline=None, chunk_size=SIMULATION_CHUNK_SIZE, queryset=None):
+    """
+    Reprice every application (household premiums, surcharges and add-ons from
+    the questionnaire, the affiliate discount it was sold with) under
+    ``baseline`` (default: the active tariff) and ``candidate``, and aggregate
+    annualized gross / net / IPT per program, pet type and weight class. Net
+    and IPT are those of the final premiums (Quote.gross_components).
+    Read-only; memory stays flat because rows are streamed with
+    ``.iterator()`` and only per-group sums are kept.
+    """
+    import numpy as np
+    from itertools import islice
+    from .models import AmbassadorCode, InsuranceApplication
+
+    started = time.monotonic()
+    baseline = baseline or get_active_tariff()
+    tariffs = (baseline, candidate)
+    matrices = [get_component_matrix(tariff) for tariff in tariffs]
+    installments = np.array([INSTALLMENTS[frequency] for frequency in FREQUENCIES], dtype=float)
+
+    if queryset is None:
+        queryset = InsuranceApplication.objects.all()
+    policies = queryset.order_by().values_list(
+        "pet_type", "program", "pet_weight_category",
+        "questionnaire__special_breed_5_percent",
+        "questionnaire__special_breed_20_percent",
+        "questionnaire__additional_poisoning_coverage",
+        "questionnaire__additional_blood_checkup",
+        "questionnaire__payment_frequency",
+        "has_second_pet", "second_pet_type", "second_pet_weight_category",
+        "affiliate_code", "discount_applied",
+    ).iterator(chunk_size=chunk_size)
+
+    groups = {}
+    # Discounted policies are priced one by one (like reprice_portfolio),
+    # once per household key and tariff
+    households = {}
+    # Per group: policies, then gross / net / ipt before and after
+    sums = np.zeros((0, 7))
+    skipped = 0
+
+    while True:
+        chunk = list(islice(policies, chunk_size))
+        if not chunk:
+            break
+
+        group_ids, flags, columns, same_band = [], [], [], []
+        rows = ([], [])
+        second_rows = ([], [])
+        discounted = []
+        for (pet_type, program, weight, s5, s20, poisoning, blood, frequency,
+             has_second, second_type, second_weight, affiliate_code, discount_applied) in chunk:
+            weight = normalize_weight(weight)
+            second_weight = normalize_weight(second_weight) if has_second and second_type else None
+            found = []
+            for row_index, _, _ in matrices:
+                row = row_index.get((pet_type, program, weight))
+                second_row = row_index.get((second_type, program, second_weight), None) if second_weight else -1
+                found.append((row, second_row))
+            if any(row is None or second_row is None for row, second_row in found):
+                skipped += 1
+                continue
+
+            key = (program, pet_type, weight)
+            if key not in groups:
+                groups[key] = len(groups)
+            group_ids.append(groups[key])
+            flags.append(flag_index(s5, s20, poisoning, blood))
+            columns.append(FREQUENCIES.index(normalize_frequency(frequency)))
+            same_band.append(second_type == pet_type and second_weight == weight)
+            for side, (row, second_row) in enumerate(found):
+                rows[side].append(row)
+                second_rows[side].append(second_row)
+            if affiliate_code and discount_applied:
+                pets = [HouseholdPet(pet_type, program, weight, {
+                    "special_breed_5_percent": bool(s5),
+                    "special_breed_20_percent": bool(s20),
+                    "poisoning": bool(poisoning),
+                    "blood_checkup": bool(blood),
+                })]
+                if second_weight:
+                    pets.append(HouseholdPet(second_type, program, second_weight))
+                household_key = (pet_type, program, weight, flags[-1], second_type, second_weight)
+                discounted.append((len(group_ids) - 1, pets, household_key, affiliate_code))
+
+        if not group_ids:
+            continue
+
+        group_ids = np.array(group_ids)
+        flags = np.array(flags)
+        columns = np.array(columns)
+        same_band = np.array(same_band)
+        values = np.zeros((len(group_ids), 7))
+        values[:, 0] = 1
+        for side, tariff in enumerate(tariffs):
+            first = np.array(rows[side])
+            second = np.array(second_rows[side])
+            has_second = second >= 0
+            scale = installments[columns]
+
+            gross = quote_batch(first, flags, tariff, second_rows=second, same_band=same_band)
+            values[:, 1 + side] = gross[np.arange(len(columns)), columns] * scale
+
+            _, components, second_components = matrices[side]
+            parts = components[first, flags, columns]
+            parts[has_second] += second_components[
+                second[has_second], same_band[has_second].astype(int), columns[has_second]
+            ]
+            values[:, 3 + side] = parts[:, 0] * scale
+            values[:, 5 + side] = parts[:, 2] * scale
+
+        # The affiliate discount the policy was sold with (see
+        # application_ambassador_code); a deleted code leaves it undiscounted
+        codes = AmbassadorCode.objects.in_bulk({code for *_, code in discounted}, field_name="code") if discounted else {}
+        for index, pets, household_key, code in discounted:
+            code = codes.get(code)
+            if code is None:
+                continue
+            frequency = FREQUENCIES[columns[index]]
+            for side, tariff in enumerate(tariffs):
+                key = (side, household_key, code.pk)
+                if key not in households:
+                    try:
+                        households[key] = quote_household(pets, ambassador_code=code, tariff=tariff)
+                    except ValueError:
+                        households[key] = None
+                if households[key] is None:
+                    values[index, 1 + side] = np.nan
+                    continue
+                parts = [quotes[frequency].gross_components for quotes in households[key].pets]
+                scale = INSTALLMENTS[frequency]
+                values[index, 1 + side] = sum(part.gross for part in parts) * scale
+                values[index, 3 + side] = sum(part.net for part in parts) * scale
+                values[index, 5 + side] = sum(part.ipt for part in parts) * scale
+
+        # A version may lack the policy's frequency: such policies are not compared
+        priced = ~np.isnan(values).any(axis=1)
+        skipped += int((~priced).sum())
+
+        if len(groups) > len(sums):
+            sums = np.vstack([sums, np.zeros((len(groups) - len(sums), 7))])
+        np.add.at(sums, group_ids[priced], values[priced])
+
+    def make_row(key, total):
+        return SimulationRow(
+            *key, int(total[0]),
+            *(round(float(value), 2) for value in (total[1], total[2], total[3], total[4], total[5], total[6])),
+        )
+
+    return SimulationReport(
+        baseline=baseline,
+        candidate=candidate,
+        rows=tuple(make_row(key, sums[index]) for key, index in sorted(groups.items())),
+        totals=make_row((None, None, None), sums.sum(axis=0) if len(sums) else np.zeros(7)),
+        skipped=skipped,
+        seconds=time.monotonic() - started,
+    )
@@ -175,3 +175,39 @@ def generate_terms_qr():
 
 
 
+# ----------------------------------------------------
+#  QR CODES IN CONTRACT PDFs
+# ----------------------------------------------------
+# Symbols come from qrcode itself (level M, best of the 8 masks) and are
+# drawn as inline 1-bit images. The terms code, the same URL on every
+# contract, is encoded once per template (contract_template.CACHED_QR_CODES).
+
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M
+QR_BORDER = 4
+# bytes(row of modules) -> '1' / '0' image samples
+_QR_SAMPLES = bytes.maketrans(b'\x00\x01', b'10')
+
+
+def qr_matrix(data):
+    """Modules of the QR code of ``data`` (True = dark), with the 4-module quiet zone."""
+    qr = qrcode.QRCode(error_correction=QR_ERROR_CORRECTION, border=QR_BORDER)
+    qr.add_data(data)
+    return qr.get_matrix()
+
+
+def pdf_qr_image(data, x, y, size):
+    """
+    PDF content stream operators drawing the QR code of ``data`` as an inline
+    1-bit grayscale image (one bit per module, hex encoded) in the square
+    ``size`` points wide at (``x``, ``y``). Opaque: light modules are white.
+    """
+    matrix = qr_matrix(data)
+    modules = len(matrix)
+    pad = b'0' * (-modules % 8)
+    row_format = f'0{(modules + 7) // 8 * 2}x'
+    # Gray samples: dark modules 0 (black), light ones 1 (white)
+    rows = ''.join(format(int(bytes(row).translate(_QR_SAMPLES) + pad, 2), row_format) for row in matrix)
+    return (
+        f'q {size:g} 0 0 {size:g} {x:g} {y:g} cm\n'
+        f'BI /W {modules} /H {modules} /BPC 1 /CS /G /F /AHx ID\n{rows}>\nEI Q\n'
+    )
@@ -0,0 +1,118 @@
+"""
+Questionnaire payload parsing, declared once from the Questionnaire model.
+
+Answers arrive as raw multi-dicts: the questionnaire page POSTs them (kept
+in the session by the health_status view), the submission POSTs some of
+them again and a few flags ride along in the URL. parse_questionnaire()
+turns those sources into typed values in a single pass over the model's
+fields: for each field the first source with a value wins, repeated
+checkboxes count as checked when any of them is 'true', and invalid values
+are collected into one errors dict instead of failing one at a time. The
+work is fixed by the model, not by the size of the payload.
+"""
+
+from datetime import datetime
+from typing import NamedTuple
+
+# Form spellings of an unchecked box; any other value counts as checked
+FALSE_VALUES = frozenset({'false', 'no', '0', ''})
+
+# Model fields that are not answers
+NOT_ANSWERS = frozenset({'id', 'application', 'created_at', 'updated_at'})
+
+# Session key of the questionnaire page's answers
+SESSION_KEY = 'questionnaire_data'
+
+
+class AnswerField(NamedTuple):
+    name: str
+    kind: str           # 'bool', 'date' or 'str'
+    choices: frozenset  # allowed values of choice fields, empty for any
+
+
+class QuestionnaireAnswers(NamedTuple):
+    values: dict        # field name -> typed value, every answer field
+    answered: tuple     # names of the fields found in a source
+    errors: dict        # field name -> message, for values that were dropped
+
+
+_state = {"fields": None}
+
+
+def answer_fields():
+    """AnswerField of every Questionnaire answer, built from the model once per process."""
+    if _state["fields"] is None:
+        from django.db import models
+        from .models import Questionnaire
+
+        fields = []
+        for field in Questionnaire._meta.concrete_fields:
+            if field.name in NOT_ANSWERS:
+                continue
+            if isinstance(field, models.BooleanField):
+                kind = 'bool'
+            elif isinstance(field, models.DateField):
+                kind = 'date'
+            else:
+                kind = 'str'
+            fields.append(AnswerField(field.name, kind, frozenset(value for value, _ in field.choices or ())))
+        _state["fields"] = tuple(fields)
+    return _state["fields"]
+
+
+def raw_answer(name, *sources):
+    """
+    Value of form field ``name`` in the first of ``sources`` (QueryDicts or
+    plain dicts, e.g. the session copy) that has one: 'true' when any of a
+    repeated field's values is, else its first value; '' when none has it.
+    """
+    for source in sources:
+        if hasattr(source, 'getlist'):
+            values = source.getlist(name)
+        else:
+            value = source.get(name)
+            values = value if isinstance(value, list) else [] if value is None else [value]
+        if 'true' in values or True in values:
+            return 'true'
+        value = str(values[0]) if values else ''
+        if value:
+            return value
+    return ''
+
+
+def flatten_answers(querydict):
+    """One value per field of a submitted form (see raw_answer), e.g. for the session."""
+    return {name: raw_answer(name, querydict) for name in querydict}
+
+
+def questionnaire_sources(request):
+    """Where answers are read from, most recent first: POST, the session, the URL."""
+    session_data = request.session.get(SESSION_KEY)
+    return request.POST, session_data if isinstance(session_data, dict) else {}, request.GET
+
+
+def parse_questionnaire(*sources):
+    """Typed answers of every Questionnaire field from ``sources``, most recent first."""
+    values = {}
+    answered = []
+    errors = {}
+    for field in answer_fields():
+        raw = raw_answer(field.name, *sources)
+        if raw:
+            answered.append(field.name)
+        if field.kind == 'bool':
+            # Unchecked boxes are not submitted: missing means False
+            values[field.name] = raw.lower().strip() not in FALSE_VALUES
+        elif field.kind == 'date':
+            values[field.name] = None
+            if raw:
+                try:
+                    values[field.name] = datetime.strptime(raw, '%Y-%m-%d').date()
+                except ValueError:
+                    errors[field.name] = f"invalid date {raw!r}"
+        elif field.choices and raw and raw not in field.choices:
+            values[field.name] = ''
+            errors[field.name] = f"{raw!r} is not one of {', '.join(sorted(field.choices))}"
+        else:
+            values[field.name] = raw
+    return QuestionnaireAnswers(values, tuple(answered), errors)
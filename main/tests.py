@@ -1,3 +1,988 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .contract_template import render_contract
+from .jobs import JOB_TYPES, claim_job, enqueue, run_job, run_pending_jobs
+from .models import BackgroundJob, InsuranceApplication, PetDocument, PetPhoto, PetPremium, Questionnaire
+from .pdf_optimize import optimize_pdf
+from .qr_utils import pdf_qr_image, qr_matrix
+from .questionnaire import parse_questionnaire
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+SUBMISSION = {
+    'name': 'Rex', 'type': 'dog', 'gender': 'male', 'breed': 'Beagle', 'birthdate': '2020-01-01',
+    'program': 'gold', 'health_status': 'healthy',
+    'fullName': 'Test User', 'afm': '123456789', 'phone': '6900000000', 'address': 'Test 1',
+    'postalCode': '11111', 'email': 'test@example.com',
+    'payment_frequency': 'annual', 'special_breed_5_percent': 'true', 'additional_poisoning_coverage': 'true',
+}
+
+
+def statements(queries):
+    """Queries other than savepoints: the submission runs in one transaction."""
+    return [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+
+
+def premium_writes(queries):
+    """INSERT / UPDATE / DELETE statements on the PetPremium table."""
+    table = PetPremium._meta.db_table
+    return [
+        q['sql'] for q in queries
+        if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) and f'"{table}"' in q['sql']
+    ]
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    EMAIL_HOST='localhost',
+    EMAIL_USE_SSL=True,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class PremiumRecalculationQueryTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        # The customer confirmation talks SMTP itself, past the email backend
+        smtp = mock.patch('smtplib.SMTP_SSL')
+        self.smtp = smtp.start().return_value
+        self.smtp.sendmail.return_value = {}
+        self.addCleanup(smtp.stop)
+
+    def submit(self, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('main:handle_application_submission'), {**SUBMISSION, **extra})
+        self.assertTrue(response.json()['success'])
+        return InsuranceApplication.objects.latest('id'), ctx.captured_queries
+
+    def run_jobs(self):
+        """Run the queued background jobs as a worker would; returns their queries."""
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                run_pending_jobs()
+        return ctx.captured_queries
+
+    def admin_change_data(self, url):
+        """POST data of the unchanged admin change form at ``url``."""
+        response = self.client.get(url)
+        form = response.context['adminform'].form
+        data = {'_save': 'Save'}
+        for name, field in form.fields.items():
+            value = form.initial.get(name, field.initial)
+            if isinstance(value, bool):
+                if value:
+                    data[name] = 'on'
+            elif value is not None:
+                data[name] = getattr(value, 'pk', value)
+        for inline in response.context['inline_admin_formsets']:
+            management = inline.formset.management_form
+            data.update({f'{management.prefix}-{key}': value for key, value in management.initial.items()})
+            for inline_form in inline.formset.forms:
+                data[f'{inline_form.prefix}-id'] = inline_form.instance.pk
+        return data
+
+    def admin_save(self, url, data):
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        return ctx.captured_queries
+
+    def test_submission_prices_once(self):
+        application, queries = self.submit()
+
+        # The request stores the premiums (one delete + bulk insert of the
+        # per-pet rows) and only queues the contract and emails
+        self.assertEqual(len(premium_writes(queries)), 2)
+        self.assertLessEqual(len(statements(queries)), 18)
+        self.assertEqual(application.pet_premiums.count(), 3)
+        self.assertEqual(
+            (application.annual_premium, application.six_month_premium, application.three_month_premium),
+            tuple(application.pet_premiums.get(frequency=f).gross for f in ('annual', 'six_month', 'three_month')),
+        )
+
+        # One outbox row per side effect, keyed to the submission
+        self.assertEqual(
+            sorted(BackgroundJob.objects.filter(application=application).values_list('idempotency_key', flat=True)),
+            [f'submission:{application.id}:{effect}' for effect in ('company_email', 'customer_email', 'generate_contract')],
+        )
+
+        # The contract job finds the stored premiums current
+        self.assertEqual(premium_writes(self.run_jobs()), [])
+        self.assertFalse(BackgroundJob.objects.exclude(status='done').exists())
+        application.refresh_from_db()
+        self.assertTrue(application.contract_generated)
+
+        # Both emails sent by their jobs: the company's through the email backend
+        from django.core import mail
+        self.assertEqual(len(mail.outbox), 1)
+        self.smtp.sendmail.assert_called_once()
+        self.assertIn('test@example.com', self.smtp.sendmail.call_args.args[1])
+        self.assertEqual(application.pet_premiums.count(), 3)
+        self.assertEqual(
+            application.annual_premium,
+            application.pet_premiums.get(frequency='annual').gross,
+        )
+
+    def test_affiliate_discount_survives_the_recalculation_job(self):
+        from decimal import Decimal
+        from .models import AmbassadorCode
+
+        # The submission uses up the code; the discount still belongs to the policy
+        AmbassadorCode.objects.create(code='PARTNER10', name='Partner', discount_percentage=Decimal('10'), max_uses=1)
+        application, _ = self.submit(affiliateCode='partner10')
+        self.assertGreater(application.discount_applied, 0)
+        submitted = application.annual_premium
+
+        self.run_jobs()
+        application.refresh_from_db()
+        self.assertEqual(application.annual_premium, submitted)
+        self.assertEqual(application.pet_premiums.get(frequency='annual').discount, application.discount_applied)
+        self.assertEqual(application.pet_premiums.get(frequency='annual').gross, submitted)
+
+    def test_premium_fingerprint_follows_the_repricing_inputs(self):
+        from decimal import Decimal
+        from .models import AmbassadorCode
+        from .pricing import application_ambassador_code
+        from .utils import premium_fingerprint
+
+        code = AmbassadorCode.objects.create(code='PARTNER10', name='Partner', discount_percentage=Decimal('10'))
+        application, _ = self.submit(affiliateCode='PARTNER10')
+        fingerprint = premium_fingerprint(application, application_ambassador_code(application))
+
+        # Every frequency is priced: the chosen one is no input
+        application.questionnaire.payment_frequency = 'three_month'
+        self.assertEqual(premium_fingerprint(application, code), fingerprint)
+        code.discount_percentage = Decimal('15')
+        self.assertNotEqual(premium_fingerprint(application, code), fingerprint)
+        self.assertNotEqual(premium_fingerprint(application, None), fingerprint)
+
+    def test_replayed_submission_token_returns_the_original_application(self):
+        from .views import issue_submission_token
+
+        token = issue_submission_token()
+        application, _ = self.submit(submission_token=token)
+        url = reverse('main:handle_application_submission')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, {**SUBMISSION, 'submission_token': token})
+        self.assertEqual(response.json()['application_id'], application.id)
+        self.assertTrue(response.json()['replayed'])
+        # One indexed lookup, no work
+        self.assertEqual(len(statements(ctx.captured_queries)), 1)
+
+        response = self.client.post(url, {**SUBMISSION, 'program': 'platinum', 'submission_token': token})
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(InsuranceApplication.objects.count(), 1)
+        self.assertEqual(BackgroundJob.objects.count(), 3)
+
+    def test_upload_linking_is_one_update_per_model(self):
+        def submit_with_uploads(count):
+            photos = PetPhoto.objects.bulk_create([
+                PetPhoto(file=f'pet_photos/{i}.jpg', original_filename=f'{i}.jpg', file_size=1, file_type='image/jpeg')
+                for i in range(count)
+            ])
+            document = PetDocument.objects.create(
+                file='pet_documents/vet.pdf', original_filename='vet.pdf', file_size=1, file_type='application/pdf'
+            )
+            session = self.client.session
+            session['uploaded_photo_ids'] = [photo.id for photo in photos]
+            session['uploaded_document_ids'] = [document.id]
+            session.save()
+            application, queries = self.submit()
+            self.assertEqual(application.photos.count(), count)
+            self.assertEqual(application.documents.count(), 1)
+            return [
+                sql for sql in statements(queries)
+                if '"main_petphoto"' in sql or '"main_petdocument"' in sql
+            ]
+
+        self.assertEqual(len(submit_with_uploads(1)), 2)
+        self.assertEqual(len(submit_with_uploads(7)), 2)
+
+    def test_uploads_of_another_session_are_not_linked(self):
+        foreign = PetPhoto.objects.create(
+            file='pet_photos/other.jpg', original_filename='other.jpg', file_size=1, file_type='image/jpeg'
+        )
+        application, _ = self.submit(photo_ids=str(foreign.id))
+        foreign.refresh_from_db()
+        self.assertIsNone(foreign.application)
+
+        # Linked already: listing it in this session does not move it
+        session = self.client.session
+        session['uploaded_photo_ids'] = [foreign.id]
+        session.save()
+        foreign.application = application
+        foreign.save()
+        self.submit()
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.application, application)
+
+    def test_two_pet_contracts_are_recorded_and_zipped_from_the_manifest(self):
+        from .utils import generate_contract_pdf
+
+        application, _ = self.submit(
+            secondPetName='Mia', secondPetType='dog', secondPetGender='female',
+            secondPetBirthdate='2021-01-01', secondPetWeight='10',
+        )
+        self.run_jobs()
+        documents = list(application.contract_documents.order_by('pet_number'))
+        self.assertEqual([(d.version, d.pet_number) for d in documents], [(1, 1), (1, 2)])
+        self.assertTrue(all(d.size > 0 for d in documents))
+
+        # Unchanged content: no new version, and the timing line says so
+        with self.assertLogs('main.timing', 'INFO') as logs:
+            generate_contract_pdf(application, merged=False)
+        self.assertEqual(application.contract_documents.count(), 2)
+        record, = logs.records
+        self.assertEqual(record.context['outcome'], 'unchanged')
+        self.assertEqual(list(record.stages), ['load', 'premium', 'fields', 'manifest', 'total'])
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:view_contract', args=[application.pk]))
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [d.filename for d in documents])
+        self.assertTrue(all(archive.read(d.filename).startswith(b'%PDF') for d in documents))
+
+    def test_admin_save_without_pricing_change_skips_recalculation(self):
+        application, _ = self.submit()
+        self.client.force_login(self.admin)
+        url = reverse('admin:main_insuranceapplication_change', args=[application.pk])
+        data = self.admin_change_data(url)
+
+        self.run_jobs()
+        queries = self.admin_save(url, data)
+
+        self.assertLessEqual(len(queries), 15)
+        self.assertEqual(premium_writes(queries + self.run_jobs()), [])
+
+    def test_admin_save_with_pricing_change_recalculates_once(self):
+        application, _ = self.submit()
+        before = application.annual_premium
+        self.client.force_login(self.admin)
+        url = reverse('admin:main_insuranceapplication_change', args=[application.pk])
+        data = self.admin_change_data(url)
+        data['program'] = 'platinum'
+
+        self.run_jobs()
+        queries = self.admin_save(url, data)
+
+        self.assertEqual(len(premium_writes(queries + self.run_jobs())), 2)
+        application.refresh_from_db()
+        self.assertGreater(application.annual_premium, before)
+        self.assertEqual(
+            application.annual_premium,
+            application.pet_premiums.get(frequency='annual').gross,
+        )
+
+    def test_admin_breakdown_of_unpriced_pets_queues_the_recalculation(self):
+        application, _ = self.submit()
+        self.run_jobs()
+        # Priced before per-pet rows and fingerprints existed
+        application.pet_premiums.all().delete()
+        InsuranceApplication.objects.filter(pk=application.pk).update(pricing_fingerprint='')
+        questionnaire = Questionnaire.objects.get(application=application)
+        self.client.force_login(self.admin)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:main_questionnaire_change', args=[questionnaire.pk]))
+        self.assertContains(response, 'ανάλυση σε εκκρεμότητα')
+        self.assertEqual(premium_writes(ctx.captured_queries), [])
+        self.assertEqual(
+            BackgroundJob.objects.filter(application=application, job_type='recalculate_premium', status='queued').count(), 1
+        )
+
+        self.run_jobs()
+        self.assertEqual(application.pet_premiums.count(), 3)
+
+    def test_questionnaire_saves_in_one_transaction_share_one_recalculation(self):
+        application, _ = self.submit()
+        self.run_jobs()
+        questionnaire = Questionnaire.objects.get(application=application)
+
+        with transaction.atomic():
+            questionnaire.additional_blood_checkup = True
+            questionnaire.save()
+            questionnaire.special_breed_20_percent = True
+            questionnaire.save()
+
+        self.assertEqual(
+            BackgroundJob.objects.filter(application=application, job_type='recalculate_premium', status='queued').count(), 1
+        )
+        self.run_jobs()
+        questionnaire.application.refresh_from_db()
+        self.assertEqual(
+            questionnaire.application.annual_premium,
+            PetPremium.objects.get(application=application, pet_number=1, frequency='annual').gross,
+        )
+
+
+class BackgroundJobTests(TestCase):
+
+    def test_enqueue_with_idempotency_key_adds_the_job_once(self):
+        enqueue('recalculate_premium', key='test:once')
+        BackgroundJob.objects.update(status='done')
+        enqueue('recalculate_premium', key='test:once')
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+
+        # Rolled back with the transaction it was written in
+        with transaction.atomic():
+            enqueue('customer_email', key='test:rolled-back')
+            transaction.set_rollback(True)
+        self.assertFalse(BackgroundJob.objects.filter(idempotency_key='test:rolled-back').exists())
+
+    def test_failed_job_is_retried_with_backoff_until_max_attempts(self):
+        # No application: the handler raises DoesNotExist on every attempt
+        job = BackgroundJob.objects.create(job_type='recalculate_premium', max_attempts=2)
+
+        self.assertEqual(run_job(claim_job('test')), 'queued')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(claim_job('test'))
+
+        BackgroundJob.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(run_job(claim_job('test')), 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('DoesNotExist', job.last_error)
+
+    def test_pricing_error_in_the_recalculation_job_is_retried(self):
+        application = InsuranceApplication.objects.create(
+            full_name='Test User', afm='123456789', phone='6900000000', address='Test 1', postal_code='11111',
+            email='test@example.com', pet_name='Rex', pet_type='dog', pet_gender='male', pet_breed='Beagle',
+            pet_birthdate='2020-01-01', pet_weight_category='10_25', program='gold', health_status='healthy',
+        )
+        enqueue('recalculate_premium', application)
+        job = BackgroundJob.objects.get(application=application)
+
+        with mock.patch('main.utils.quote_application_household', side_effect=ValueError('no tariff row')):
+            self.assertEqual(run_job(claim_job('test')), 'queued')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('no tariff row', job.last_error)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(run_job(claim_job('test')), 'done')
+        application.refresh_from_db()
+        self.assertIsNotNone(application.annual_premium)
+
+    def test_claim_respects_job_type_concurrency(self):
+        limit = JOB_TYPES['generate_contract'].concurrency
+        BackgroundJob.objects.bulk_create(
+            [BackgroundJob(job_type='generate_contract', status='running') for _ in range(limit)]
+            + [BackgroundJob(job_type='generate_contract'), BackgroundJob(job_type='customer_email')]
+        )
+
+        self.assertEqual(claim_job('test').job_type, 'customer_email')
+        self.assertIsNone(claim_job('test'))
+
+    def test_abandoned_job_on_its_last_attempt_fails(self):
+        from datetime import timedelta
+        from .jobs import requeue_abandoned_jobs
+
+        expired = timezone.now() - timedelta(seconds=JOB_TYPES['generate_contract'].timeout + 1)
+        retried, crashed = BackgroundJob.objects.bulk_create([
+            BackgroundJob(job_type='generate_contract', status='running', locked_at=expired, attempts=1, max_attempts=3),
+            BackgroundJob(job_type='generate_contract', status='running', locked_at=expired, attempts=3, max_attempts=3),
+        ])
+
+        self.assertEqual(requeue_abandoned_jobs(), 1)
+        retried.refresh_from_db()
+        crashed.refresh_from_db()
+        self.assertEqual(retried.status, 'queued')
+        self.assertEqual(crashed.status, 'failed')
+
+    def test_application_jobs_are_only_shown_to_their_session_and_staff(self):
+        application = InsuranceApplication.objects.create(
+            full_name='Test User', afm='123456789', phone='6900000000', address='Test 1', postal_code='11111',
+            email='test@example.com', pet_name='Rex', pet_type='dog', pet_gender='male', pet_breed='Beagle',
+            pet_birthdate='2020-01-01', pet_weight_category='10_25', program='gold', health_status='healthy',
+        )
+        enqueue('customer_email', application)
+        url = reverse('main:application_jobs_api', args=[application.id])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        session = self.client.session
+        session['submitted_application_ids'] = [application.id]
+        session.save()
+        self.assertEqual(len(self.client.get(url).json()['jobs']), 1)
+
+        self.client.logout()
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+        self.assertTrue(self.client.get(url).json()['pending'])
+
+
+class PricingTests(TestCase):
+
+    def priced_application(self, pets, ambassador_code=None, payment_frequency='annual', **fields):
+        """Application of HouseholdPets with current built-in premiums, per-pet rows and a questionnaire of the first pet's flags."""
+        from decimal import Decimal
+        from .pricing import BUILTIN_TARIFF, quote_household
+        from .utils import pet_premium_rows
+
+        household = quote_household(pets, ambassador_code=ambassador_code, tariff=BUILTIN_TARIFF)
+        totals = household.totals
+        first = pets[0]
+        if len(pets) > 1:
+            fields.update(has_second_pet=True, second_pet_name='Max', second_pet_type=pets[1].pet_type,
+                          second_pet_weight_category=pets[1].weight_category)
+        application = InsuranceApplication.objects.create(
+            full_name='Test User', afm='123456789', phone='6900000000', address='Test 1', postal_code='11111',
+            email='test@example.com', pet_name='Rex', pet_type=first.pet_type, pet_gender='male',
+            pet_breed='Beagle', pet_birthdate='2020-01-01', pet_weight_category=first.weight_category,
+            program=first.program, health_status='healthy',
+            annual_premium=Decimal(str(totals['annual'])),
+            six_month_premium=Decimal(str(totals['6m'])),
+            three_month_premium=Decimal(str(totals['3m'])),
+            **fields,
+        )
+        options = first.options or {}
+        Questionnaire.objects.create(
+            application=application, payment_frequency=payment_frequency,
+            special_breed_5_percent=options.get('special_breed_5_percent', False),
+            special_breed_20_percent=options.get('special_breed_20_percent', False),
+            additional_poisoning_coverage=options.get('poisoning', False),
+            additional_blood_checkup=options.get('blood_checkup', False),
+        )
+        PetPremium.objects.bulk_create(pet_premium_rows(application.pk, household))
+        return application
+
+    def test_quotes_match_the_excel_table_premiums(self):
+        from .pricing import BUILTIN_TARIFF, PRICING, quote
+
+        poisoning = {'silver': 18, 'gold': 20, 'platinum': 25}
+        scale = {'annual': 1, '6m': 0.5, '3m': 0.25}
+
+        def excel_premium(cell, program, frequency, flags):
+            # recalculate_application_premium before the engine: the nested
+            # Excel row, cumulative surcharges, add-ons scaled per frequency
+            premium = cell['gross']
+            surcharge_5 = surcharge_20 = 0
+            if flags & 1:
+                surcharge_5 = round(premium * 0.05, 2)
+                premium = premium * 1.05
+            if flags & 2:
+                surcharge_20 = round(premium * 0.20, 2)
+                premium = premium * 1.20
+            if flags & 4:
+                premium += poisoning[program] if frequency == 'annual' else round(poisoning[program] * scale[frequency], 2)
+            if flags & 8:
+                premium += 28.00 if frequency == 'annual' else round(28.00 * scale[frequency], 2)
+            return round(premium, 2), surcharge_5, surcharge_20
+
+        cells = 0
+        for pet_type, programs in PRICING.items():
+            for program, weights in programs.items():
+                for weight, rows in weights.items():
+                    for frequency in ('annual', '6m', '3m'):
+                        cell = rows[frequency]
+                        for flags in range(16):
+                            q = quote(
+                                pet_type, program, weight, frequency, tariff=BUILTIN_TARIFF,
+                                special_breed_5_percent=bool(flags & 1), special_breed_20_percent=bool(flags & 2),
+                                poisoning=bool(flags & 4), blood_checkup=bool(flags & 8),
+                            )
+                            with self.subTest(pet_type=pet_type, program=program, weight=weight, frequency=frequency, flags=flags):
+                                self.assertEqual((q.net, q.fee, q.ipt, q.base_gross), tuple(cell[k] for k in ('net', 'fee', 'ipt', 'gross')))
+                                self.assertEqual((q.gross, q.surcharge_5_percent, q.surcharge_20_percent), excel_premium(cell, program, frequency, flags))
+                        cells += 1
+        self.assertEqual(cells, len(BUILTIN_TARIFF.cells) // 2)
+
+        # Spot checks against the spreadsheet
+        self.assertEqual(quote('dog', 'gold', '10_25').gross, 261.09)
+        self.assertEqual(quote('dog', 'gold', '10_25', special_breed_5_percent=True, poisoning=True).gross, 294.14)
+        self.assertEqual(quote('cat', 'silver', 'up_10', '3m', blood_checkup=True).gross, 38.30)
+
+    def test_second_pet_is_its_share_of_the_combined_row_or_the_fallback_factor(self):
+        from .pricing import BUILTIN_TARIFF, PRICING, quote_second_pet
+
+        for pet_type, programs in PRICING.items():
+            for program, weights in programs.items():
+                for weight, rows in weights.items():
+                    for frequency in ('annual', '6m', '3m'):
+                        single, combined = rows[frequency], rows[f'{frequency}_2nd']
+                        with self.subTest(pet_type=pet_type, program=program, weight=weight, frequency=frequency):
+                            # Same type and band: combined two-pet row minus the single premium
+                            same = quote_second_pet(
+                                pet_type, program, weight, frequency, tariff=BUILTIN_TARIFF,
+                                first_pet_type=pet_type, first_pet_weight=weight,
+                            )
+                            self.assertEqual(
+                                (same.net, same.fee, same.ipt, same.gross),
+                                tuple(round(combined[k] - single[k], 2) for k in ('net', 'fee', 'ipt', 'gross')),
+                            )
+                            self.assertEqual(same.base_gross, single['gross'])
+                            self.assertEqual(same.discount, round(single['gross'] - same.gross, 2))
+
+                            # Other type: single premium x 0.95
+                            other = quote_second_pet(
+                                pet_type, program, weight, frequency, tariff=BUILTIN_TARIFF,
+                                first_pet_type='cat' if pet_type == 'dog' else 'dog', first_pet_weight=weight,
+                            )
+                            self.assertEqual(
+                                (other.net, other.fee, other.ipt, other.gross),
+                                tuple(round(single[k] * 0.95, 2) for k in ('net', 'fee', 'ipt', 'gross')),
+                            )
+
+        # Same type, other band: the fallback too
+        other_band = quote_second_pet('dog', 'gold', '21-40', first_pet_type='dog', first_pet_weight='10', tariff=BUILTIN_TARIFF)
+        self.assertEqual(other_band.gross, round(PRICING['dog']['gold']['21-40']['annual']['gross'] * 0.95, 2))
+
+    def test_batch_premiums_match_household_quotes(self):
+        import numpy as np
+        from .pricing import BUILTIN_TARIFF, FREQUENCIES, HouseholdPet, get_premium_matrix, quote_batch, quote_household
+
+        row_index, _ = get_premium_matrix(BUILTIN_TARIFF)
+        keys = list(row_index)
+        households = []
+        for i, (pet_type, program, weight) in enumerate(keys):
+            for flags in range(16):
+                # No second pet, one of the same type and band, one of another
+                for second in (None, (pet_type, weight), keys[(i + flags + 1) % len(keys)][::2]):
+                    if second and (second[0], program, second[1]) not in row_index:
+                        continue
+                    households.append((pet_type, program, weight, flags, second))
+
+        rows = np.array([row_index[h[:3]] for h in households])
+        flags = np.array([h[3] for h in households])
+        second_rows = np.array([row_index[(h[4][0], h[1], h[4][1])] if h[4] else -1 for h in households])
+        same_band = np.array([h[4] == (h[0], h[2]) for h in households])
+        batch = quote_batch(rows, flags, BUILTIN_TARIFF, second_rows=second_rows, same_band=same_band)
+
+        for (pet_type, program, weight, flag, second), premiums in zip(households, batch):
+            pets = [HouseholdPet(pet_type, program, weight, {
+                'special_breed_5_percent': bool(flag & 1), 'special_breed_20_percent': bool(flag & 2),
+                'poisoning': bool(flag & 4), 'blood_checkup': bool(flag & 8),
+            })]
+            if second:
+                pets.append(HouseholdPet(second[0], program, second[1]))
+            totals = quote_household(pets, tariff=BUILTIN_TARIFF).totals
+            with self.subTest(pets=pets):
+                self.assertEqual(list(premiums), [totals[frequency] for frequency in FREQUENCIES])
+
+    def test_reprice_portfolio_writes_only_the_changed_policies(self):
+        from decimal import Decimal
+        from django.core.management import call_command
+        from .models import AmbassadorCode
+        from .pricing import HouseholdPet
+
+        AmbassadorCode.objects.create(code='PARTNER10', name='Partner', discount_percentage=Decimal('10'))
+        application = self.priced_application
+
+        dog = HouseholdPet('dog', 'gold', '10_25')
+        current = application([dog])
+        household = application([dog, HouseholdPet('dog', 'gold', '10_25')])
+        discounted = application(
+            [dog], AmbassadorCode.objects.get(code='PARTNER10'),
+            affiliate_code='PARTNER10', discount_applied=Decimal('26.11'),
+        )
+        stale = application([dog])
+        InsuranceApplication.objects.filter(pk=stale.pk).update(annual_premium=Decimal('199.99'))
+        # Priced before per-pet rows existed: same premiums, breakdown backfilled
+        legacy = application([dog])
+        legacy.pet_premiums.all().delete()
+        unchanged = [current, household, discounted, legacy]
+        breakdowns = {
+            pk: sorted(PetPremium.objects.filter(application_id=pk).values_list('pet_number', 'frequency', 'gross'))
+            for pk in (current.pk, household.pk, discounted.pk)
+        }
+
+        out = io.StringIO()
+        call_command('reprice_portfolio', '--dry-run', stdout=out)
+        self.assertIn(f'#{stale.pk} ', out.getvalue())
+        self.assertIn(f'#{legacy.pk} ', out.getvalue())
+        self.assertIn('per-pet breakdown missing', out.getvalue())
+        self.assertIn('2 would change', out.getvalue())
+        self.assertEqual(InsuranceApplication.objects.get(pk=stale.pk).annual_premium, Decimal('199.99'))
+
+        table = InsuranceApplication._meta.db_table
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('reprice_portfolio', stdout=io.StringIO())
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE') and f'"{table}"' in q['sql']]
+        self.assertEqual(len(updates), 1)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.annual_premium, Decimal('261.09'))
+        self.assertEqual(stale.pet_premiums.count(), 3)
+        self.assertEqual(legacy.pet_premiums.count(), 3)
+        for pk, rows in breakdowns.items():
+            self.assertEqual(
+                sorted(PetPremium.objects.filter(application_id=pk).values_list('pet_number', 'frequency', 'gross')), rows,
+            )
+        for application in unchanged:
+            before = application.annual_premium, application.six_month_premium, application.three_month_premium
+            application.refresh_from_db()
+            self.assertEqual((application.annual_premium, application.six_month_premium, application.three_month_premium), before)
+
+    def test_simulation_totals_match_repricing_under_the_candidate(self):
+        from decimal import Decimal
+        from .models import AmbassadorCode
+        from .pricing import (
+            BUILTIN_TARIFF, FREQUENCY_KEYS, INSTALLMENTS, HouseholdPet, Tariff, application_ambassador_code,
+            application_pets, quote_household, simulate_tariff, tariff_csv, tariff_from_csv,
+        )
+
+        # Candidate: every price +7%, and no cat platinum row
+        candidate = tariff_from_csv(tariff_csv(Tariff(None, None, {
+            key: type(cell)(*(round(value * 1.07, 2) for value in cell))
+            for key, cell in BUILTIN_TARIFF.cells.items() if key[:2] != ('cat', 'platinum')
+        })))
+
+        code = AmbassadorCode.objects.create(code='PARTNER10', name='Partner', discount_percentage=Decimal('10'))
+        flags = {'special_breed_5_percent': True, 'poisoning': True}
+        applications = [
+            self.priced_application([HouseholdPet('dog', 'gold', '10_25', flags)]),
+            self.priced_application([HouseholdPet('dog', 'gold', '10_25')], payment_frequency='three_month'),
+            self.priced_application([HouseholdPet('dog', 'silver', 'over_40', {'blood_checkup': True}),
+                                     HouseholdPet('dog', 'silver', 'over_40')], payment_frequency='six_month'),
+            self.priced_application([HouseholdPet('cat', 'gold', 'up_10', {'poisoning': True}), HouseholdPet('dog', 'gold', '10')],
+                                    code, affiliate_code='PARTNER10', discount_applied=Decimal('20.00')),
+            self.priced_application([HouseholdPet('cat', 'platinum', 'up_10', {'special_breed_20_percent': True}),
+                                     HouseholdPet('dog', 'platinum', '25_40')]),
+            self.priced_application([HouseholdPet('dog', 'platinum', 'up_10'), HouseholdPet('cat', 'platinum', 'up_10')]),
+        ]
+
+        def repriced(tariff, group=None):
+            # Annualized gross / net / IPT, as stored per pet, of every policy the candidate can price
+            totals = [0, 0.0, 0.0, 0.0]
+            for application in applications[:4]:
+                if group and (application.program, application.pet_type) != group:
+                    continue
+                frequency = FREQUENCY_KEYS[application.questionnaire.payment_frequency]
+                household = quote_household(
+                    application_pets(application), ambassador_code=application_ambassador_code(application), tariff=tariff,
+                )
+                parts = [pet[frequency].gross_components for pet in household.pets]
+                scale = INSTALLMENTS[frequency]
+                totals[0] += 1
+                totals[1] += sum(part.gross for part in parts) * scale
+                totals[2] += sum(part.net for part in parts) * scale
+                totals[3] += sum(part.ipt for part in parts) * scale
+            return totals
+
+        report = simulate_tariff(candidate, baseline=BUILTIN_TARIFF, chunk_size=2)
+        self.assertEqual(report.skipped, 2)
+        before, after = repriced(BUILTIN_TARIFF), repriced(candidate)
+        totals = report.totals
+        self.assertEqual(totals.policies, before[0])
+        for field, expected in (('gross_before', before[1]), ('gross_after', after[1]), ('net_before', before[2]),
+                                ('net_after', after[2]), ('ipt_before', before[3]), ('ipt_after', after[3])):
+            self.assertAlmostEqual(getattr(totals, field), expected, places=2, msg=field)
+
+        gold = next(row for row in report.rows if row[:3] == ('gold', 'dog', '11-20'))
+        self.assertEqual(gold.policies, 2)
+        self.assertAlmostEqual(gold.gross_after, repriced(candidate, ('gold', 'dog'))[1], places=2)
+        self.assertAlmostEqual(gold.ipt_after, repriced(candidate, ('gold', 'dog'))[3], places=2)
+        discounted = next(row for row in report.rows if row[:3] == ('gold', 'cat', '10'))
+        self.assertAlmostEqual(discounted.gross_before, float(applications[3].annual_premium), places=2)
+
+    def test_activated_tariff_version_reprices_new_quotes(self):
+        from datetime import date
+        from decimal import Decimal
+        from .models import TariffCell, TariffVersion
+        from .pricing import BUILTIN_TARIFF, get_application_tariff, invalidate_tariff_cache, quote
+        from . import pricing
+
+        invalidate_tariff_cache()
+        self.addCleanup(invalidate_tariff_cache)
+        builtin = quote('dog', 'gold', '10_25')
+        self.assertEqual((builtin.gross, builtin.tariff_version), (261.09, None))
+
+        version = TariffVersion.objects.create(name='Excel +10%', effective_from=date.today())
+        TariffCell.objects.bulk_create(
+            TariffCell(
+                version=version, pet_type=key[0], program=key[1], weight_category=key[2], frequency=key[3],
+                is_second_pet=key[4], **{field: Decimal(str(round(value * 1.1, 2))) for field, value in cell._asdict().items()},
+            )
+            for key, cell in BUILTIN_TARIFF.cells.items()
+        )
+
+        # Between stamp checks the worker keeps its tariff without a query
+        with self.assertNumQueries(0):
+            self.assertIs(quote('dog', 'gold', '10_25'), builtin)
+
+        # The admin invalidates on save; other workers see the new stamp after the TTL
+        invalidate_tariff_cache()
+        activated = quote('dog', 'gold', '10_25')
+        self.assertEqual((activated.gross, activated.tariff_version), (287.2, version.pk))
+
+        with mock.patch.object(pricing, 'TARIFF_STAMP_TTL', 0):
+            cell = version.cells.get(pet_type='dog', program='gold', weight_category='11-20', frequency='annual', is_second_pet=False)
+            cell.gross = Decimal('300.00')
+            cell.save()
+            self.assertEqual(quote('dog', 'gold', '10_25').gross, 300.0)
+
+            version.is_published = False
+            version.save()
+            self.assertEqual(quote('dog', 'gold', '10_25').gross, 261.09)
+
+        # Applications keep the version they were priced with
+        application = InsuranceApplication(tariff_version=version)
+        self.assertEqual(get_application_tariff(application).version_id, version.pk)
+
+    def test_quote_api_matrix_matches_quotes_and_revalidates_with_etag(self):
+        from datetime import date
+        from .models import TariffCell, TariffVersion
+        from .pricing import BUILTIN_TARIFF, FREQUENCIES, FREQUENCY_NAMES, invalidate_tariff_cache, quote, quote_second_pet
+
+        invalidate_tariff_cache()
+        self.addCleanup(invalidate_tariff_cache)
+        url = reverse('main:quote_api')
+        params = {'pet_type': 'dog', 'weight': '10_25', 'second_pet_type': 'cat', 'second_pet_weight': 'up_10'}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        data = response.json()
+        self.assertEqual(data['tariff_version'], None)
+
+        first, second = data['pets']
+        self.assertEqual(sorted(first['programs']), ['gold', 'platinum', 'silver'])
+        for program, matrix in first['programs'].items():
+            for frequency in FREQUENCIES:
+                name = FREQUENCY_NAMES[frequency]
+                for flags in range(16):
+                    q = quote(
+                        'dog', program, '10_25', frequency,
+                        special_breed_5_percent=bool(flags & 1), special_breed_20_percent=bool(flags & 2),
+                        poisoning=bool(flags & 4), blood_checkup=bool(flags & 8),
+                    )
+                    with self.subTest(program=program, frequency=frequency, flags=flags):
+                        self.assertEqual(matrix['gross'][flags][name], q.gross)
+                        if flags < 4:
+                            self.assertEqual(matrix['surcharges'][flags][name], [q.surcharge_5_percent, q.surcharge_20_percent])
+                self.assertEqual(matrix['base'][name], quote('dog', program, '10_25', frequency).base_gross)
+                self.assertEqual(matrix['poisoning'][name], quote('dog', program, '10_25', frequency, poisoning=True).poisoning)
+                self.assertEqual(matrix['second_pet_combined'][name], BUILTIN_TARIFF.cells[('dog', program, '11-20', frequency, True)].gross)
+        for program, matrix in second['programs'].items():
+            for frequency in FREQUENCIES:
+                self.assertEqual(
+                    matrix['as_second_pet'][FREQUENCY_NAMES[frequency]],
+                    quote_second_pet('cat', program, 'up_10', frequency, first_pet_type='dog', first_pet_weight='10_25').gross,
+                )
+
+        # A matching ETag is answered without pricing anything
+        etag = response['ETag']
+        with mock.patch('main.views.quote_matrix') as quote_matrix:
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        quote_matrix.assert_not_called()
+        self.assertNotEqual(self.client.get(url, {**params, 'weight': '21-40'})['ETag'], etag)
+
+        # A new tariff version makes the cached matrix stale
+        version = TariffVersion.objects.create(name='Excel copy', effective_from=date.today())
+        TariffCell.objects.bulk_create(
+            TariffCell(version=version, pet_type=key[0], program=key[1], weight_category=key[2], frequency=key[3],
+                       is_second_pet=key[4], **cell._asdict())
+            for key, cell in BUILTIN_TARIFF.cells.items()
+        )
+        invalidate_tariff_cache()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tariff_version'], version.pk)
+
+        self.assertEqual(self.client.get(url, {'pet_type': 'dog', 'weight': 'heavy'}).status_code, 400)
+
+    def test_affiliate_quotes_stay_cached_when_the_code_is_used(self):
+        from decimal import Decimal
+        from .models import AmbassadorCode
+        from .pricing import BUILTIN_TARIFF, QUOTE_CACHE, quote
+
+        AmbassadorCode.objects.create(code='PARTNER10', name='Partner', discount_percentage=Decimal('10'))
+
+        def partner_quote():
+            code = AmbassadorCode.objects.get(code='PARTNER10')
+            return quote('dog', 'gold', '10_25', ambassador_code=code, tariff=BUILTIN_TARIFF)
+
+        first = partner_quote()
+        AmbassadorCode.objects.get(code='PARTNER10').increment_usage()
+        hits = QUOTE_CACHE.hits
+        self.assertIs(partner_quote(), first)
+        self.assertEqual(QUOTE_CACHE.hits, hits + 1)
+
+        # New terms are a new key
+        AmbassadorCode.objects.filter(code='PARTNER10').update(discount_percentage=Decimal('20'))
+        self.assertAlmostEqual(partner_quote().discount, first.discount * 2, delta=0.01)
+
+
+class BreedIndexTests(TestCase):
+
+    def setUp(self):
+        from .breeds import invalidate_breed_index
+        invalidate_breed_index()
+        self.addCleanup(invalidate_breed_index)
+
+    def test_catalog_classifies_like_the_former_breed_lists(self):
+        from .breeds import breed_names, classify_breed
+
+        # Substring rules and weight labels the views used before the catalog
+        surcharge_5 = ['cane corso', 'dogo argentino', 'rottweiler', 'pit bull']
+        surcharge_20 = ['french bulldog', 'english bulldog', 'chow chow']
+        labels = {'έως 10 κιλά': '10', '11-20 κιλά': '11-20', '21-40 κιλά': '21-40', '>40 κιλά': '>40'}
+
+        dogs, cats = breed_names('dog'), breed_names('cat')
+        self.assertEqual(
+            {name.lower() for name in dogs if classify_breed(name, 'dog').breed.surcharge},
+            set(surcharge_5 + surcharge_20),
+        )
+        mixes = [f'{a} + {b}' for a, b in zip(dogs, dogs[::-1])]
+        for pet_type, breeds in (('dog', dogs + tuple(mixes)), ('cat', cats)):
+            for breed in breeds:
+                for label, weight in labels.items():
+                    text = f'{breed} ({label})'
+                    match = classify_breed(text, pet_type)
+                    with self.subTest(text=text):
+                        self.assertTrue(match.breeds)
+                        self.assertEqual(match.special_breed_5_percent, any(b in text.lower() for b in surcharge_5))
+                        self.assertEqual(match.special_breed_20_percent, any(b in text.lower() for b in surcharge_20))
+                        self.assertEqual(match.weight_category, weight)
+
+        # Without a label: the breed's usual band
+        self.assertEqual(classify_breed('Cane Corso', 'dog').weight_category, '>40')
+        self.assertEqual(classify_breed('Persian', 'cat').weight_category, '10')
+
+    def test_breed_edits_refresh_the_index(self):
+        from .breeds import classify_breed, get_breed_index
+        from .models import Breed
+        from . import breeds
+
+        url = reverse('main:breeds_api')
+        etag = self.client.get(url)['ETag']
+        self.assertFalse(classify_breed('Beagle (11-20 κιλά)', 'dog').special_breed_5_percent)
+
+        # Saved here: this process drops its index at once
+        beagle = Breed.objects.get(pet_type='dog', name='Beagle')
+        beagle.surcharge = '5'
+        beagle.aliases = 'Μπιγκλ'
+        beagle.save()
+        self.assertTrue(classify_breed('Beagle (11-20 κιλά)', 'dog').special_breed_5_percent)
+        self.assertEqual(classify_breed('Μπιγκλ + Pug', 'dog').breed.name, 'Beagle')
+        self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertIn('"surcharge":"5","weight":"11-20"', self.client.get(url).content.decode())
+
+        # Saved by another worker: picked up at the next stamp check
+        index = get_breed_index()
+        Breed.objects.filter(pk=beagle.pk).update(surcharge='20', updated_at=timezone.now())
+        self.assertIs(get_breed_index(), index)
+        with mock.patch.object(breeds, 'BREED_STAMP_TTL', 0):
+            self.assertTrue(classify_breed('Beagle', 'dog').special_breed_20_percent)
+
+            Breed.objects.filter(pk=beagle.pk).update(is_active=False, updated_at=timezone.now())
+            self.assertNotIn('Beagle', breeds.breed_names('dog'))
+
+
+class QuestionnaireParserTests(SimpleTestCase):
+
+    def test_answers_are_typed_from_the_first_source_and_errors_collected(self):
+        from django.http import QueryDict
+
+        post = QueryDict('special_breed_5_percent=false&special_breed_5_percent=true&program=gold'
+                         '&desired_start_date=31/12/2026&payment_frequency=monthly&unrelated=x')
+        session = {'program': 'silver', 'is_sterilized': 'on', 'pet_colors': ['black', 'white']}
+        answers = parse_questionnaire(post, session, QueryDict('consent_marketing=true'))
+
+        values = answers.values
+        self.assertEqual(set(values), {f.name for f in Questionnaire._meta.concrete_fields} - {
+            'id', 'application', 'created_at', 'updated_at'})
+        self.assertTrue(values['special_breed_5_percent'])
+        self.assertEqual(values['program'], 'gold')
+        self.assertTrue(values['is_sterilized'])
+        self.assertTrue(values['consent_marketing'])
+        self.assertFalse(values['is_healthy'])
+        self.assertEqual(values['pet_colors'], 'black')
+        self.assertIsNone(values['desired_start_date'])
+        self.assertEqual(values['payment_frequency'], '')
+        self.assertEqual(set(answers.errors), {'desired_start_date', 'payment_frequency'})
+
+
+class RequestLoggingTests(SimpleTestCase):
+
+    def test_records_of_a_request_carry_its_id_through_the_queue(self):
+        import logging
+        import threading
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .log import QueueListenerHandler, RequestIdFilter
+        from .middleware import RequestIdMiddleware
+
+        class Records(logging.Handler):
+            def __init__(self):
+                super().__init__()
+                self.records = []
+
+            def emit(self, record):
+                self.records.append((record.request_id, record.getMessage(), threading.current_thread()))
+
+        target = Records()
+        target.set_name('test_records')
+        handler = QueueListenerHandler(targets=['test_records'])
+        handler.addFilter(RequestIdFilter())
+        logger = logging.getLogger('main.tests.request_logging')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        def view(request):
+            logger.warning("application %s", {'id': 7})
+            return HttpResponse()
+
+        middleware = RequestIdMiddleware(view)
+        response = middleware(RequestFactory().get('/', HTTP_X_REQUEST_ID='router-id-1'))
+        generated = middleware(RequestFactory().get('/', HTTP_X_REQUEST_ID='bad id\n')).headers['X-Request-ID']
+        logger.warning("outside")
+        handler.close()
+
+        self.assertEqual(response.headers['X-Request-ID'], 'router-id-1')
+        self.assertRegex(generated, r'^[0-9a-f]{32}$')
+        self.assertEqual(
+            [(request_id, message) for request_id, message, _ in target.records],
+            [('router-id-1', "application {'id': 7}"), (generated, "application {'id': 7}"), ('-', 'outside')],
+        )
+        self.assertNotIn(threading.current_thread(), [thread for *_, thread in target.records])
+
+
+class ContractPdfTests(SimpleTestCase):
+
+    def test_flatten_bakes_field_values_into_smaller_pdf(self):
+        import pymupdf
+
+        pdf_bytes = render_contract({'text_3ksjz': 'Γιώργος Παπαδόπουλος'})
+        result = optimize_pdf(pdf_bytes, 'flatten')
+
+        self.assertLess(result.size, result.original_size)
+        doc = pymupdf.open(stream=result.data, filetype='pdf')
+        self.assertFalse(any(page.first_widget for page in doc))
+        self.assertIn('Γιώργος Παπαδόπουλος', doc[0].get_text())
+
+    def test_contract_qr_images_carry_the_qrcode_modules(self):
+        import pymupdf
+
+        for data in ('http://localhost:8000/terms-and-conditions/', 'https://hoolie.gr/contract/verify/' + 'x' * 150):
+            matrix = qr_matrix(data)
+            modules = len(matrix)
+            samples = pdf_qr_image(data, 0, 0, 60).split('ID\n')[1].split('>')[0]
+            row_digits = (modules + 7) // 8 * 2
+            rows = [
+                [bit == '0' for bit in format(int(samples[i:i + row_digits], 16), f'0{row_digits * 4}b')[:modules]]
+                for i in range(0, len(samples), row_digits)
+            ]
+            self.assertEqual(rows, matrix)
+
+        doc = pymupdf.open(stream=render_contract({}, qr_codes={'terms': 'a', 'verification': 'b'}), filetype='pdf')
+        self.assertEqual(sum(info['bpc'] == 1 and info['width'] == 29 for info in doc[0].get_image_info()), 2)
@@ -0,0 +1,57 @@
+"""
+Stage timing of contract generation.
+
+A StageTimer measures the named stages of one operation (loading the
+application, building the field values, rendering, uploading, ...) and
+reports them as one record on the "main.timing" logger when the operation
+ends: an INFO line for the logs, with the durations in the record's
+``stages`` attribute for handlers that aggregate them (see the
+bench_contracts command).
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("main.timing")
+
+
+class StageTimer:
+    """
+    Seconds spent per stage of one operation. Stages may run in several
+    threads (e.g. the per-pet uploads); their times are added up, so a
+    stage can take longer than the operation's wall-clock ``total``.
+    """
+
+    def __init__(self, operation, **context):
+        self.operation = operation
+        self.context = context
+        self.stages = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def report(self, **context):
+        """Log the stage durations (and the total) of the finished operation; returns them."""
+        self.context.update(context)
+        stages = dict(self.stages, total=time.perf_counter() - self.started)
+        if logger.isEnabledFor(logging.INFO):
+            details = " ".join(f"{key}={value}" for key, value in self.context.items())
+            durations = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in stages.items())
+            logger.info(
+                "[TIMING] %s %s %s", self.operation, details, durations,
+                extra={"operation": self.operation, "stages": stages, "context": dict(self.context)},
+            )
+        return stages
@@ -23,6 +23,9 @@ urlpatterns = [
     path('handle-application/', views.handle_application_submission, name='handle_application_submission'),
     
     # API endpoints
+    path('api/quote/', views.quote_api, name='quote_api'),
+    path('api/breeds/', views.breeds_api, name='breeds_api'),
+    path('api/applications/<int:application_id>/jobs/', views.application_jobs_api, name='application_jobs_api'),
     path('api/validate-affiliate-code/', views.validate_affiliate_code, name='validate_affiliate_code'),
     path('api/upload-pet-document/', views.upload_pet_document, name='upload_pet_document'),
     path('api/upload-pet-photo/', views.upload_pet_photo, name='upload_pet_photo'),
@@ -1,4 +1,3 @@
-import os
 from datetime import datetime
 from decimal import Decimal
 
@@ -6,286 +5,436 @@ from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
-from .fillpdf_utils import get_pricing_values, normalize_weight
+from . import pricing
+from .pricing import quote_application_household
+
+
+def pet_premium_rows(application_id, household):
+    """Unsaved PetPremium rows of a HouseholdQuote: one per pet and frequency."""
+    from .models import PetPremium
+
+    def money(value):
+        return Decimal(str(value))
+
+    rows = []
+    for pet_number, quotes in enumerate(household.pets, start=1):
+        for frequency, q in quotes.items():
+            components = q.gross_components
+            rows.append(PetPremium(
+                application_id=application_id,
+                pet_number=pet_number,
+                frequency=pricing.FREQUENCY_NAMES[frequency],
+                net=money(components.net),
+                fee=money(components.fee),
+                ipt=money(components.ipt),
+                base_premium=money(q.base_gross),
+                surcharge_5_percent=money(q.surcharge_5_percent),
+                surcharge_20_percent=money(q.surcharge_20_percent),
+                poisoning=money(q.poisoning),
+                blood_checkup=money(q.blood_checkup),
+                discount=money(q.discount),
+                gross=money(components.gross),
+            ))
+    return rows
+
+
+# Application fields written by recalculate_application_premium()
+PREMIUM_FIELDS = ("annual_premium", "six_month_premium", "three_month_premium", "pricing_fingerprint")
+
+PET_PREMIUM_VALUE_FIELDS = (
+    "pet_number", "frequency", "net", "fee", "ipt", "base_premium",
+    "surcharge_5_percent", "surcharge_20_percent", "poisoning",
+    "blood_checkup", "discount", "gross",
+)
+
+
+def premium_fingerprint(application, ambassador_code=None, pets=None):
+    """
+    Hash of exactly the inputs quote_application_household() prices from:
+    the pets (program, type, weight, surcharge / add-on flags), the tariff
+    version as loaded and the terms of ``ambassador_code``, the
+    application's application_ambassador_code().
 
+    ``pets`` defaults to application_pets(); a submission passes the
+    HouseholdPets it priced before the questionnaire is saved.
+    """
+    import hashlib
+
+    tariff = pricing.get_application_tariff(application)
+    if pets is None:
+        pets = pricing.application_pets(application)
+    inputs = (
+        tariff.version_id,
+        tariff.stamp,
+        tuple(
+            (pet.pet_type, pet.program, pet.weight_category,
+             sorted((key, bool(value)) for key, value in (pet.options or {}).items()))
+            for pet in pets
+        ),
+        pricing.affiliate_terms(ambassador_code),
+    )
+    return hashlib.sha1(repr(inputs).encode("utf-8")).hexdigest()
+
+
+def store_household_premiums(application, household, fingerprint=None):
+    """
+    Persist a HouseholdQuote: the per-pet PetPremium rows, and the household
+    totals as the application's premiums.
 
-def recalculate_application_premium(application):
+    Nothing is rewritten when the stored rows and totals already hold these
+    values; only a changed ``fingerprint`` is recorded then. Returns True
+    when premiums were written.
+    """
+    from django.db import transaction
+    from .models import PetPremium
+
+    totals = household.totals
+    premiums = {
+        "annual_premium": Decimal(str(totals["annual"])),
+        "six_month_premium": Decimal(str(totals["6m"])),
+        "three_month_premium": Decimal(str(totals["3m"])),
+    }
+    rows = pet_premium_rows(application.pk, household)
+    update_fields = ["pricing_fingerprint"] if fingerprint is not None and fingerprint != application.pricing_fingerprint else []
+    if fingerprint is not None:
+        application.pricing_fingerprint = fingerprint
+
+    unchanged = all(getattr(application, field) == value for field, value in premiums.items()) and (
+        set(PetPremium.objects.filter(application=application).values_list(*PET_PREMIUM_VALUE_FIELDS))
+        == {tuple(getattr(row, field) for field in PET_PREMIUM_VALUE_FIELDS) for row in rows}
+    )
+    if unchanged:
+        if update_fields:
+            application.save(update_fields=update_fields)
+        return False
+
+    for field, value in premiums.items():
+        setattr(application, field, value)
+    with transaction.atomic():
+        PetPremium.objects.filter(application=application).delete()
+        PetPremium.objects.bulk_create(rows)
+        application.save(update_fields=[*premiums, *update_fields])
+    return True
+
+
+def recalculate_application_premium(application, force=False, raise_errors=False):
+    """
+    Reprice the application and store its premiums. Skipped when the pricing
+    inputs are those of the stored premiums (see premium_fingerprint) unless
+    ``force`` is set.
+
+    Errors are logged and swallowed, unless ``raise_errors`` is set: the
+    recalculate_premium job lets them fail the attempt, so it is retried.
+    """
     import logging
     logger = logging.getLogger(__name__)
 
     try:
-        # -------------------------------
-        # LOAD QUESTIONNAIRE
-        # -------------------------------
-        questionnaire = getattr(application, "questionnaire", None)
-        if not questionnaire:
-            logger.info(
-                f"[INFO] No questionnaire yet for application {application.id}, "
-                f"continuing premium calculation"
-            )
-
-        # -------------------------------
-        # WEIGHT NORMALIZATION (FINAL)
-        # -------------------------------
-        raw_weight = str(application.pet_weight_category)
-
-        logger.info(
-            f"[WEIGHT RAW] App={application.id} pet_weight_category={raw_weight}"
-        )
-
-        mapped_weight = normalize_weight(raw_weight)
-
-        logger.info(
-            f"[WEIGHT MAPPED] App={application.id} mapped_weight={mapped_weight}"
-        )
-
-        if not mapped_weight:
-            logger.error(f"Invalid weight category: {raw_weight}")
+        ambassador_code = pricing.application_ambassador_code(application)
+        fingerprint = premium_fingerprint(application, ambassador_code)
+        if not force and fingerprint == application.pricing_fingerprint:
+            logger.debug("[PREMIUMS] App=%s pricing inputs unchanged, skipping", application.id)
             return
 
-        program = application.program
-
-
-        logger.info(
-            f"[PRICING] App={application.id} "
-            f"pet_type={application.pet_type}, "
-            f"program={program}, "
-            f"mapped_weight={mapped_weight}"
-        )
-
         # -------------------------------
         # EXCEL PRICING (SINGLE SOURCE)
         # -------------------------------
+        # One engine call prices every pet and frequency: the first pet with
+        # breed surcharges, add-ons from the questionnaire and the affiliate
+        # discount it was sold with, a second pet with the household discount.
         try:
-            _, _, _, annual_price = get_pricing_values(
-                application,
-                application.pet_type,
-                mapped_weight,
-                program,
-                "annual",
-            )
-
-            _, _, _, six_month_price = get_pricing_values(
-                application,
-                application.pet_type,
-                mapped_weight,
-                program,
-                "6m",
-            )
-
-            _, _, _, three_month_price = get_pricing_values(
-                application,
-                application.pet_type,
-                mapped_weight,
-                program,
-                "3m",
-            )
-
-
+            household = quote_application_household(application, ambassador_code)
+        except ValueError as e:
+            logger.error("Excel pricing missing for application %s: %s", application.id, e)
+            if raise_errors:
+                raise
+            return
 
-            logger.info(
-                f"[EXCEL PRICES] App={application.id} | "
-                f"Annual={annual_price}€, "
-                f"6M={six_month_price}€, "
-                f"3M={three_month_price}€"
+        for pet_number, quotes in enumerate(household.pets, start=1):
+            logger.debug(
+                "[EXCEL PRICES] App=%s pet=%s | Annual=%s€, 6M=%s€, 3M=%s€",
+                application.id, pet_number,
+                quotes['annual'].base_gross, quotes['6m'].base_gross, quotes['3m'].base_gross,
             )
 
-        except Exception as e:
-            logger.error(f"Excel pricing missing: {e}")
-            return
-
-        # -------------------------------
-        # APPLY SURCHARGES AND ADD-ONS
-        # -------------------------------
-        # Start with base prices
-        annual_final = float(annual_price)
-        six_month_final = float(six_month_price)
-        three_month_final = float(three_month_price)
-        
-        # Apply breed surcharges (cumulative - 5% first, then 20% on result)
-        if questionnaire and questionnaire.special_breed_5_percent:
-            annual_final = annual_final * 1.05
-            six_month_final = six_month_final * 1.05
-            three_month_final = three_month_final * 1.05
-            logger.info(f"Applied 5% breed surcharge")
-        
-        if questionnaire and questionnaire.special_breed_20_percent:
-            annual_final = annual_final * 1.20
-            six_month_final = six_month_final * 1.20
-            three_month_final = three_month_final * 1.20
-            logger.info(f"Applied 20% breed surcharge")
-        
-        # Add poisoning coverage (annual price, then scale for frequencies)
-        if questionnaire and questionnaire.additional_poisoning_coverage:
-            poisoning_annual = get_poisoning_price(program, "annual")
-            annual_final += poisoning_annual
-            six_month_final += get_poisoning_price(program, "six_month")
-            three_month_final += get_poisoning_price(program, "three_month")
-            logger.info(f"Added poisoning coverage: {poisoning_annual}€ annual")
-        
-        # Add blood checkup (28€ annual, scaled with add-on factors: 50% for 6-month, 25% for 3-month)
-        if questionnaire and questionnaire.additional_blood_checkup:
-            annual_final += 28.00
-            six_month_final += round(28.00 * 0.5, 2)  # 50% of annual (add-on scaling)
-            three_month_final += round(28.00 * 0.25, 2)  # 25% of annual (add-on scaling)
-            logger.info(f"Added blood checkup: 28€ annual")
-        
-        # Round to 2 decimal places
-        annual_final = round(annual_final, 2)
-        six_month_final = round(six_month_final, 2)
-        three_month_final = round(three_month_final, 2)
-        
         # -------------------------------
         # SAVE TO DB
         # -------------------------------
-        application.annual_premium = Decimal(str(annual_final))
-        application.six_month_premium = Decimal(str(six_month_final))
-        application.three_month_premium = Decimal(str(three_month_final))
-
-        application.save(
-            update_fields=[
-                "annual_premium",
-                "six_month_premium",
-                "three_month_premium",
-            ]
-        )
+        if not store_household_premiums(application, household, fingerprint):
+            logger.info("[DB UNCHANGED] App=%s premiums already up to date", application.id)
+            return
 
         logger.info(
-            f"[DB SAVED] App={application.id} "
-            f"annual={application.annual_premium} (base: {annual_price} + surcharges/add-ons), "
-            f"six_month={application.six_month_premium} (base: {six_month_price} + surcharges/add-ons), "
-            f"three_month={application.three_month_premium} (base: {three_month_price} + surcharges/add-ons)"
+            "[DB SAVED] App=%s pets=%s annual=%s, six_month=%s, three_month=%s",
+            application.id, len(household.pets),
+            application.annual_premium, application.six_month_premium, application.three_month_premium,
         )
 
-        # -------------------------------
-        # BREAKDOWN (USED BY PDF)
-        # -------------------------------
-        return
-
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(
-            f"Premium calculation error for application {application.id}: {e}"
+            "Premium calculation error for application %s: %s", application.id, e
         )
 
 
+def schedule_premium_recalculation(application):
+    """
+    Reprice the application in the background; the job is written in the
+    current transaction (see jobs.enqueue). Saves inside one transaction –
+    an admin change form with its inlines, a submission – share a single
+    recalculation job. Nothing is queued while the stored premiums were
+    priced from the current inputs (see premium_fingerprint).
+    """
+    from .jobs import enqueue
+
+    if application.pricing_fingerprint and application.pricing_fingerprint == premium_fingerprint(
+        application, pricing.application_ambassador_code(application)
+    ):
+        return
+    enqueue("recalculate_premium", application)
+
+
 def get_poisoning_price(program, payment_frequency):
     """
     Get poisoning coverage price based on program and payment frequency.
     Uses add-on scaling factors: 50% for 6-month, 25% for 3-month.
     """
-    prices = {
-        'silver': 18,
-        'gold': 20,
-        'platinum': 25,
-        'dynasty': 25,
-    }
+    return pricing.get_poisoning_price(program, payment_frequency)
 
-    annual_price = prices.get(program, 0)
 
-    if payment_frequency == "six_month":
-        # Use 50% multiplier for add-ons
-        return round(annual_price * 0.5, 2)
-    elif payment_frequency == "three_month":
-        # Use 25% multiplier for add-ons
-        return round(annual_price * 0.25, 2)
+def contract_pet_numbers(application):
+    """Pets with their own contract PDF: [1, 2] for two-pet applications."""
+    if application.has_second_pet and application.second_pet_name:
+        return [1, 2]
+    return [1]
 
-    return annual_price  # annual
 
+def contract_filename(application, pet_number=None, digest=None):
+    """
+    Storage file name of a contract PDF; ``pet_number`` for two-pet
+    applications. Named after the content ``digest`` when given, so identical
+    contracts map to the same file.
+    """
+    pet = f"pet{pet_number}_" if pet_number else ""
+    version = digest[:16] if digest else datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"contract_{application.contract_number}_{pet}{version}.pdf"
+
+
+def contract_digest(contents):
+    """Digest of all contract PDFs of an application (see fillpdf_utils.contract_contents)."""
+    import hashlib
+
+    if len(contents) == 1:
+        return contents[0].digest
+    return hashlib.sha256(":".join(content.digest for content in contents).encode("ascii")).hexdigest()
 
-def generate_contract_pdf(application):
-    # ALWAYS recalc before PDF
-    recalculate_application_premium(application)
-    application.refresh_from_db()
 
+def contract_storage_keys(application, contents):
+    """Content-addressed storage keys of an application's contract PDFs."""
+    return [
+        f"contracts/{contract_filename(application, content.pet_number if len(contents) > 1 else None, content.digest)}"
+        for content in contents
+    ]
+
+
+def store_contract_pdf(key, render, timer=None):
     """
-    Generate contract PDF with full price breakdown included.
+    Upload the PDF returned by ``render()`` under ``key``. Keys are content
+    addressed: when the object exists it already holds this PDF, and nothing
+    is rendered or uploaded. Returns (path, size in bytes, uploaded).
+    The storage calls are timed as the "storage_check" and "upload" stages
+    of ``timer``.
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"Generating contract PDF for {application.id}")
+    from .timing import StageTimer
 
-    from .models import InsuranceApplication
-    application = InsuranceApplication.objects.select_related(
-        "questionnaire"
-    ).get(pk=application.pk)
+    timer = timer or StageTimer("store_contract_pdf")
+    with timer.stage("storage_check"):
+        if default_storage.exists(key):
+            return key, default_storage.size(key), False
+    pdf_bytes = render()
+    with timer.stage("upload"):
+        path = default_storage.save(key, ContentFile(pdf_bytes, name=key.rsplit("/", 1)[-1]))
+    return path, len(pdf_bytes), True
 
-    # Ensure premiums exist
-    if application.annual_premium is None:
-        recalculate_application_premium(application)
-        application.refresh_from_db()
 
+def current_contract_documents(application_ids):
+    """
+    ContractDocument rows of the current (highest) contract version of each
+    application, in one indexed query.
+    """
+    from django.db.models import OuterRef, Subquery
+    from .models import ContractDocument
 
+    latest = (
+        ContractDocument.objects.filter(application_id=OuterRef("application_id"))
+        .order_by("-version").values("version")[:1]
+    )
+    return (
+        ContractDocument.objects.filter(application_id__in=application_ids, version=Subquery(latest))
+        .order_by("application_id", "pet_number")
+    )
 
-    import tempfile
-    temp_dir = tempfile.mkdtemp()
 
-    try:
-        from .fillpdf_utils import generate_contract_with_fillpdf
-
-        # MULTI PET
-        if application.has_second_pet and application.second_pet_name:
-            pdf_paths = []
-
-            for pet_number in [1, 2]:
-                filename = (
-                    f"contract_{application.contract_number}_pet{pet_number}_"
-                    f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                )
-                temp_path = os.path.join(temp_dir, filename)
-
-                generated = generate_contract_with_fillpdf(
-                    application,
-                    temp_path,
-                    pet_number=pet_number,
-                )
-
-                logger.info(
-                    f"[PDF INPUT] App={application.id} "
-                    f"premium_used={application.get_premium_for_frequency()} "
-                    f"frequency={application.questionnaire.payment_frequency}"
-                )
-
-                if os.path.exists(generated):
-                    s3_key = f"contracts/{filename}"
-                    with open(generated, "rb") as f:
-                        saved = default_storage.save(
-                            s3_key, ContentFile(f.read())
-                        )
-                        pdf_paths.append(saved)
-
-                        logger.info(
-                            f"[PDF GENERATED] App={application.id} path={generated}"
-                        )
-
-            return pdf_paths
-
-        # SINGLE PET
-        filename = (
-            f"contract_{application.contract_number}_"
-            f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        )
-        temp_path = os.path.join(temp_dir, filename)
+def record_contract_documents(application_id, documents):
+    """
+    Record stored PDFs ``documents`` ([(pet number, storage key, size,
+    digest)]) as the next contract version of an application, unless they
+    are its current version already. Returns the current documents.
+    """
+    from django.db import transaction
+    from .models import ContractDocument, InsuranceApplication
+
+    with transaction.atomic():
+        # Row lock: concurrent generations of one application number versions in turn
+        list(InsuranceApplication.objects.select_for_update().filter(pk=application_id).values_list("pk"))
+        current = list(current_contract_documents([application_id]))
+        if sorted(document.storage_key for document in current) == sorted(key for _, key, _, _ in documents):
+            return current
+        version = (current[0].version if current else 0) + 1
+        return ContractDocument.objects.bulk_create([
+            ContractDocument(
+                application_id=application_id, pet_number=pet_number, version=version,
+                storage_key=key, size=size, digest=digest,
+            )
+            for pet_number, key, size, digest in documents
+        ])
 
-        generated = generate_contract_with_fillpdf(
-            application,
-            temp_path,
-            pet_number=1,
-        )
 
-        if os.path.exists(generated):
-            s3_key = f"contracts/{filename}"
-            with open(generated, "rb") as f:
-                saved_path = default_storage.save(
-                    s3_key, ContentFile(f.read())
-                )
-                return [saved_path]
+def stream_contract_zip(documents):
+    """
+    ZIP archive of ContractDocument PDFs as a generator of byte chunks, for a
+    StreamingHttpResponse: each PDF is copied from storage in blocks, so
+    neither the PDFs nor the archive are held in memory.
+    """
+    import io
+    import zipfile
+
+    class Chunks(io.RawIOBase):
+        # Write-only sink: zipfile writes data descriptors to unseekable output
+        def __init__(self):
+            self.chunks = []
+
+        def writable(self):
+            return True
+
+        def write(self, data):
+            self.chunks.append(bytes(data))
+            return len(data)
+
+        def take(self):
+            data = b"".join(self.chunks)
+            self.chunks.clear()
+            return data
+
+    sink = Chunks()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for document in documents:
+            with default_storage.open(document.storage_key, "rb") as pdf, archive.open(document.filename, "w") as entry:
+                for block in iter(lambda: pdf.read(64 * 1024), b""):
+                    entry.write(block)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+def generate_contract_pdf(application, merged=None, force=False):
+    """
+    Generate contract PDF with full price breakdown included.
+
+    Two-pet applications get one PDF per pet, uploaded concurrently, or a
+    single PDF with both contracts when ``merged`` (default: the
+    CONTRACT_MERGE_PETS setting).
 
-        return []
+    Nothing is rendered when the content digest of the field values equals
+    the application's contract_digest and the PDFs are the current
+    ContractDocument version (unless ``force``); the stored paths are
+    returned as they are. New content is recorded as the next version.
 
-    finally:
-        import shutil
-        try:
-            shutil.rmtree(temp_dir)
-        except Exception:
-            pass
+    Every step is timed (main.timing) and reported as one [TIMING] line.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.info("Generating contract PDF for %s", application.id)
+
+    from .models import InsuranceApplication
+    from .timing import StageTimer
+
+    timer = StageTimer("generate_contract_pdf", app=application.id)
+    caller_instance = application
+    with timer.stage("load"):
+        application = InsuranceApplication.objects.select_related(
+            "questionnaire"
+        ).get(pk=application.pk)
+
+    # Premiums must match the current inputs; a no-op when they already do.
+    # Callers save their own instance afterwards, so keep it current too.
+    with timer.stage("premium"):
+        recalculate_application_premium(application, force=application.annual_premium is None)
+    for field in PREMIUM_FIELDS:
+        setattr(caller_instance, field, getattr(application, field))
+
+    from .contract_template import render_contract
+    from .fillpdf_utils import contract_contents
+    from .pdf_optimize import optimize_contract_pdf
+
+    if merged is None:
+        merged = getattr(settings, "CONTRACT_MERGE_PETS", False)
+    with timer.stage("fields"):
+        contents = contract_contents(application, merged=merged)
+        keys = contract_storage_keys(application, contents)
+        digest = contract_digest(contents)
+    caller_instance.contract_digest = digest
+
+    with timer.stage("manifest"):
+        stored = {document.storage_key: document for document in current_contract_documents([application.pk])}
+    if (
+        not force and application.contract_generated
+        and application.contract_digest == digest and application.contract_pdf_path == keys[0]
+        and sorted(stored) == sorted(keys)
+    ):
+        logger.info("[PDF UNCHANGED] App=%s digest=%s, nothing to regenerate", application.id, digest[:16])
+        timer.report(pdfs=len(keys), outcome="unchanged")
+        return keys
+
+    logger.info(
+        "[PDF INPUT] App=%s premium_used=%s frequency=%s",
+        application.id, application.get_premium_for_frequency(), application.get_payment_frequency(),
+    )
+
+    # Rendered in memory and handed to storage as is: no temp files, one
+    # buffer per PDF (S3 uploads it from that buffer, multipart when large)
+    def upload(item):
+        # Storage and rendering only: upload threads do not touch the database
+        content, key = item
+        if key in stored:
+            # In the manifest: stored already, with its size
+            return content.pet_number, key, stored[key].size, content.digest
+
+        def render():
+            with timer.stage("render"):
+                pdf_bytes = render_contract(content.data, content.copies, content.qr_codes)
+            with timer.stage("optimize"):
+                return optimize_contract_pdf(pdf_bytes, "archive")
+
+        saved, size, uploaded = store_contract_pdf(key, render, timer)
+        if uploaded:
+            logger.info("[PDF GENERATED] App=%s pet=%s path=%s (%s bytes)", application.id, content.pet_number or 'all', saved, size)
+        else:
+            logger.info("[PDF STORED] App=%s pet=%s path=%s already stored", application.id, content.pet_number or 'all', saved)
+        return content.pet_number, saved, size, content.digest
+
+    items = list(zip(contents, keys))
+    if len(items) == 1:
+        documents = [upload(items[0])]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(items)) as pool:
+            documents = list(pool.map(upload, items))
+
+    with timer.stage("record"):
+        record_contract_documents(application.pk, documents)
+        InsuranceApplication.objects.filter(pk=application.pk).update(contract_digest=digest)
+    timer.report(pdfs=len(documents), outcome="generated")
+    return [path for _, path, _, _ in documents]
 
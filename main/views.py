@@ -1,12 +1,23 @@
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.http import JsonResponse, FileResponse, Http404, HttpResponse
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
 from datetime import datetime
 from datetime import date
 from dateutil.relativedelta import relativedelta  
 
+from .breeds import breed_names, classify_breed
+from .questionnaire import (
+    SESSION_KEY as QUESTIONNAIRE_SESSION_KEY, flatten_answers, parse_questionnaire, questionnaire_sources, raw_answer,
+)
+from .pricing import (
+    HouseholdPet, get_active_tariff, quote_frequencies, quote_household, quote_matrix, quote_second_pet,
+)
+
 AGE_ERROR_MESSAGE = """
 Σας ευχαριστούμε πολύ για το ενδιαφέρον σας να ασφαλίσετε το κατοικίδιό σας μέσω της Hoolie.
 Δυστυχώς, βάσει της ηλικίας του, δεν μπορούμε να προχωρήσουμε στην έκδοση νέου ασφαλιστηρίου,
@@ -79,55 +90,10 @@ def pet_breed(request):
         return redirect_to_birthdate(request)
 
 
-    # Common dog breeds for dropdown (20 breeds)
-    dog_breeds = [
-        "Airedale Terrier", "Alaskan Malamute", "Akita", "Australian Terrier",
-        "Australian Cattle Dog", "American Water Spaniel",
-        "American Staffordshire Terrier", "American English Coonhound",
-        "Afghan Hound", "Affenpinscher", "American Foxhound", "American Eskimo",
-        "Anatolian Shepherd", "Basset Hound", "Basset Griffon Vendeen", "Beagle",
-        "Berger Picard", "Belgian Tervuren", "Belgian Sheepdog", "Belgian Malinois",
-        "Bedlington Terrier", "Bearded Collie", "Bergamasco", "Beauceron",
-        "Black Russian Terrier", "Black and Tan Coonhound", "Bluetick Coonhound",
-        "Border Collie", "Borzoi", "Boxer", "Boerboel", "Bernese Mountain",
-        "Bichon Frise", "Border Terrier", "Boston Terrier", "Brittany",
-        "Brussels Griffon", "Bulldog", "Canaan Dog", "Cane Corso",
-        "Caniche Poodle", "Cavalier King Charles Spaniel", "Chihuahua",
-        "Chow Chow", "Clumber Spaniel", "Cockapoo", "Cocker Spaniel", "Collie",
-        "Dalmatian", "Doberman", "Dogue de Bordeaux", "Dachshund",
-        "English Bull Terrier", "English Setter", "Fox Terrier Wire Coat",
-        "French Bulldog", "Flat Coated Retriever", "German Shorthaired Pointer",
-        "German Shepherd", "Golden Retriever", "Great Dane", "Hungarian Vizsla",
-        "Irish Setter", "Irish Terrier", "Italian Greyhound",
-        "Jack Russell Terrier", "Labradoodle", "Labrador Retriever",
-        "Lhasa Apso", "Lurcher", "Maltese", "Miniature Schnauzer",
-        "Miniature Pinscher", "Newfoundland Breed",
-        "Nova Scotia Duck Tolling Retriever", "Old English Sheepdog", "Papillion",
-        "Patterdale", "Pomeranian", "Poodle", "Pointer", "Portuguese Water Dog",
-        "Pug", "Rhodesian Ridgeback", "Rottweiler", "Redbone Coonhound",
-        "Samoyed", "Shih Tzu", "Staffordshire Bull Terrier", "Shetland Sheepdog",
-        "Shiba Inu", "Silky Terrier", "Standard Schnauzer", "Swedish Vallhund",
-        "Siberian Husky", "Soft Coated Wheaten Terrier", "Springer Spaniel",
-        "Spanish Water Dog", "St Bernard", "Sussex Spaniel",
-        "Transylvanian Hound", "Tibetan Terrier", "Toy Fox Terrier", "Whippet",
-        "Welsh Terrier", "Welsh Springer Spaniel", "Weimaraner",
-        "Wirehaired Pointing Griffon", "West Highland Terrier", "Yorkshire Terrier",
-        "Xoloitzcuintli", "Greek Shepherd", "Kokoni",
-
-        # ADD DOGS THAT CARRY SURCHARGES (important)
-        "Cane Corso",           # 5%
-        "Dogo Argentino",       # 5%
-        "Rottweiler",           # 5%
-        "Pit Bull",             # 5%
-        "French Bulldog",       # 20%
-        "English Bulldog",      # 20%
-        "Chow Chow"             # 20%
-    ]
-
     context = {
         'pet_type': pet_type,
         'gender': gender,
-        'breeds': dog_breeds
+        'breeds': breed_names('dog')
     }
     return render(request, 'main/pet_breed.html', context)
 
@@ -146,22 +112,10 @@ def cat_breed(request):
         return redirect_to_birthdate(request)
 
 
-    # Common cat breeds for dropdown (20 breeds)
-    cat_breeds = [
-        "Abyssinian", "Aegean Cat", "American Bobtail", "American Curl",
-        "American Shorthair", "Bengal", "Birman", "Bombay", "British Shorthair",
-        "Chartreux", "Devon Rex", "Domestic Shorthair", "European Burmese",
-        "Exotic Shorthair Cat", "Himalayan", "Lykos Cat", "Maine Coon",
-        "Munchkin", "Nebelung", "Norwegian Forest Cat", "Oriental Shorthair",
-        "Persian", "Ragdoll", "Russian Blue", "Savanah Cat", "Scottish Fold",
-        "Scottish Straight", "Siamese", "Selkirk Rex", "Somali Cat", "Siberian",
-        "Snowshoe", "Sphynx", "Tonkinese", "Turkish Angora", "Turkish Van"
-    ]
-
     context = {
         'pet_type': pet_type,
         'gender': gender,
-        'breeds': cat_breeds
+        'breeds': breed_names('cat')
     }
     return render(request, 'main/cat_breed.html', context)
 
@@ -232,28 +186,19 @@ def health_status(request):
         logger = logging.getLogger(__name__)
         
         try:
-            # Get all POST data
-            questionnaire_data = {}
-            for key in request.POST.keys():
-                values = request.POST.getlist(key)
-                if len(values) == 1:
-                    questionnaire_data[key] = values[0]
-                else:
-                    questionnaire_data[key] = values
-            
-            # Store in session
-            request.session['questionnaire_data'] = questionnaire_data
+            # One value per field, parsed with the submission (main.questionnaire)
+            questionnaire_data = flatten_answers(request.POST)
+            request.session[QUESTIONNAIRE_SESSION_KEY] = questionnaire_data
             request.session['questionnaire_submitted'] = True
-            request.session.modified = True
             
-            logger.info(f"Questionnaire data stored in session: {list(questionnaire_data.keys())}")
+            logger.info("Questionnaire data stored in session: %s field(s)", len(questionnaire_data))
             
             return JsonResponse({
                 'success': True,
                 'message': 'Questionnaire submitted successfully'
             })
         except Exception as e:
-            logger.error(f"Error storing questionnaire data: {e}")
+            logger.error("Error storing questionnaire data: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return JsonResponse({
@@ -426,142 +371,24 @@ def user_data(request):
     if is_above_age_limit(birthdate):
         return redirect_to_birthdate(request)
     
-    # Extract weight from breed string (e.g., "Λαμπραντόρ (έως 10 κιλά)")
-    weight_category = None
-    if breed:
-        if 'έως 10 κιλά' in breed:
-            weight_category = '10'
-        elif '11-20 κιλά' in breed:
-            weight_category = '11-20'
-        elif '21-40 κιλά' in breed:
-            weight_category = '21-40'
-        elif '>40 κιλά' in breed:
-            weight_category = '>40'
-    
-    # Extract weight for second pet
-    second_pet_weight_category = None
-    if second_pet_breed:
-        if 'έως 10 κιλά' in second_pet_breed:
-            second_pet_weight_category = '10'
-        elif '11-20 κιλά' in second_pet_breed:
-            second_pet_weight_category = '11-20'
-        elif '21-40 κιλά' in second_pet_breed:
-            second_pet_weight_category = '21-40'
-        elif '>40 κιλά' in second_pet_breed:
-            second_pet_weight_category = '>40'
+    # Weight band and breed surcharges from the breed catalog
+    # (breed string e.g. "Λαμπραντόρ (έως 10 κιλά)")
+    breed_match = classify_breed(breed, pet_type)
+    weight_category = breed_match.weight_category
+    second_pet_weight_category = classify_breed(second_pet_breed, second_pet_type).weight_category if second_pet_breed else None
         
-    # Pricing tables (MUST match frontend JavaScript exactly)
-    DOG_PRICING = {
-        'silver': {
-            '10': {'annual': 166.75, 'six_month': 87.54, 'three_month': 45.86},
-            '11-20': {'annual': 207.20, 'six_month': 108.78, 'three_month': 56.98},
-            '21-40': {'annual': 234.14, 'six_month': 122.92, 'three_month': 64.39},
-            '>40': {'annual': 254.36, 'six_month': 133.54, 'three_month': 69.95}
-        },
-        'gold': {
-            '10': {'annual': 234.14, 'six_month': 122.92, 'three_month': 64.39},
-            '11-20': {'annual': 261.09, 'six_month': 137.07, 'three_month': 71.80},
-            '21-40': {'annual': 288.05, 'six_month': 151.23, 'three_month': 79.21},
-            '>40': {'annual': 308.26, 'six_month': 161.84, 'three_month': 84.77}
-        },
-        'platinum': {
-            '10': {'annual': 368.92, 'six_month': 193.69, 'three_month': 101.45},
-            '11-20': {'annual': 389.15, 'six_month': 204.30, 'three_month': 107.02},
-            '21-40': {'annual': 409.36, 'six_month': 214.91, 'three_month': 112.57},
-            '>40': {'annual': 436.32, 'six_month': 229.07, 'three_month': 119.99}
-        }
-    }
-    
-    CAT_PRICING = {
-        'silver': {
-            '10': {'annual': 113.81, 'six_month': 59.75, 'three_month': 31.30},
-            '11-20': {'annual': 141.02, 'six_month': 74.04, 'three_month': 38.78}
-        },
-        'gold': {
-            '10': {'annual': 168.22, 'six_month': 88.31, 'three_month': 46.26},
-            '11-20': {'annual': 188.61, 'six_month': 99.02, 'three_month': 51.87}
-        },
-        'platinum': {
-            '10': {'annual': 277.02, 'six_month': 145.44, 'three_month': 76.18},
-            '11-20': {'annual': 311.02, 'six_month': 163.29, 'three_month': 85.53}
-        }
-    }
-    
     # Get program from URL or default to 'silver'
     program = request.GET.get('program', 'silver')
-    second_pet_program = request.GET.get('secondPetProgram', 'silver')
-    
-    # Get pricing data
-    pricing_data = None
-    if pet_type == 'dog' and program in DOG_PRICING and weight_category in DOG_PRICING[program]:
-        pricing_data = DOG_PRICING[program][weight_category].copy()
-        # Add 'final' field for compatibility with JavaScript
-        if 'annual' in pricing_data and 'final' not in pricing_data:
-            pricing_data['final'] = pricing_data['annual']
-    elif pet_type == 'cat' and program in CAT_PRICING and weight_category in CAT_PRICING[program]:
-        pricing_data = CAT_PRICING[program][weight_category].copy()
-        # Add 'final' field for compatibility with JavaScript
-        if 'annual' in pricing_data and 'final' not in pricing_data:
-            pricing_data['final'] = pricing_data['annual']
     
-    # Get breed surcharges and add-ons from session (stored when questionnaire was submitted)
-    special_breed_5_percent = False
-    special_breed_20_percent = False
-
-    # AUTO-DETECT SURCHARGES BASED ON BREED
-    breed_lower = (breed or "").lower()
-
-    # 5% surcharge
-    if any(b in breed_lower for b in ["cane corso", "dogo argentino", "rottweiler", "pit bull"]):
-        special_breed_5_percent = True
-
-    # 20% surcharge
-    if any(b in breed_lower for b in ["french bulldog", "english bulldog", "chow chow"]):
-        special_breed_20_percent = True
-
-    additional_poisoning_coverage = False
-    additional_blood_checkup = False
+    # Breed surcharges and add-ons: the questionnaire answers (session), then URL parameters
+    sources = questionnaire_sources(request)
+    answers = parse_questionnaire(*sources)
+    special_breed_5_percent = breed_match.special_breed_5_percent or answers.values['special_breed_5_percent']
+    special_breed_20_percent = breed_match.special_breed_20_percent or answers.values['special_breed_20_percent']
+    additional_poisoning_coverage = answers.values['additional_poisoning_coverage']
+    additional_blood_checkup = answers.values['additional_blood_checkup']
     
-    # Check URL parameters first (for direct access)
-    if request.GET.get('special_breed_5_percent') == 'true':
-        special_breed_5_percent = True
-    if request.GET.get('special_breed_20_percent') == 'true':
-        special_breed_20_percent = True
-    if request.GET.get('additional_poisoning_coverage') == 'true':
-        additional_poisoning_coverage = True
-    if request.GET.get('additional_blood_checkup') == 'true':
-        additional_blood_checkup = True
-    
-    # Also check session data (stored when questionnaire was submitted)
-    session_data = {}
-    if 'questionnaire_data' in request.session:
-        session_data = request.session['questionnaire_data']
-        if isinstance(session_data, dict):
-            # Check for breed surcharges
-            session_5_percent = session_data.get('special_breed_5_percent')
-            if session_5_percent:
-                if isinstance(session_5_percent, list):
-                    special_breed_5_percent = 'true' in session_5_percent or True in [v == 'true' for v in session_5_percent]
-                else:
-                    special_breed_5_percent = session_5_percent == 'true' or special_breed_5_percent
-            
-            session_20_percent = session_data.get('special_breed_20_percent')
-            if session_20_percent:
-                if isinstance(session_20_percent, list):
-                    special_breed_20_percent = 'true' in session_20_percent or True in [v == 'true' for v in session_20_percent]
-                else:
-                    special_breed_20_percent = session_20_percent == 'true' or special_breed_20_percent
-            
-            # Check for add-ons
-            session_poisoning = session_data.get('additional_poisoning_coverage')
-            if session_poisoning:
-                additional_poisoning_coverage = session_poisoning == 'true' or additional_poisoning_coverage
-            
-            session_blood = session_data.get('additional_blood_checkup')
-            if session_blood:
-                additional_blood_checkup = session_blood == 'true' or additional_blood_checkup
-    
-    # Calculate base price with breed surcharges
+    # Price breakdown (annual values) shown above the frequency options
     base_price_breakdown = {
         'base_price': 0,
         'breed_surcharge_5_percent': 0,
@@ -571,88 +398,63 @@ def user_data(request):
         'total': 0
     }
     
-    if pricing_data and 'annual' in pricing_data:
-        base_annual = pricing_data['annual']
-        original_base = base_annual
-        base_price_breakdown['base_price'] = original_base
-        
-        # Apply breed surcharges (cumulative - matching handle_application_submission logic)
-        if special_breed_5_percent:
-            surcharge_5 = base_annual * 0.05
-            base_annual = base_annual * 1.05
-            base_price_breakdown['breed_surcharge_5_percent'] = round(surcharge_5, 2)
-        
-        if special_breed_20_percent:
-            # Calculate 20% on the current price (after 5% if applied)
-            surcharge_20 = base_annual * 0.20
-            base_annual = base_annual * 1.20
-            base_price_breakdown['breed_surcharge_20_percent'] = round(surcharge_20, 2)
-        
-        # Calculate add-on prices based on program (annual prices)
-        addon_poisoning_annual = 0
-        addon_blood_annual = 0
-        
-        if additional_poisoning_coverage:
-            from .utils import get_poisoning_price
-            addon_poisoning_annual = get_poisoning_price(
-                program=program,
-                payment_frequency="annual"
-            )
-            base_price_breakdown['poisoning_coverage'] = addon_poisoning_annual
-        
-        if additional_blood_checkup:
-            addon_blood_annual = 28  # Same for all programs
-            base_price_breakdown['blood_checkup'] = addon_blood_annual
-        
-        # Apply surcharges to base prices (if any)
-        if special_breed_5_percent or special_breed_20_percent:
-            surcharge_multiplier = 1.0
-            if special_breed_5_percent:
-                surcharge_multiplier *= 1.05
-            if special_breed_20_percent:
-                surcharge_multiplier *= 1.20
-            
-            pricing_data['annual'] = round(original_base * surcharge_multiplier, 2)
-            if 'six_month' in pricing_data:
-                pricing_data['six_month'] = round(pricing_data['six_month'] * surcharge_multiplier, 2)
-            if 'three_month' in pricing_data:
-                pricing_data['three_month'] = round(pricing_data['three_month'] * surcharge_multiplier, 2)
-        else:
-            pricing_data['annual'] = round(original_base, 2)
-        
-        # Add add-ons separately with correct scaling (50% for 6-month, 25% for 3-month)
-        base_annual = pricing_data['annual'] + addon_poisoning_annual + addon_blood_annual
-        pricing_data['annual'] = round(base_annual, 2)
-        
-        if 'six_month' in pricing_data:
-            # Add add-ons with 50% scaling for 6-month
-            addon_poisoning_6m = round(addon_poisoning_annual * 0.5, 2)
-            addon_blood_6m = round(addon_blood_annual * 0.5, 2)
-            pricing_data['six_month'] = round(pricing_data['six_month'] + addon_poisoning_6m + addon_blood_6m, 2)
-        
-        if 'three_month' in pricing_data:
-            # Add add-ons with 25% scaling for 3-month
-            addon_poisoning_3m = round(addon_poisoning_annual * 0.25, 2)
-            addon_blood_3m = round(addon_blood_annual * 0.25, 2)
-            pricing_data['three_month'] = round(pricing_data['three_month'] + addon_poisoning_3m + addon_blood_3m, 2)
-        
-        pricing_data['final'] = pricing_data['annual']
-        
-        base_price_breakdown['total'] = pricing_data['annual']
+    # Get pricing data (surcharges and add-ons applied, all frequencies in one pass)
+    pricing_data = None
+    try:
+        quotes = quote_frequencies(
+            pet_type, program, weight_category,
+            special_breed_5_percent=special_breed_5_percent,
+            special_breed_20_percent=special_breed_20_percent,
+            poisoning=additional_poisoning_coverage,
+            blood_checkup=additional_blood_checkup,
+        )
+    except ValueError:
+        quotes = None
     
-    # Get second pet pricing
+    if quotes:
+        annual = quotes['annual']
+        pricing_data = {
+            'annual': annual.gross,
+            'six_month': quotes['6m'].gross,
+            'three_month': quotes['3m'].gross,
+            # 'final' field for compatibility with JavaScript
+            'final': annual.gross,
+        }
+        base_price_breakdown.update({
+            'base_price': annual.base_gross,
+            'breed_surcharge_5_percent': annual.surcharge_5_percent,
+            'breed_surcharge_20_percent': annual.surcharge_20_percent,
+            'poisoning_coverage': annual.poisoning,
+            'blood_checkup': annual.blood_checkup,
+            'total': annual.gross,
+        })
+    
+    # Get second pet pricing (same program as the first pet, like the policy)
     second_pet_pricing_data = None
-    if second_pet_type and second_pet_program and second_pet_weight_category:
-        if second_pet_type == 'dog' and second_pet_program in DOG_PRICING and second_pet_weight_category in DOG_PRICING[second_pet_program]:
-            second_pet_pricing_data = DOG_PRICING[second_pet_program][second_pet_weight_category].copy()
-            # Add 'final' field for compatibility with JavaScript
-            if 'annual' in second_pet_pricing_data and 'final' not in second_pet_pricing_data:
-                second_pet_pricing_data['final'] = second_pet_pricing_data['annual']
-        elif second_pet_type == 'cat' and second_pet_program in CAT_PRICING and second_pet_weight_category in CAT_PRICING[second_pet_program]:
-            second_pet_pricing_data = CAT_PRICING[second_pet_program][second_pet_weight_category].copy()
-            # Add 'final' field for compatibility with JavaScript
-            if 'annual' in second_pet_pricing_data and 'final' not in second_pet_pricing_data:
-                second_pet_pricing_data['final'] = second_pet_pricing_data['annual']
+    if second_pet_type and second_pet_weight_category:
+        try:
+            second_quotes = quote_frequencies(second_pet_type, program, second_pet_weight_category)
+        except ValueError:
+            second_quotes = None
+        if second_quotes:
+            second_pet_pricing_data = {
+                'annual': second_quotes['annual'].gross,
+                'six_month': second_quotes['6m'].gross,
+                'three_month': second_quotes['3m'].gross,
+                # 'final' field for compatibility with JavaScript
+                'final': second_quotes['annual'].gross,
+            }
+            # Household share of the second pet (Excel combined row or 5% off)
+            try:
+                second_pet_pricing_data['household'] = {
+                    key: quote_second_pet(
+                        second_pet_type, program, second_pet_weight_category, key,
+                        first_pet_type=pet_type, first_pet_weight=weight_category,
+                    ).gross
+                    for key in ('annual', 'six_month', 'three_month')
+                }
+            except ValueError:
+                pass
 
     context = {
         'pet_type': pet_type,
@@ -670,6 +472,7 @@ def user_data(request):
         'second_pet_breed': second_pet_breed,
         'second_pet_weight_category': second_pet_weight_category,
         'second_pet_pricing_data': second_pet_pricing_data,
+        'submission_token': issue_submission_token(),
         
         # Price breakdown data
         'price_breakdown': base_price_breakdown,
@@ -688,36 +491,156 @@ def user_data(request):
         'user_microchip': request.GET.get('user_microchip', ''),
     }
     
-    # Get user data from session (stored when questionnaire was submitted)
-    # session_data is already defined above if questionnaire_data exists
-    if session_data and isinstance(session_data, dict):
-        # Extract user data from session, handling both list and string values
-        def get_session_value(key, default=''):
-            value = session_data.get(key, default)
-            if isinstance(value, list):
-                return value[0] if value else default
-            return value if value else default
-        
-        context['user_full_name'] = get_session_value('fullName', request.GET.get('user_full_name', ''))
-        context['user_afm'] = get_session_value('afm', request.GET.get('user_afm', ''))
-        context['user_phone'] = get_session_value('phone', request.GET.get('user_phone', ''))
-        context['user_address'] = get_session_value('address', request.GET.get('user_address', ''))
-        context['user_postal_code'] = get_session_value('postalCode', request.GET.get('user_postal_code', ''))
-        context['user_email'] = get_session_value('email', request.GET.get('user_email', ''))
-    else:
-        # Fallback to URL parameters
-        context['user_full_name'] = request.GET.get('user_full_name', '')
-        context['user_afm'] = request.GET.get('user_afm', '')
-        context['user_phone'] = request.GET.get('user_phone', '')
-        context['user_address'] = request.GET.get('user_address', '')
-        context['user_postal_code'] = request.GET.get('user_postal_code', '')
-        context['user_email'] = request.GET.get('user_email', '')
+    # User data from the session (stored when questionnaire was submitted), else URL parameters
+    session_data = sources[1]
+    context['user_full_name'] = raw_answer('fullName', session_data) or request.GET.get('user_full_name', '')
+    context['user_afm'] = raw_answer('afm', session_data) or request.GET.get('user_afm', '')
+    context['user_phone'] = raw_answer('phone', session_data) or request.GET.get('user_phone', '')
+    context['user_address'] = raw_answer('address', session_data) or request.GET.get('user_address', '')
+    context['user_postal_code'] = raw_answer('postalCode', session_data) or request.GET.get('user_postal_code', '')
+    context['user_email'] = raw_answer('email', session_data) or request.GET.get('user_email', '')
     
     return render(request, 'main/user_data.html', context)
 
+# Session lists of the uploads of this visitor, by model
+SESSION_UPLOADS = {'PetDocument': 'uploaded_document_ids', 'PetPhoto': 'uploaded_photo_ids'}
+
+# Session list of the applications this visitor submitted (application_jobs_api)
+SESSION_SUBMISSIONS = 'submitted_application_ids'
+SESSION_SUBMISSIONS_KEPT = 10
+
+
+def link_session_uploads(request, application):
+    """
+    Link the documents and photos uploaded in this session to ``application``
+    with one UPDATE per model, whatever the number of files. Only uploads
+    recorded in the session by upload_document / upload_photo and not linked
+    yet are claimed, so nobody can take other visitors' files. The session
+    lists are cleared once the submission commits. Returns {model name:
+    files linked}.
+    """
+    import logging
+    from django.apps import apps
+
+    logger = logging.getLogger(__name__)
+    linked = {}
+    for model_name, session_key in SESSION_UPLOADS.items():
+        ids = [pk for pk in request.session.get(session_key, []) if isinstance(pk, int)]
+        if not ids:
+            continue
+        model = apps.get_model('main', model_name)
+        linked[model_name] = model.objects.filter(id__in=ids, application__isnull=True).update(application=application)
+        if linked[model_name] != len(ids):
+            logger.warning(
+                "%s of %s %s upload(s) of the session missing or linked already, application %s",
+                len(ids) - linked[model_name], len(ids), model_name, application.id,
+            )
+    logger.info("Linked uploads to application %s: %s", application.id, linked)
+
+    def forget_uploads():
+        # A rolled back submission keeps them, for the retry
+        for session_key in SESSION_UPLOADS.values():
+            request.session.pop(session_key, None)
+
+    transaction.on_commit(forget_uploads)
+    return linked
+
+
+# Replays of a submission token within this many seconds return the original application
+SUBMISSION_TOKEN_MAX_AGE = 24 * 60 * 60
+SUBMISSION_TOKEN_SALT = 'main.submission'
+
+
+def issue_submission_token():
+    """
+    Idempotency key of one rendering of an application form, sent with every
+    (re)submission of it. Signed and timestamped: only tokens issued here
+    are honoured, for SUBMISSION_TOKEN_MAX_AGE.
+    """
+    import secrets
+    from django.core import signing
+
+    return signing.TimestampSigner(salt=SUBMISSION_TOKEN_SALT).sign(secrets.token_urlsafe(16))
+
+
+def submission_idempotency(request):
+    """
+    (key, fingerprint) of a submission: the key of its submission_token, or
+    None when the token is missing, forged or expired, and a SHA-256 over
+    the submitted fields.
+    """
+    import hashlib
+    import json
+    import logging
+    from django.core import signing
+
+    logger = logging.getLogger(__name__)
+    key = None
+    token = request.POST.get('submission_token', '')
+    if token:
+        try:
+            key = signing.TimestampSigner(salt=SUBMISSION_TOKEN_SALT).unsign(token, max_age=SUBMISSION_TOKEN_MAX_AGE)
+        except signing.BadSignature as e:
+            logger.warning("Submission token ignored: %s", e)
+    fields = {
+        name: request.POST.getlist(name) for name in request.POST
+        if name not in ('csrfmiddlewaretoken', 'submission_token')
+    }
+    canonical = json.dumps(fields, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return key, hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def submission_response(application_id, **extra):
+    return JsonResponse({
+        'success': True,
+        'application_id': application_id,
+        'status_url': reverse('main:application_jobs_api', args=[application_id]),
+        'message': 'Η αίτηση υποβλήθηκε επιτυχώς!',
+        **extra,
+    })
+
+
+def replayed_submission(key, fingerprint):
+    """
+    Response to a submission whose key was submitted before: the original
+    application, or a refusal when the fields differ. None for a new key.
+    """
+    import logging
+    from .models import InsuranceApplication
+
+    original = (
+        InsuranceApplication.objects.filter(submission_key=key)
+        .values_list('id', 'submission_fingerprint').first()
+    )
+    if original is None:
+        return None
+    application_id, original_fingerprint = original
+    logger = logging.getLogger(__name__)
+    if original_fingerprint != fingerprint:
+        logger.warning("Submission token of application %s replayed with different fields", application_id)
+        return JsonResponse({
+            'success': False,
+            'message': 'Η αίτηση έχει ήδη υποβληθεί με διαφορετικά στοιχεία. Παρακαλώ ανανεώστε τη σελίδα.'
+        })
+    logger.info("Submission of application %s replayed, returning it unchanged", application_id)
+    return submission_response(application_id, replayed=True)
+
+
+@transaction.atomic
 def handle_application_submission(request):
-    """Handle insurance application form submission"""
+    """
+    Handle insurance application form submission.
+
+    One transaction: the application, its questionnaire, the linked uploads
+    and the outbox rows of its side effects (see main.jobs) are committed
+    together or not at all. Contract, emails and repricing run in the
+    workers; the request only writes to the database.
+
+    A replayed submission token (retry, double click) returns the original
+    application from an indexed lookup, before any other work.
+    """
     from .models import InsuranceApplication
+    from .utils import premium_fingerprint, store_household_premiums
     from datetime import datetime
     from django.http import JsonResponse
     import logging
@@ -725,6 +648,12 @@ def handle_application_submission(request):
     logger = logging.getLogger(__name__)
     
     try:
+        submission_key, fingerprint = submission_idempotency(request)
+        if submission_key:
+            replay = replayed_submission(submission_key, fingerprint)
+            if replay is not None:
+                return replay
+
         # Parse birthdate - try multiple formats
         pet_birthdate = None
         birthdate_str = request.POST.get('birthdate', '')
@@ -741,7 +670,7 @@ def handle_application_submission(request):
                     try:
                         pet_birthdate = datetime.strptime(birthdate_str, '%d/%m/%Y').date()
                     except ValueError:
-                        logger.error(f"Could not parse birthdate: {birthdate_str}")
+                        logger.error("Could not parse birthdate: %s", birthdate_str)
         
         # Validate required fields
         if not pet_birthdate:
@@ -771,383 +700,172 @@ def handle_application_submission(request):
                         try:
                             second_pet_birthdate = datetime.strptime(second_birthdate_str, '%d/%m/%Y').date()
                         except ValueError:
-                            logger.error(f"Could not parse second pet birthdate: {second_birthdate_str}")
+                            logger.error("Could not parse second pet birthdate: %s", second_birthdate_str)
         
         # Calculate base premium from pricing tables
         pet_type_val = request.POST.get('type', '')
         program = request.POST.get('program', 'silver')
         breed = request.POST.get('breed', '')
         
-        # Extract weight category from breed
-        weight_category = None
-        if breed:
-            if 'έως 10 κιλά' in breed or 'up to 10' in breed.lower():
-                weight_category = '10'
-            elif '11-20 κιλά' in breed or '11-20' in breed:
-                weight_category = '11-20'
-            elif '21-40 κιλά' in breed or '21-40' in breed:
-                weight_category = '21-40'
-            elif '>40 κιλά' in breed or '>40' in breed:
-                weight_category = '>40'
+        # Weight band and breed surcharges from the breed catalog
+        breed_match = classify_breed(breed, pet_type_val)
+        weight_category = breed_match.weight_category
         
-        # Get base pricing from tables (same as in user_data view)
-        # Official pricing table - FINAL PRICES (matches official pricing spreadsheet)
-        DOG_PRICING = {
-            'silver': {'10': 166.75, '11-20': 207.20, '21-40': 234.14, '>40': 254.36},
-            'gold': {'10': 234.14, '11-20': 261.09, '21-40': 288.05, '>40': 308.26},
-            'platinum': {'10': 368.92, '11-20': 389.15, '21-40': 409.36, '>40': 436.32}
-        }
-        CAT_PRICING = {
-            'silver': {'10': 113.81, '11-20': 141.02},
-            'gold': {'10': 168.22, '11-20': 188.61},
-            'platinum': {'10': 277.02, '11-20': 311.02}
-        }
-        
-        # Get base premium
-        base_premium = 0
-        if pet_type_val == 'dog' and program in DOG_PRICING and weight_category in DOG_PRICING[program]:
-            base_premium = DOG_PRICING[program][weight_category]
-        elif pet_type_val == 'cat' and program in CAT_PRICING and weight_category in CAT_PRICING[program]:
-            base_premium = CAT_PRICING[program][weight_category]
-        
-        # Apply breed surcharges from questionnaire (if available)
-        # Check POST data first (from questionnaire submission)
-        # Multiple checkboxes with same name come as a list
-        special_breed_5_percent = False
-        special_breed_20_percent = False
-
-        breed_lower = pet_breed.lower()
-
-        # 5% surcharge
-        if any(b in breed_lower for b in ["cane corso", "dogo argentino", "rottweiler", "pit bull"]):
-            special_breed_5_percent = True
-
-        # 20% surcharge
-        if any(b in breed_lower for b in ["french bulldog", "english bulldog", "chow chow"]):
-            special_breed_20_percent = True
-
-        
-        # Check POST data
-        post_5_percent = request.POST.getlist('special_breed_5_percent')
-        post_20_percent = request.POST.getlist('special_breed_20_percent')
-        
-        if post_5_percent and 'true' in post_5_percent:
-            special_breed_5_percent = True
-        if post_20_percent and 'true' in post_20_percent:
-            special_breed_20_percent = True
-        
-        # Also check session data (stored when questionnaire was submitted)
-        if 'questionnaire_data' in request.session:
-            session_data = request.session['questionnaire_data']
-            if isinstance(session_data, dict):
-                # Check for 5% surcharge in session
-                session_5_percent = session_data.get('special_breed_5_percent')
-                if session_5_percent:
-                    if isinstance(session_5_percent, list):
-                        special_breed_5_percent = 'true' in session_5_percent or True in [v == 'true' for v in session_5_percent]
-                    else:
-                        special_breed_5_percent = session_5_percent == 'true' or special_breed_5_percent
-                # Check for 20% surcharge in session
-                session_20_percent = session_data.get('special_breed_20_percent')
-                if session_20_percent:
-                    if isinstance(session_20_percent, list):
-                        special_breed_20_percent = 'true' in session_20_percent or True in [v == 'true' for v in session_20_percent]
-                    else:
-                        special_breed_20_percent = session_20_percent == 'true' or special_breed_20_percent
-        
-        # Log initial base premium
-        initial_premium = base_premium
-        logger.info(f"Initial base premium before surcharges: {base_premium}")
-        logger.info(f"Breed surcharges - 5%: {special_breed_5_percent}, 20%: {special_breed_20_percent}")
-        
-        # Apply surcharges to base premium (surcharges are cumulative if both selected)
-        if special_breed_5_percent:
-            base_premium = base_premium * 1.05  # Add 5% surcharge
-            logger.info(f"Applied 5% breed surcharge. Base premium: {initial_premium} -> {base_premium}")
-        if special_breed_20_percent:
-            base_premium = base_premium * 1.20  # Add 20% surcharge
-            logger.info(f"Applied 20% breed surcharge. Base premium: {base_premium}")
-        
-        # Round to 2 decimal places
-        base_premium = round(base_premium, 2)
-        logger.info(f"Final premium after breed surcharges: {base_premium} (was {initial_premium})")
-        
-        # Add extra features (poisoning coverage and blood checkup)
-        extra_features_total = 0
-        additional_poisoning = request.POST.get('additional_poisoning_coverage') == 'true'
-        additional_blood_checkup = request.POST.get('additional_blood_checkup') == 'true'
-        
-        if additional_poisoning:
-            from .utils import get_poisoning_price
-
-            poisoning_price = get_poisoning_price(
-                program=program,
-                payment_frequency="annual"
-            )
-
-            extra_features_total += poisoning_price
-            logger.info(f"Added poisoning coverage: +{poisoning_price}€")
-        
-        if additional_blood_checkup:
-            # Blood checkup is 28€ for all programs
-            extra_features_total += 28
-            logger.info(f"Added blood checkup: +28€")
-        
-        base_premium += extra_features_total
-        logger.info(f"Final premium after extra features: {base_premium}")
+        # Breed surcharges and add-ons: the breed catalog, then the questionnaire
+        # answers (POST, session, URL), parsed once for the Questionnaire too
+        # (breed surcharges are dog-only, like the stored questionnaire)
+        sources = questionnaire_sources(request)
+        answers = parse_questionnaire(*sources)
+        is_dog = raw_answer('type', *sources) == 'dog'
+        special_breed_5_percent = is_dog and bool(breed_match.special_breed_5_percent or answers.values['special_breed_5_percent'])
+        special_breed_20_percent = is_dog and bool(breed_match.special_breed_20_percent or answers.values['special_breed_20_percent'])
+        additional_poisoning = answers.values['additional_poisoning_coverage']
+        additional_blood_checkup = answers.values['additional_blood_checkup']
         
         # Check for affiliate code and apply discount
         affiliate_code_str = request.POST.get('affiliateCode', '').strip().upper()
-        discount_applied = 0
         affiliate_code_obj = None
         
         if affiliate_code_str:
             from .models import AmbassadorCode
             try:
                 affiliate_code_obj = AmbassadorCode.objects.get(code=affiliate_code_str)
-                if affiliate_code_obj.is_valid():
-                    # Apply discount
-                    final_amount, discount = affiliate_code_obj.apply_discount(float(base_premium))
-                    discount_applied = discount
-                    base_premium = final_amount
-                    # Increment usage counter
-                    affiliate_code_obj.increment_usage()
+                if not affiliate_code_obj.is_valid():
+                    affiliate_code_obj = None
             except AmbassadorCode.DoesNotExist:
                 pass  # Code not found, proceed without discount
         
-        # Create application
-        application = InsuranceApplication.objects.create(
-            # User information
-            full_name=request.POST.get('fullName', ''),
-            afm=request.POST.get('afm', ''),
-            phone=request.POST.get('phone', ''),
-            address=request.POST.get('address', ''),
-            postal_code=request.POST.get('postalCode', ''),
-            email=request.POST.get('email', ''),
+        # Household premium in one pass: first pet with breed surcharges, extra
+        # features and the affiliate discount, second pet with its household price.
+        # The application records the tariff version so recalculations reproduce it
+        tariff = get_active_tariff()
+        household_pets = [HouseholdPet(
+            pet_type_val, program, weight_category, {
+                'special_breed_5_percent': special_breed_5_percent,
+                'special_breed_20_percent': special_breed_20_percent,
+                'poisoning': bool(additional_poisoning),
+                'blood_checkup': bool(additional_blood_checkup),
+            },
+        )]
+        if request.POST.get('secondPetName') and request.POST.get('secondPetType') and request.POST.get('secondPetWeight'):
+            household_pets.append(HouseholdPet(
+                request.POST.get('secondPetType'), program, request.POST.get('secondPetWeight'),
+            ))
+        household = None
+        base_premium = 0
+        discount_applied = 0
+        try:
+            household = quote_household(household_pets, ambassador_code=affiliate_code_obj, tariff=tariff)
+            annual_quote = household.pets[0]['annual']
+            base_premium = household.totals['annual']
+            discount_applied = annual_quote.discount
+            logger.info(
+                "Annual premium %s for %s pet(s) (first pet base %s, surcharges %s, add-ons %s, discount %s)",
+                base_premium, len(household.pets), annual_quote.base_gross, annual_quote.surcharges,
+                annual_quote.addons, discount_applied,
+            )
+        except ValueError as e:
+            logger.warning("No tariff price for submission: %s", e)
+        
+        if affiliate_code_obj:
+            # Increment usage counter
+            affiliate_code_obj.increment_usage()
+        
+        # Create application; savepoint: a concurrent submission of the same
+        # key makes the insert fail, and this request answers as its replay
+        application_savepoint = transaction.savepoint()
+        try:
+            application = InsuranceApplication.objects.create(
+                # User information
+                full_name=request.POST.get('fullName', ''),
+                afm=request.POST.get('afm', ''),
+                phone=request.POST.get('phone', ''),
+                address=request.POST.get('address', ''),
+                postal_code=request.POST.get('postalCode', ''),
+                email=request.POST.get('email', ''),
             
-            # Pet information
-            pet_name=request.POST.get('name', ''),
-            pet_type=request.POST.get('type', ''),
-            pet_gender=request.POST.get('gender', ''),
-            pet_breed=pet_breed,
-            pet_birthdate=pet_birthdate,
-            pet_weight_category=extract_weight_from_breed(pet_breed),
-            microchip_number=request.POST.get('microchip', ''),
+                # Pet information
+                pet_name=request.POST.get('name', ''),
+                pet_type=request.POST.get('type', ''),
+                pet_gender=request.POST.get('gender', ''),
+                pet_breed=pet_breed,
+                pet_birthdate=pet_birthdate,
+                pet_weight_category=weight_category or '',
+                microchip_number=request.POST.get('microchip', ''),
             
-            # Second pet information
-            has_second_pet=bool(request.POST.get('secondPetName')),
-            second_pet_name=request.POST.get('secondPetName', ''),
-            second_pet_type=request.POST.get('secondPetType', ''),
-            second_pet_gender=request.POST.get('secondPetGender', ''),
-            second_pet_breed=request.POST.get('secondPetBreed', ''),
-            second_pet_birthdate=second_pet_birthdate,
-            second_pet_weight_category=request.POST.get('secondPetWeight', ''),
+                # Second pet information
+                has_second_pet=bool(request.POST.get('secondPetName')),
+                second_pet_name=request.POST.get('secondPetName', ''),
+                second_pet_type=request.POST.get('secondPetType', ''),
+                second_pet_gender=request.POST.get('secondPetGender', ''),
+                second_pet_breed=request.POST.get('secondPetBreed', ''),
+                second_pet_birthdate=second_pet_birthdate,
+                second_pet_weight_category=request.POST.get('secondPetWeight', ''),
             
-            # Insurance details
-            program=request.POST.get('program', ''),
-            health_status=request.POST.get('health_status', ''),
-            health_conditions=request.POST.get('conditions', ''),
-            second_pet_health_status=request.POST.get('secondPetHealth', '') or '',
-            second_pet_health_conditions=request.POST.get('secondPetHealthConditions', '') or '',
+                # Insurance details
+                program=request.POST.get('program', ''),
+                health_status=request.POST.get('health_status', ''),
+                health_conditions=request.POST.get('conditions', ''),
+                second_pet_health_status=request.POST.get('secondPetHealth', '') or '',
+                second_pet_health_conditions=request.POST.get('secondPetHealthConditions', '') or '',
             
-            # Pricing (with discount applied if code was used)
-            annual_premium=base_premium,
-            affiliate_code=affiliate_code_str if affiliate_code_str else None,
-            discount_applied=discount_applied,
+                # Pricing (with discount applied if code was used)
+                annual_premium=base_premium,
+                tariff_version_id=tariff.version_id,
+                affiliate_code=affiliate_code_str if affiliate_code_str else None,
+                discount_applied=discount_applied,
             
-            # Contract PDF (will be generated later)
-            contract_pdf_path='',
+                # Contract PDF (will be generated later)
+                contract_pdf_path='',
             
-            # Status
-            status='submitted'
-        )
+                # Status
+                status='submitted',
+
+                # Idempotency (see submission_idempotency)
+                submission_key=submission_key,
+                submission_fingerprint=fingerprint,
+            )
+        except IntegrityError:
+            transaction.savepoint_rollback(application_savepoint)
+            replay = replayed_submission(submission_key, fingerprint) if submission_key else None
+            if replay is None:
+                raise
+            # Nothing of this request is kept: the affiliate usage was counted once
+            transaction.set_rollback(True)
+            return replay
+        transaction.savepoint_commit(application_savepoint)
         
-        # Create and save questionnaire
-        # Get questionnaire data from session (stored when questionnaire was submitted) or from POST
+        # Per-pet breakdown and every frequency's total, stored with the
+        # fingerprint of their inputs: the questionnaire saved below records
+        # the same flags, so it queues no repricing
+        if household is not None:
+            store_household_premiums(application, household, premium_fingerprint(
+                application, affiliate_code_obj if discount_applied else None, household_pets,
+            ))
+        
+        # Create and save questionnaire from the answers parsed above
+        # Savepoint: a failed save is rolled back alone, for the fallback below
+        questionnaire_savepoint = transaction.savepoint()
         try:
             from .models import Questionnaire
-            from datetime import datetime
-            
-            # Get questionnaire data from ALL sources: session, POST, and URL params
-            # Priority: POST > Session > URL params (POST is most recent)
-            questionnaire_data = {}
             
-            # First, get from session (stored when questionnaire was submitted)
-            if 'questionnaire_data' in request.session:
-                session_data = request.session['questionnaire_data']
-                logger.info(f"Retrieved questionnaire data from session with {len(session_data)} keys")
-                # Convert QueryDict-like structure to regular dict
-                for key, value in session_data.items():
-                    if isinstance(value, list):
-                        # For checkboxes with same name, if any is 'true', consider it True
-                        if 'true' in value or True in value:
-                            questionnaire_data[key] = 'true'
-                        elif len(value) > 0:
-                            # Keep the actual value (could be 'false' for radio buttons)
-                            questionnaire_data[key] = value[0]
-                        else:
-                            questionnaire_data[key] = ''
-                    else:
-                        # Keep the value as-is (important for 'false' radio button values)
-                        questionnaire_data[key] = value
-                logger.info(f"Processed session questionnaire_data has {len(questionnaire_data)} keys: {list(questionnaire_data.keys())[:20]}")
-            
-            # Then, merge POST data (overrides session data - POST is more recent)
-            for key in request.POST.keys():
-                values = request.POST.getlist(key)
-                # For checkboxes with same name (like special_breed_5_percent), if any is 'true', consider it True
-                if 'true' in values or True in values:
-                    questionnaire_data[key] = 'true'
-                elif len(values) == 1:
-                    questionnaire_data[key] = values[0]
-                elif len(values) > 1:
-                    questionnaire_data[key] = values  # Keep as list for processing
-                else:
-                    questionnaire_data[key] = ''
-            
-            # Also check URL parameters for any missing fields
-            for key in request.GET.keys():
-                if key not in questionnaire_data or not questionnaire_data[key]:
-                    questionnaire_data[key] = request.GET.get(key, '')
-            
-            logger.info(f"Final merged questionnaire_data has {len(questionnaire_data)} keys from all sources")
-            logger.info(f"Sample questionnaire_data keys: {list(questionnaire_data.keys())[:30]}")
-            
-            # Log questionnaire data for debugging
-            logger.info(f"Creating questionnaire for application {application.id} with {len(questionnaire_data)} fields")
-            
-            # If questionnaire_data is empty, log a warning
-            if not questionnaire_data or len(questionnaire_data) < 5:
-                logger.warning(f"WARNING: Questionnaire data is very sparse! Only {len(questionnaire_data)} fields found.")
-                logger.warning(f"POST keys: {list(request.POST.keys())[:30]}")
-                logger.warning(f"Session has questionnaire_data: {'questionnaire_data' in request.session}")
-                if 'questionnaire_data' in request.session:
-                    session_keys = list(request.session['questionnaire_data'].keys()) if isinstance(request.session['questionnaire_data'], dict) else []
-                    logger.warning(f"Session questionnaire_data keys: {session_keys[:30]}")
-            
-            def get_bool(key, default=False):
-                # If key doesn't exist in questionnaire_data, return default (usually False)
-                if key not in questionnaire_data:
-                    return bool(default)  # Ensure it's always a boolean
-                
-                val = questionnaire_data.get(key, '')
-                
-                # Handle list values (multiple checkboxes with same name)
-                if isinstance(val, list):
-                    # If any value in list is 'true', return True
-                    if 'true' in val or True in val:
-                        return True
-                    # If list has values, take first one
-                    val = val[0] if val else ''
-                
-                # Handle string values
-                if isinstance(val, str):
-                    val_lower = val.lower().strip()
-                    # Explicit 'false' or 'no' means False
-                    if val_lower in ['false', 'no', '0', '']:
-                        return False
-                    # Explicit 'true' or 'yes' means True
-                    if val_lower in ['true', 'yes', '1', 'on']:
-                        return True
-                    # Any non-empty string (for checkboxes) means True
-                    if val_lower:
-                        return True
-                    # Empty string means False
-                    return False
-                
-                # Handle boolean values
-                if isinstance(val, bool):
-                    return val
-                
-                # Handle None - return default as boolean
-                if val is None:
-                    return bool(default)
-                
-                # If value exists but is not recognized, return default as boolean
-                return bool(default)
-            
-            def get_str(key, default=''):
-                val = questionnaire_data.get(key, default)
-                if isinstance(val, list):
-                    val = val[0] if val else default
-                return str(val) if val else default
-            
-            desired_start_date = None
-            start_date_str = get_str('desired_start_date')
-            if start_date_str:
-                try:
-                    desired_start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                except ValueError:
-                    pass
-            
-            pet_type_val = request.POST.get('type', '') or get_str('type', '')
-            is_dog = pet_type_val == 'dog'
-            
-            # Check for breed type - can come from breed_type field OR individual checkboxes
-            breed_type = get_str('breed_type', '')
+            questionnaire_defaults = dict(answers.values)
+            # Breed type: one radio (breed_type) or the three checkboxes
+            breed_type = raw_answer('breed_type', *sources)
             if breed_type:
-                is_purebred = breed_type == 'purebred'
-                is_mixed = breed_type == 'mixed'
-                is_crossbreed = breed_type == 'crossbreed'
-            else:
-                # Use individual checkbox fields
-                is_purebred = get_bool('is_purebred')
-                is_mixed = get_bool('is_mixed')
-                is_crossbreed = get_bool('is_crossbreed')
-            
-            # Log what we're about to save
-            logger.info(f"Questionnaire values to save:")
-            logger.info(f"  Total fields in questionnaire_data: {len(questionnaire_data)}")
-            logger.info(f"  Sample keys: {list(questionnaire_data.keys())[:30]}")
-            logger.info(f"  has_other_insured_pet: {get_bool('has_other_insured_pet')} (raw: {questionnaire_data.get('has_other_insured_pet', 'NOT_FOUND')})")
-            logger.info(f"  has_been_denied_insurance: {get_bool('has_been_denied_insurance')} (raw: {questionnaire_data.get('has_been_denied_insurance', 'NOT_FOUND')})")
-            logger.info(f"  is_healthy: {get_bool('is_healthy')} (raw: {questionnaire_data.get('is_healthy', 'NOT_FOUND')})")
-            logger.info(f"  special_breed_5_percent: {get_bool('special_breed_5_percent')} (raw: {questionnaire_data.get('special_breed_5_percent', 'NOT_FOUND')})")
-            logger.info(f"  program: {get_str('program')} or POST: {request.POST.get('program', 'NONE')} or GET: {request.GET.get('program', 'NONE')}")
-            logger.info(f"  payment_frequency: {get_str('payment_frequency')} or POST: {request.POST.get('payment_frequency', 'NONE')}")
-            logger.info(f"  payment_method: {get_str('payment_method')} or POST: {request.POST.get('payment_method', 'NONE')}")
-            
-            # Build all questionnaire fields from all sources
-            questionnaire_defaults = {
-                'has_other_insured_pet': get_bool('has_other_insured_pet'),
-                'has_been_denied_insurance': get_bool('has_been_denied_insurance'),
-                'has_special_terms_imposed': get_bool('has_special_terms_imposed'),
-                'pet_colors': get_str('pet_colors'),
-                'pet_weight': get_str('pet_weight'),
-                'is_purebred': is_purebred,
-                'is_mixed': is_mixed,
-                'is_crossbreed': is_crossbreed,
-                'special_breed_5_percent': get_bool('special_breed_5_percent') if is_dog else False,
-                'special_breed_20_percent': get_bool('special_breed_20_percent') if is_dog else False,
-                'is_healthy': get_bool('is_healthy'),  # Get actual value, don't default
-                'is_healthy_details': get_str('is_healthy_details'),
-                'has_injury_illness_3_years': get_bool('has_injury_illness_3_years'),
-                'has_injury_illness_details': get_str('has_injury_illness_details'),
-                'has_surgical_procedure': get_bool('has_surgical_procedure'),
-                'has_surgical_procedure_details': get_str('has_surgical_procedure_details'),
-                'has_examination_findings': get_bool('has_examination_findings'),
-                'has_examination_findings_details': get_str('has_examination_findings_details'),
-                'is_sterilized': get_bool('is_sterilized'),
-                'is_vaccinated_leishmaniasis': get_bool('is_vaccinated_leishmaniasis') if is_dog else False,
-                'follows_vaccination_program': get_bool('follows_vaccination_program'),  # Get actual value
-                'follows_vaccination_program_details': get_str('follows_vaccination_program_details'),
-                'has_hereditary_disease': get_bool('has_hereditary_disease'),
-                'has_hereditary_disease_details': get_str('has_hereditary_disease_details'),
-                'program': get_str('program') or request.POST.get('program', '') or request.GET.get('program', ''),
-                'additional_poisoning_coverage': get_bool('additional_poisoning_coverage'),
-                'additional_blood_checkup': get_bool('additional_blood_checkup'),
-                'desired_start_date': desired_start_date,
-                'payment_method': get_str('payment_method') or request.POST.get('payment_method', '') or request.GET.get('payment_method', ''),
-                'payment_frequency': get_str('payment_frequency') or request.POST.get('payment_frequency', '') or request.GET.get('payment_frequency', ''),
-                'consent_terms_conditions': get_bool('consent_terms_conditions'),
-                'consent_info_document': get_bool('consent_info_document'),
-                'consent_email_notifications': get_bool('consent_email_notifications'),
-                'consent_marketing': get_bool('consent_marketing'),
-                'consent_data_processing': get_bool('consent_data_processing'),
-                'consent_pet_gov_platform': get_bool('consent_pet_gov_platform'),
-            }
-            
-            logger.info(f"Saving questionnaire with program: {questionnaire_defaults['program']}, payment_frequency: {questionnaire_defaults['payment_frequency']}, payment_method: {questionnaire_defaults['payment_method']}")
+                questionnaire_defaults['is_purebred'] = breed_type == 'purebred'
+                questionnaire_defaults['is_mixed'] = breed_type == 'mixed'
+                questionnaire_defaults['is_crossbreed'] = breed_type == 'crossbreed'
+            # Surcharges as priced above: breed catalog or answers, dog-only
+            questionnaire_defaults['special_breed_5_percent'] = special_breed_5_percent
+            questionnaire_defaults['special_breed_20_percent'] = special_breed_20_percent
+            # Dog-only answers
+            if not is_dog:
+                questionnaire_defaults['special_breed_5_percent'] = False
+                questionnaire_defaults['special_breed_20_percent'] = False
+                questionnaire_defaults['is_vaccinated_leishmaniasis'] = False
+            if answers.errors:
+                logger.warning("Questionnaire of application %s: invalid answers dropped: %s", application.id, answers.errors)
             
             questionnaire, created = Questionnaire.objects.get_or_create(
                 application=application,
@@ -1160,114 +878,55 @@ def handle_application_submission(request):
                     setattr(questionnaire, key, value)
                 questionnaire.save()
             
-            # Log successful creation with detailed info
-            logger.info(f"Questionnaire {'created' if created else 'updated'} successfully for application {application.id} (Questionnaire ID: {questionnaire.id})")
-            logger.info(f"Questionnaire details - 5%: {questionnaire.special_breed_5_percent}, 20%: {questionnaire.special_breed_20_percent}, poisoning: {questionnaire.additional_poisoning_coverage}, blood: {questionnaire.additional_blood_checkup}")
+            logger.info(
+                "Questionnaire %s for application %s (%s/%s answered): program=%s, "
+                "payment_frequency=%s, payment_method=%s",
+                'created' if created else 'updated', application.id, len(answers.answered), len(answers.values),
+                questionnaire.program, questionnaire.payment_frequency, questionnaire.payment_method,
+            )
             
-            if 'questionnaire_data' in request.session:
-                del request.session['questionnaire_data']
+            transaction.savepoint_commit(questionnaire_savepoint)
+            if QUESTIONNAIRE_SESSION_KEY in request.session:
+                del request.session[QUESTIONNAIRE_SESSION_KEY]
                 if 'questionnaire_submitted' in request.session:
                     del request.session['questionnaire_submitted']
         except Exception as e:
-            logger.error(f"Error creating/updating questionnaire for application {application.id}: {e}")
+            transaction.savepoint_rollback(questionnaire_savepoint)
+            logger.error("Error creating/updating questionnaire for application %s: %s", application.id, e)
             import traceback
             logger.error(traceback.format_exc())
             # Even if there's an error, try to create an empty questionnaire so it's visible in admin
             try:
                 Questionnaire.objects.get_or_create(application=application)
-                logger.info(f"Created empty questionnaire for application {application.id} as fallback")
+                logger.info("Created empty questionnaire for application %s as fallback", application.id)
             except Exception as fallback_error:
-                logger.error(f"Failed to create fallback questionnaire: {fallback_error}")
+                logger.error("Failed to create fallback questionnaire: %s", fallback_error)
         
-        # Link uploaded documents to application
-        try:
-            from .models import PetDocument
-            # Get document IDs from session or POST
-            document_ids = request.session.get('uploaded_document_ids', [])
-            if not document_ids:
-                # Try to get from POST
-                document_ids_str = request.POST.get('document_ids', '')
-                if document_ids_str:
-                    document_ids = [int(id) for id in document_ids_str.split(',') if id.strip()]
-            
-            for doc_id in document_ids:
-                try:
-                    doc = PetDocument.objects.get(id=doc_id)
-                    doc.application = application
-                    doc.save()
-                except PetDocument.DoesNotExist:
-                    pass
-            
-            # Clear session
-            if 'uploaded_document_ids' in request.session:
-                del request.session['uploaded_document_ids']
-        except Exception as e:
-            logger.error(f"Error linking documents to application {application.id}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-        
-        # Link uploaded photos to application
-        try:
-            from .models import PetPhoto
-            # Get photo IDs from session or POST
-            photo_ids = request.session.get('uploaded_photo_ids', [])
-            if not photo_ids:
-                # Try to get from POST
-                photo_ids_str = request.POST.get('photo_ids', '')
-                if photo_ids_str:
-                    photo_ids = [int(id) for id in photo_ids_str.split(',') if id.strip()]
-            
-            for photo_id in photo_ids:
-                try:
-                    photo = PetPhoto.objects.get(id=photo_id)
-                    photo.application = application
-                    photo.save()
-                except PetPhoto.DoesNotExist:
-                    pass
-            
-            # Clear session
-            if 'uploaded_photo_ids' in request.session:
-                del request.session['uploaded_photo_ids']
-        except Exception as e:
-            logger.error(f"Error linking photos to application {application.id}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        # Link the documents and photos uploaded in this session
+        link_session_uploads(request, application)
         
-        # Generate and store contract PDF (contains all application data for admin access)
-        try:
-            from .utils import generate_contract_pdf
-            pdf_paths = generate_contract_pdf(application)
-            if pdf_paths:
-                # Store the first PDF (or the only one) - this contains all application data
-                application.contract_pdf_path = pdf_paths[0] if isinstance(pdf_paths, list) else pdf_paths
-                application.contract_generated = True
-                application.save()
-        except Exception as e:
-            # Log error but don't fail the submission
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error generating PDF for application {application.id}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        # Outbox: contract PDF and notification emails are run by the
+        # background workers (manage.py run_workers), once per submission;
+        # repricing only when the tariff had no price above
+        from .jobs import enqueue
+        effects = ('generate_contract', 'company_email', 'customer_email')
+        if household is None:
+            effects = ('recalculate_premium', *effects)
+        for effect in effects:
+            enqueue(effect, application, key=f'submission:{application.id}:{effect}')
         
-        # Send notification emails (non-blocking - errors are logged but don't fail submission)
-        try:
-            from .email_utils import send_company_notification_email, send_customer_confirmation_email
-            send_company_notification_email(application)
-            send_customer_confirmation_email(application)
-        except Exception as e:
-            logger.error(f"Error sending emails for application {application.id}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-        
-        return JsonResponse({
-            'success': True,
-            'application_id': application.id,
-            'message': 'Η αίτηση υποβλήθηκε επιτυχώς!'
-        })
+        def remember_submission():
+            # Lets this session follow the application's jobs
+            submitted = request.session.get(SESSION_SUBMISSIONS, [])[-(SESSION_SUBMISSIONS_KEPT - 1):]
+            request.session[SESSION_SUBMISSIONS] = [*submitted, application.id]
+
+        transaction.on_commit(remember_submission)
+        return submission_response(application.id)
         
     except Exception as e:
-        logger.error(f"Error in handle_application_submission: {e}")
+        # Nothing of a failed submission is kept, its jobs included
+        transaction.set_rollback(True)
+        logger.error("Error in handle_application_submission: %s", e)
         import traceback
         logger.error(traceback.format_exc())
         return JsonResponse({
@@ -1277,19 +936,7 @@ def handle_application_submission(request):
 
 def extract_weight_from_breed(breed):
     """Extract weight category from breed string"""
-    if not breed:
-        return ''
-    
-    if 'έως 10 κιλά' in breed:
-        return '10'
-    elif '11-20 κιλά' in breed:
-        return '11-20'
-    elif '21-40 κιλά' in breed:
-        return '21-40'
-    elif '>40 κιλά' in breed:
-        return '>40'
-    
-    return ''
+    return classify_breed(breed).weight_category or ''
 
 def calculate_total_premium(post_data):
     """Calculate total premium based on submitted data"""
@@ -1338,14 +985,15 @@ def contact_info(request):
             'gender': gender,
             'birthdate': birthdate,
             'breed': breed,
-            'name': name
+            'name': name,
+            'submission_token': issue_submission_token(),
         }
         return render(request, 'main/contact_info.html', context)
 
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Error in contact_info view: {e}")
+        logger.error("Error in contact_info view: %s", e)
         import traceback
         logger.error(traceback.format_exc())
         from django.http import HttpResponse
@@ -1394,8 +1042,9 @@ def upload_pet_document(request):
     import logging
     logger = logging.getLogger(__name__)
     
-    logger.info(f"Upload request received - Method: {request.method}")
-    logger.info(f"Request headers: {dict(request.headers)}")
+    logger.debug("Upload request received - Method: %s", request.method)
+    # HttpHeaders is only turned into text when DEBUG is enabled for this logger
+    logger.debug("Request headers: %s", request.headers)
     
     if request.method == 'POST':
         from .models import PetDocument
@@ -1403,15 +1052,15 @@ def upload_pet_document(request):
         try:
             # Safely access POST and FILES - client may disconnect during upload
             try:
-                post_keys = list(request.POST.keys()) if request.POST else []
-                files_keys = list(request.FILES.keys()) if request.FILES else []
-                logger.info(f"POST data keys: {post_keys}")
-                logger.info(f"FILES keys: {files_keys}")
+                # Parses the body here, so a disconnect is caught below
+                post_keys = request.POST.keys()
+                files_keys = request.FILES.keys()
+                logger.debug("POST data keys: %s, FILES keys: %s", post_keys, files_keys)
             except (SystemExit, KeyboardInterrupt, ConnectionError) as e:
-                logger.warning(f"Client disconnected during request parsing: {e}")
+                logger.warning("Client disconnected during request parsing: %s", e)
                 return JsonResponse({'success': False, 'message': 'Upload interrupted'})
             except Exception as e:
-                logger.warning(f"Error accessing request data: {e}")
+                logger.warning("Error accessing request data: %s", e)
                 # Continue anyway - might still have file data
             
             uploaded_file = request.FILES.get('file') if request.FILES else None
@@ -1419,7 +1068,7 @@ def upload_pet_document(request):
                 logger.warning("No file provided in request")
                 return JsonResponse({'success': False, 'message': 'No file provided'})
             
-            logger.info(f"File received: {uploaded_file.name}, Size: {uploaded_file.size}, Type: {uploaded_file.content_type}")
+            logger.info("File received: %s, Size: %s, Type: %s", uploaded_file.name, uploaded_file.size, uploaded_file.content_type)
             
             # Create PetDocument record with file
             # Handle legacy columns with NOT NULL constraints in local DB
@@ -1438,7 +1087,7 @@ def upload_pet_document(request):
                         table_info = cursor.fetchall()
                         notnull_cols = {row[1]: row[3] == 1 for row in table_info}
                 except Exception as e:
-                    logger.warning(f"Could not check SQLite table structure: {e}")
+                    logger.warning("Could not check SQLite table structure: %s", e)
                     notnull_cols = {}
             # For PostgreSQL, assume no legacy columns (they don't exist in production)
             
@@ -1509,9 +1158,9 @@ def upload_pet_document(request):
                                 )
                                 user_id = default_user.id
                                 if created:
-                                    logger.info(f"Created default system user for uploads: {user_id}")
+                                    logger.info("Created default system user for uploads: %s", user_id)
                             except Exception as e:
-                                logger.error(f"Could not get/create default user: {e}")
+                                logger.error("Could not get/create default user: %s", e)
                                 # Fallback: try to use first user or ID 1
                                 try:
                                     first_user = User.objects.first()
@@ -1529,7 +1178,7 @@ def upload_pet_document(request):
                 
                 # Get the document object
                 document = PetDocument.objects.get(id=doc_id)
-                logger.info(f"Created document via raw SQL to handle legacy columns: {document.id}")
+                logger.info("Created document via raw SQL to handle legacy columns: %s", document.id)
             else:
                 # Normal creation if no legacy NOT NULL constraints
                 document = PetDocument.objects.create(
@@ -1539,7 +1188,7 @@ def upload_pet_document(request):
                     file_size=uploaded_file.size
                 )
             
-            logger.info(f"Document created successfully - ID: {document.id}, Path: {document.file.name}")
+            logger.info("Document created successfully - ID: %s, Path: %s", document.id, document.file.name)
             
             # Store document ID in session for later linking to application
             if 'uploaded_document_ids' not in request.session:
@@ -1548,7 +1197,7 @@ def upload_pet_document(request):
             request.session.modified = True
             
             file_url = document.get_file_url()
-            logger.info(f"File URL generated: {file_url}")
+            logger.debug("File URL generated: %s", file_url)
             
             return JsonResponse({
                 'success': True,
@@ -1558,12 +1207,12 @@ def upload_pet_document(request):
                 'file_size': document.file_size
             })
         except Exception as e:
-            logger.error(f"Error uploading document: {e}")
+            logger.error("Error uploading document: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return JsonResponse({'success': False, 'message': str(e)})
     
-    logger.warning(f"Method not allowed: {request.method}")
+    logger.warning("Method not allowed: %s", request.method)
     return JsonResponse({'success': False, 'message': 'Method not allowed'})
 
 @csrf_exempt
@@ -1572,7 +1221,7 @@ def upload_pet_photo(request):
     import logging
     logger = logging.getLogger(__name__)
     
-    logger.info(f"Photo upload request received - Method: {request.method}")
+    logger.debug("Photo upload request received - Method: %s", request.method)
     
     if request.method == 'POST':
         from .models import PetPhoto
@@ -1580,15 +1229,15 @@ def upload_pet_photo(request):
         try:
             # Safely access POST and FILES - client may disconnect during upload
             try:
-                post_keys = list(request.POST.keys()) if request.POST else []
-                files_keys = list(request.FILES.keys()) if request.FILES else []
-                logger.info(f"POST data keys: {post_keys}")
-                logger.info(f"FILES keys: {files_keys}")
+                # Parses the body here, so a disconnect is caught below
+                post_keys = request.POST.keys()
+                files_keys = request.FILES.keys()
+                logger.debug("POST data keys: %s, FILES keys: %s", post_keys, files_keys)
             except (SystemExit, KeyboardInterrupt, ConnectionError) as e:
-                logger.warning(f"Client disconnected during request parsing: {e}")
+                logger.warning("Client disconnected during request parsing: %s", e)
                 return JsonResponse({'success': False, 'message': 'Upload interrupted'})
             except Exception as e:
-                logger.warning(f"Error accessing request data: {e}")
+                logger.warning("Error accessing request data: %s", e)
                 # Continue anyway - might still have file data
             
             uploaded_file = request.FILES.get('file') if request.FILES else None
@@ -1596,7 +1245,7 @@ def upload_pet_photo(request):
                 logger.warning("No file provided in photo upload request")
                 return JsonResponse({'success': False, 'message': 'No file provided'})
             
-            logger.info(f"Photo received: {uploaded_file.name}, Size: {uploaded_file.size}, Type: {uploaded_file.content_type}")
+            logger.info("Photo received: %s, Size: %s, Type: %s", uploaded_file.name, uploaded_file.size, uploaded_file.content_type)
             
             # Create PetPhoto record with file
             # Handle legacy columns if they exist (same as PetDocument)
@@ -1617,7 +1266,7 @@ def upload_pet_photo(request):
                         notnull_cols = {row[1]: row[3] == 1 for row in table_info}
                         has_legacy = any(col in notnull_cols and notnull_cols[col] for col in ['document_type', 'is_verified', 'user_id'])
                 except Exception as e:
-                    logger.warning(f"Could not check SQLite PetPhoto table structure: {e}")
+                    logger.warning("Could not check SQLite PetPhoto table structure: %s", e)
                     has_legacy = False
                     notnull_cols = {}
             # For PostgreSQL, assume no legacy columns (they don't exist in production)
@@ -1669,7 +1318,7 @@ def upload_pet_photo(request):
                     photo_id = cursor.lastrowid
                 
                 photo = PetPhoto.objects.get(id=photo_id)
-                logger.info(f"Created photo via raw SQL: {photo.id}")
+                logger.info("Created photo via raw SQL: %s", photo.id)
             else:
                 # Normal creation
                 photo = PetPhoto.objects.create(
@@ -1679,7 +1328,7 @@ def upload_pet_photo(request):
                     file_size=uploaded_file.size
                 )
             
-            logger.info(f"Photo created successfully - ID: {photo.id}, Path: {photo.file.name}")
+            logger.info("Photo created successfully - ID: %s, Path: %s", photo.id, photo.file.name)
             
             # Store photo ID in session for later linking to application
             if 'uploaded_photo_ids' not in request.session:
@@ -1688,7 +1337,7 @@ def upload_pet_photo(request):
             request.session.modified = True
             
             file_url = photo.get_file_url()
-            logger.info(f"Photo URL generated: {file_url}")
+            logger.debug("Photo URL generated: %s", file_url)
             
             return JsonResponse({
                 'success': True,
@@ -1698,14 +1347,112 @@ def upload_pet_photo(request):
                 'file_size': photo.file_size
             })
         except Exception as e:
-            logger.error(f"Error uploading photo: {e}")
+            logger.error("Error uploading photo: %s", e)
             import traceback
             logger.error(traceback.format_exc())
             return JsonResponse({'success': False, 'message': str(e)})
     
-    logger.warning(f"Method not allowed: {request.method}")
+    logger.warning("Method not allowed: %s", request.method)
     return JsonResponse({'success': False, 'message': 'Method not allowed'})
 
+# Bump when the /api/quote/ response shape changes so cached ETags stop matching
+QUOTE_API_VERSION = 2
+QUOTE_API_MAX_AGE = 300
+
+
+def quote_api_etag(request):
+    """Strong ETag from the active tariff version stamp and the query string."""
+    import hashlib
+    tariff = get_active_tariff()
+    params = sorted(request.GET.items())
+    key = f"{QUOTE_API_VERSION}|{tariff.version_id}|{tariff.stamp}|{params}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=QUOTE_API_MAX_AGE)
+@condition(etag_func=quote_api_etag)
+def quote_api(request):
+    """
+    Full program x frequency x surcharge/add-on price matrix for one or two pets.
+    The second pet's programs also carry its household share ('as_second_pet').
+
+    GET /api/quote/?pet_type=dog&weight=21-40[&second_pet_type=cat&second_pet_weight=10]
+    Matching If-None-Match requests get a 304 without pricing anything.
+    """
+    pets = [(request.GET.get('pet_type', ''), request.GET.get('weight', ''))]
+    if request.GET.get('second_pet_type'):
+        pets.append((request.GET.get('second_pet_type', ''), request.GET.get('second_pet_weight', '')))
+
+    tariff = get_active_tariff()
+    response = {
+        'success': True,
+        'tariff_version': tariff.version_id,
+        'frequencies': ['annual', 'six_month', 'three_month'],
+        'flags': ['special_breed_5_percent', 'special_breed_20_percent', 'poisoning', 'blood_checkup'],
+        'pets': [],
+    }
+    for index, (pet_type, weight) in enumerate(pets):
+        first_pet = pets[0] if index else None
+        programs = quote_matrix(pet_type, weight, tariff, first_pet) if pet_type in ('dog', 'cat') else {}
+        if not programs:
+            return JsonResponse({
+                'success': False,
+                'message': f'Δεν υπάρχει τιμολόγηση για {pet_type or "-"} / {weight or "-"}.'
+            }, status=400)
+        response['pets'].append({'pet_type': pet_type, 'weight': weight, 'programs': programs})
+
+    return JsonResponse(response, json_dumps_params={'separators': (',', ':')})
+
+
+BREEDS_API_MAX_AGE = 3600
+
+
+def breeds_api_etag(request):
+    """Strong ETag from the breed catalog stamp."""
+    import hashlib
+    from .breeds import get_breed_index
+    return hashlib.sha1(str(get_breed_index().stamp).encode('utf-8')).hexdigest()
+
+
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=BREEDS_API_MAX_AGE)
+@condition(etag_func=breeds_api_etag)
+def breeds_api(request):
+    """
+    Active breed catalog for the breed dropdowns:
+    {"dog": [{"name", "surcharge", "weight"}, ...], "cat": [...]}.
+    The JSON is rendered once per catalog version and served as-is.
+    """
+    from .breeds import get_breed_index
+    return HttpResponse(get_breed_index().catalog_json, content_type='application/json')
+
+
+@require_http_methods(["GET"])
+def application_jobs_api(request, application_id):
+    """
+    Progress of an application's background work (contract PDF, emails):
+    status and attempts of each job, and whether any is still pending.
+    Only for the session that submitted the application, and for staff.
+    """
+    from .models import BackgroundJob
+
+    if not request.user.is_staff and application_id not in request.session.get(SESSION_SUBMISSIONS, []):
+        # Same answer as for a missing application: ids cannot be probed
+        return JsonResponse({'error': 'Application not found'}, status=404)
+
+    jobs = list(
+        BackgroundJob.objects.filter(application_id=application_id)
+        .order_by('id')
+        .values('id', 'job_type', 'status', 'attempts', 'created_at', 'finished_at')
+    )
+    return JsonResponse({
+        'application_id': application_id,
+        'pending': any(job['status'] in ('queued', 'running') for job in jobs),
+        'jobs': jobs,
+    })
+
+
 @require_http_methods(["POST"])
 def validate_affiliate_code(request):
     """Validate an affiliate/ambassador code and return discount information"""
@@ -1758,7 +1505,7 @@ def validate_affiliate_code(request):
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Error validating affiliate code: {e}")
+        logger.error("Error validating affiliate code: %s", e)
         import traceback
         logger.error(traceback.format_exc())
         return JsonResponse({
@@ -1827,7 +1574,7 @@ def serve_file(request, file_type, file_id):
                     if error_code == '404' or error_code == 'NoSuchKey':
                         import logging
                         logger = logging.getLogger(__name__)
-                        logger.warning(f"File not found in S3: {s3_key} (file_type={file_type}, file_id={file_id})")
+                        logger.warning("File not found in S3: %s (file_type=%s, file_id=%s)", s3_key, file_type, file_id)
                         raise Http404(f"File not found in storage: {s3_key}")
                     else:
                         # Other S3 error, re-raise
@@ -1850,7 +1597,7 @@ def serve_file(request, file_type, file_id):
             except Exception as e:
                 import logging
                 logger = logging.getLogger(__name__)
-                logger.error(f"Error generating signed URL for {file_type}/{file_id}: {e}")
+                logger.error("Error generating signed URL for %s/%s: %s", file_type, file_id, e)
                 import traceback
                 logger.error(traceback.format_exc())
                 # Check if file exists using default_storage (with proper key)
@@ -1880,7 +1627,7 @@ def serve_file(request, file_type, file_id):
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Error serving file {file_type}/{file_id}: {e}")
+        logger.error("Error serving file %s/%s: %s", file_type, file_id, e)
         import traceback
         logger.error(traceback.format_exc())
         raise Http404("File not found")
@@ -58,7 +58,7 @@ class VivaWalletAPI:
             response.raise_for_status()
             return response.json().get('access_token')
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to get Viva Wallet access token: {e}")
+            logger.error("Failed to get Viva Wallet access token: %s", e)
             return None
     
     def create_payment_order(self, application, payment_type='annual'):
@@ -147,7 +147,7 @@ class VivaWalletAPI:
                 return {'success': False, 'error': 'No order code received'}
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to create Viva Wallet payment order: {e}")
+            logger.error("Failed to create Viva Wallet payment order: %s", e)
             return {'success': False, 'error': str(e)}
     
     def verify_webhook_signature(self, payload, signature):
@@ -181,7 +181,7 @@ class VivaWalletAPI:
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to get transaction details: {e}")
+            logger.error("Failed to get transaction details: %s", e)
             return None
     
     def create_refund(self, transaction_id, amount=None, reason="Customer request"):
@@ -209,7 +209,7 @@ class VivaWalletAPI:
             response.raise_for_status()
             return {'success': True, 'data': response.json()}
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to create refund: {e}")
+            logger.error("Failed to create refund: %s", e)
             return {'success': False, 'error': str(e)}
 
 # Utility functions
@@ -261,7 +261,7 @@ def verify_payment_webhook(request):
         return {'success': True, 'message': 'Webhook processed'}
         
     except Exception as e:
-        logger.error(f"Webhook processing error: {e}")
+        logger.error("Webhook processing error: %s", e)
         return {'success': False, 'error': str(e)}
 
 def process_payment_success(webhook_data):
@@ -291,7 +291,7 @@ def process_payment_success(webhook_data):
             application.status = 'paid'
             application.save()
             
-            logger.info(f"Payment completed: {transaction_id}, Order: {order_code}, Amount: {amount}€")
+            logger.info("Payment completed: %s, Order: %s, Amount: %s€", transaction_id, order_code, amount)
             return {'success': True, 'message': 'Payment processed successfully'}
             
         except PaymentTransaction.DoesNotExist:
@@ -309,14 +309,14 @@ def process_payment_success(webhook_data):
                 application.status = 'paid'
                 application.save()
         
-                logger.info(f"Payment completed (by viva_order_code): {transaction_id}, Order: {order_code}")
+                logger.info("Payment completed (by viva_order_code): %s, Order: %s", transaction_id, order_code)
                 return {'success': True, 'message': 'Payment processed successfully'}
             except PaymentTransaction.DoesNotExist:
-                logger.error(f"Payment transaction not found for order_code: {order_code}")
+                logger.error("Payment transaction not found for order_code: %s", order_code)
                 return {'success': False, 'error': f'Payment transaction not found for order: {order_code}'}
         
     except Exception as e:
-        logger.error(f"Payment success processing error: {e}")
+        logger.error("Payment success processing error: %s", e)
         return {'success': False, 'error': str(e)}
 
 def process_payment_failure(webhook_data):
@@ -338,16 +338,16 @@ def process_payment_failure(webhook_data):
                 application.status = 'payment_failed'
                 application.save()
                 
-                logger.warning(f"Payment failed: Order {order_code}")
+                logger.warning("Payment failed: Order %s", order_code)
                 return {'success': True, 'message': 'Payment failure processed'}
             except PaymentTransaction.DoesNotExist:
-                logger.warning(f"Payment transaction not found for failed order: {order_code}")
+                logger.warning("Payment transaction not found for failed order: %s", order_code)
         
-        logger.warning(f"Payment failed: {webhook_data}")
+        logger.warning("Payment failed: %s", webhook_data)
         return {'success': True, 'message': 'Payment failure processed'}
         
     except Exception as e:
-        logger.error(f"Payment failure processing error: {e}")
+        logger.error("Payment failure processing error: %s", e)
         return {'success': False, 'error': str(e)}
 
 def process_payment_refund(webhook_data):
@@ -378,14 +378,14 @@ def process_payment_refund(webhook_data):
                 payment.webhook_data = webhook_data
                 payment.save()
                 
-                logger.info(f"Payment refunded: Transaction {transaction_id}, Amount: {refund_amount}€")
+                logger.info("Payment refunded: Transaction %s, Amount: %s€", transaction_id, refund_amount)
                 return {'success': True, 'message': 'Refund processed'}
             except PaymentTransaction.DoesNotExist:
-                logger.warning(f"Payment transaction not found for refund: {transaction_id}")
+                logger.warning("Payment transaction not found for refund: %s", transaction_id)
         
-        logger.info(f"Payment refunded: {webhook_data}")
+        logger.info("Payment refunded: %s", webhook_data)
         return {'success': True, 'message': 'Refund processed'}
         
     except Exception as e:
-        logger.error(f"Refund processing error: {e}")
+        logger.error("Refund processing error: %s", e)
         return {'success': False, 'error': str(e)}
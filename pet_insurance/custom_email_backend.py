@@ -76,7 +76,7 @@ class CustomEmailBackend(EmailBackend):
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
-            logger.error(f"Email connection error: {e}")
+            logger.error("Email connection error: %s", e)
             if not self.fail_silently:
                 raise
             return False
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import sys
 import dj_database_url
 from pathlib import Path
 
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -160,6 +162,19 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# Contract PDFs: one document with both contracts for two-pet applications
+# (instead of one PDF per pet)
+CONTRACT_MERGE_PETS = os.environ.get('CONTRACT_MERGE_PETS', 'False').lower() == 'true'
+
+# Contract PDF output optimization per use (main.pdf_optimize): 'none', 'compress'
+# (object streams, merged duplicates, still fillable) or 'flatten' (fields baked
+# into the page, fonts subset). 'archive' applies to the PDFs stored in S3,
+# 'email' to the attachment of the company notification
+CONTRACT_PDF_OPTIMIZE = {
+    'archive': os.environ.get('CONTRACT_PDF_OPTIMIZE_ARCHIVE', 'none'),
+    'email': os.environ.get('CONTRACT_PDF_OPTIMIZE_EMAIL', 'compress'),
+}
+
 # Viva Wallet Configuration
 # Environment variables for production security
 VIVA_WALLET_CLIENT_ID = os.environ.get('VIVA_WALLET_CLIENT_ID', '')
@@ -173,56 +188,97 @@ VIVA_WALLET_PRODUCTION = os.environ.get('VIVA_WALLET_PRODUCTION', 'False').lower
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
 
 # Logging configuration for payment processing
+# Logging: the app's records go through a queue to a listener thread
+# (main/log.py), so formatting and console/file I/O stay off the request
+# thread. Every line carries the request id.
+#   LOG_LEVEL                 level of the app's loggers (default INFO)
+#   LOG_LEVELS                per-module levels, e.g. "main.views=DEBUG,main.jobs=WARNING"
+#   LOG_DEBUG_SAMPLE_RATE     fraction of DEBUG records kept (default 1)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'request': {
+            'format': '%(levelname)s %(name)s [%(request_id)s] %(message)s',
+        },
+        'request_time': {
+            'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s',
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': 'main.log.RequestIdFilter',
+        },
+        'debug_sampling': {
+            '()': 'main.log.DebugSamplingFilter',
+            'rate': os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1'),
+        },
+    },
     'handlers': {
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
+            'formatter': 'request',
+        },
+        'queue': {
+            '()': 'main.log.QueueListenerHandler',
+            'targets': ['console'],
+            'filters': ['request_id', 'debug_sampling'],
         },
     },
     'loggers': {
-        'main.viva_wallet': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': True,
+        'main': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
         },
-        'main.payment_views': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': True,
-        },
-        'main.email_utils': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': True,
-        },
-        'main.views': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': True,
+        # Stage durations of contract generation ([TIMING] lines, main/timing.py)
+        'main.timing': {
+            'handlers': ['queue'],
+            'level': os.environ.get('CONTRACT_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
         },
     },
 }
 
-# Add file handler only if logs directory exists (for local development)
+# Add file handler only if logs directory exists (for local development);
+# test runs never write payments.log
 logs_dir = BASE_DIR / 'logs'
-if logs_dir.exists() or not os.environ.get('DYNO'):  # DYNO is set on Heroku
+TESTING = sys.argv[1:2] == ['test']
+if not TESTING and (logs_dir.exists() or not os.environ.get('DYNO')):  # DYNO is set on Heroku
     try:
         logs_dir.mkdir(exist_ok=True)
         LOGGING['handlers']['file'] = {
             'level': 'INFO',
             'class': 'logging.FileHandler',
             'filename': logs_dir / 'payments.log',
+            'formatter': 'request_time',
+        }
+        # The payment loggers also write payments.log, from their own listener
+        LOGGING['handlers']['payments_queue'] = {
+            '()': 'main.log.QueueListenerHandler',
+            'targets': ['file'],
+            'filters': ['request_id'],
         }
-        # Add file handler to loggers
         for logger_name in ['main.viva_wallet', 'main.payment_views', 'main.email_utils']:
-            if 'file' not in LOGGING['loggers'][logger_name]['handlers']:
-                LOGGING['loggers'][logger_name]['handlers'].append('file')
+            LOGGING['loggers'][logger_name] = {
+                'handlers': ['payments_queue'],
+                'propagate': True,
+            }
     except (OSError, PermissionError):
         pass  # Skip file logging if directory can't be created
 
+for item in os.environ.get('LOG_LEVELS', '').split(','):
+    logger_name, _, level = (part.strip() for part in item.partition('='))
+    if logger_name and level:
+        LOGGING['loggers'].setdefault(
+            logger_name,
+            # Loggers outside the app get the queue too
+            {} if logger_name.startswith('main.') else {'handlers': ['queue'], 'propagate': False},
+        )['level'] = level.upper()
+
 # Email Configuration
 # Use custom backend that disables SSL verification for self-signed certificates (common with Plesk)
 # For local development, use console backend to print emails to console